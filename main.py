@@ -1,6 +1,12 @@
 import httpx
 from mcp.server.fastmcp import FastMCP, Image, Context
+import asyncio
 import base64
+import copy
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, Union
 
 # Create a generic MCP server for interacting with Revit. Host/port will be
@@ -12,6 +18,156 @@ REVIT_HOST = "localhost"
 REVIT_PORT = 48884  # Default pyRevit Routes port
 BASE_URL = f"http://{REVIT_HOST}:{REVIT_PORT}/revit_mcp"
 
+# GET responses that carried an ETag, revalidated with If-None-Match so
+# unchanged catalog data costs a 304 instead of a rescan in Revit
+ETAG_CACHE_SIZE = 256
+_etag_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Requests in flight to Revit at once, across all clients; bulk exports
+# may use all but one slot so interactive calls always get through
+MAX_REVIT_CONCURRENCY = max(1, int(os.getenv("REVIT_MCP_MAX_CONCURRENCY", "4")))
+
+# Priority classes, highest first
+PRIORITIES = ("interactive", "write", "bulk")
+BULK_ENDPOINTS = ("/export_sheets_pdf/", "/export_views/", "/export_model_data/", "/export_chunk/")
+READ_ONLY_POST_ENDPOINTS = (
+    "/list_category_parameters/", "/get_parameters/", "/query/", "/aggregate/", "/sheet_versions/",
+)
+# Output polling and cancellation must never wait behind the work they watch
+UNSCHEDULED_ENDPOINTS = ("/execute_output/", "/cancel_execution/", "/release_export/", "/dispatcher_stats/")
+QUEUE_TIME_SAMPLES = 1000
+
+
+def request_priority(method: str, endpoint: str, data: Dict = None) -> Optional[str]:
+    """Priority class of a Revit request, or None if it bypasses the scheduler"""
+    if endpoint.startswith(UNSCHEDULED_ENDPOINTS):
+        return None
+    if endpoint.startswith(BULK_ENDPOINTS):
+        return "bulk"
+    if method == "GET" or endpoint.startswith(READ_ONLY_POST_ENDPOINTS):
+        return "interactive"
+    # Read-mode code and read procedures; for procedures "mode" is only a
+    # scheduling hint, Revit runs the procedure's declared mode
+    if endpoint.startswith(("/execute_code/", "/run_procedure/")) and (data or {}).get("mode") == "read":
+        return "interactive"
+    return "write"
+
+
+def _session_key(ctx: Context = None):
+    """Identify the client session of a tool call (None outside a request)"""
+    if ctx is None:
+        return None
+    try:
+        return id(ctx.session)
+    except ValueError:
+        return None
+
+
+class RevitScheduler:
+    """
+    Admission control for requests to Revit
+
+    At most max_concurrency requests are in flight; the rest wait in
+    priority order (interactive reads, then writes, then bulk exports),
+    and bulk exports never take the last free slot. With a single slot
+    nothing can be reserved, so bulk exports only take it while no other
+    request waits, and one interactive request may run alongside a bulk
+    export that holds it. Within a class, sessions take turns, so one
+    client's burst cannot starve another.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_REVIT_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._running = {priority: 0 for priority in PRIORITIES}
+        # Per class: session -> waiting futures, in round-robin order
+        self._queues: Dict[str, "OrderedDict[Any, deque]"] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queue_times = {priority: deque(maxlen=QUEUE_TIME_SAMPLES) for priority in PRIORITIES}
+        self._completed = {priority: 0 for priority in PRIORITIES}
+
+    def _waiting(self, priority: str) -> bool:
+        return any(
+            not future.done() for waiters in self._queues[priority].values() for future in waiters
+        )
+
+    def _can_start(self, priority: str) -> bool:
+        running = sum(self._running.values())
+        if priority == "bulk":
+            if running >= self.max_concurrency:
+                return False
+            if self.max_concurrency > 1:
+                return self._running["bulk"] < self.max_concurrency - 1
+            return not self._waiting("interactive") and not self._waiting("write")
+        if running < self.max_concurrency:
+            return True
+        # Only possible with a single slot: a bulk export holds it
+        return priority == "interactive" and running == self._running["bulk"]
+
+    def _wake(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_start(priority):
+                session, waiters = next(iter(queue.items()))
+                future = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(session)
+                else:
+                    del queue[session]
+                if future.done():
+                    continue  # cancelled while waiting
+                self._running[priority] += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: str, session=None):
+        """Wait for a slot to send a request of this priority"""
+        enqueued_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(session, deque()).append(future)
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller was cancelled
+                self._running[priority] -= 1
+                self._wake()
+            else:
+                future.cancel()
+            raise
+
+        self._queue_times[priority].append(time.monotonic() - enqueued_at)
+        try:
+            yield
+        finally:
+            self._running[priority] -= 1
+            self._completed[priority] += 1
+            self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for priority in PRIORITIES:
+            times = sorted(self._queue_times[priority])
+            waiting = sum(
+                1 for waiters in self._queues[priority].values() for future in waiters if not future.done()
+            )
+            entry = {
+                "running": self._running[priority],
+                "waiting": waiting,
+                "waiting_sessions": len(self._queues[priority]),
+                "completed": self._completed[priority],
+            }
+            if times:
+                entry["queue_ms"] = {
+                    "avg": round(1000 * sum(times) / len(times), 1),
+                    "p95": round(1000 * times[int(0.95 * (len(times) - 1))], 1),
+                    "max": round(1000 * times[-1], 1),
+                }
+            classes[priority] = entry
+        return {"max_concurrency": self.max_concurrency, "classes": classes}
+
+
+scheduler = RevitScheduler()
+
 
 async def revit_get(endpoint: str, ctx: Context = None, **kwargs) -> Union[Dict, str]:
     """Simple GET request to Revit API"""
@@ -23,16 +179,22 @@ async def revit_post(endpoint: str, data: Dict[str, Any], ctx: Context = None, *
     return await _revit_call("POST", endpoint, data=data, ctx=ctx, **kwargs)
 
 
-async def revit_image(endpoint: str, ctx: Context = None) -> Union[Image, str]:
+async def revit_image(endpoint: str, ctx: Context = None, params: Dict = None) -> Union[Image, str]:
     """GET request that returns an Image object"""
+    async with scheduler.slot(request_priority("GET", endpoint), _session_key(ctx)):
+        return await _revit_image(endpoint, params)
+
+
+async def _revit_image(endpoint: str, params: Dict = None) -> Union[Image, str]:
     try:
         async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(f"{BASE_URL}{endpoint}")
+            response = await client.get(f"{BASE_URL}{endpoint}", params=params)
             
             if response.status_code == 200:
                 data = response.json()
                 image_bytes = base64.b64decode(data["image_data"])
-                return Image(data=image_bytes, format="png")
+                image_format = data.get("content_type", "image/png").split("/")[-1]
+                return Image(data=image_bytes, format=image_format)
             else:
                 return f"Error: {response.status_code} - {response.text}"
     except Exception as e:
@@ -41,13 +203,36 @@ async def revit_image(endpoint: str, ctx: Context = None) -> Union[Image, str]:
 
 async def _revit_call(method: str, endpoint: str, data: Dict = None, ctx: Context = None, 
                      timeout: float = 30.0, params: Dict = None) -> Union[Dict, str]:
-    """Internal function handling all HTTP calls"""
+    """Internal function handling all HTTP calls, admitted by the scheduler"""
+    priority = request_priority(method, endpoint, data)
+    if priority is None:
+        return await _revit_request(method, endpoint, data, timeout, params)
+    async with scheduler.slot(priority, _session_key(ctx)):
+        return await _revit_request(method, endpoint, data, timeout, params)
+
+
+async def _revit_request(method: str, endpoint: str, data: Dict = None,
+                         timeout: float = 30.0, params: Dict = None) -> Union[Dict, str]:
     try:
         async with httpx.AsyncClient(timeout=timeout) as client:
             url = f"{BASE_URL}{endpoint}"
             
             if method == "GET":
-                response = await client.get(url, params=params)
+                cache_key = str(httpx.URL(url, params=params))
+                cached = _etag_cache.get(cache_key)
+                headers = {"If-None-Match": cached[0]} if cached else None
+                response = await client.get(url, params=params, headers=headers)
+
+                if response.status_code == 304 and cached:
+                    _etag_cache.move_to_end(cache_key)
+                    return copy.deepcopy(cached[1])
+                if response.status_code == 200 and "etag" in response.headers:
+                    result = response.json()
+                    _etag_cache[cache_key] = (response.headers["etag"], result)
+                    _etag_cache.move_to_end(cache_key)
+                    while len(_etag_cache) > ETAG_CACHE_SIZE:
+                        _etag_cache.popitem(last=False)
+                    return copy.deepcopy(result)
             else:  # POST
                 response = await client.post(url, json=data, headers={"Content-Type": "application/json"})
             
@@ -56,6 +241,12 @@ async def _revit_call(method: str, endpoint: str, data: Dict = None, ctx: Contex
         return f"Error: {e}"
 
 
+@mcp.resource("revit://scheduler/stats")
+def scheduler_stats() -> Dict[str, Any]:
+    """Requests running and waiting per priority class, and their queue times"""
+    return scheduler.stats()
+
+
 # Register all tools BEFORE the main block
 from tools import register_tools
 register_tools(mcp, revit_get, revit_post, revit_image)
@@ -0,0 +1,25 @@
+# -*- coding: UTF-8 -*-
+"""Count model elements per category, optionally limited to a view"""
+from collections import Counter
+
+if args["view_id"] is not None:
+    collector = DB.FilteredElementCollector(doc, DB.ElementId(args["view_id"]))
+else:
+    collector = DB.FilteredElementCollector(doc)
+
+counts = Counter()
+for element in collector.WhereElementIsNotElementType():
+    category = element.Category
+    if category is None:
+        continue
+    if args["categories"] and category.Name not in args["categories"]:
+        continue
+    counts[category.Name] += 1
+
+result = {
+    "total": sum(counts.values()),
+    "categories": [
+        {"category": name, "count": count}
+        for name, count in counts.most_common(args["limit"] or None)
+    ],
+}
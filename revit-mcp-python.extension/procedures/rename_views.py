@@ -0,0 +1,29 @@
+# -*- coding: UTF-8 -*-
+"""Find and replace text in view names"""
+find = args["find"]
+replace = args["replace"]
+
+renamed = []
+skipped = []
+for view in DB.FilteredElementCollector(doc).OfClass(DB.View):
+    if view.IsTemplate and not args["include_templates"]:
+        continue
+    if args["view_type"] and str(view.ViewType) != args["view_type"]:
+        continue
+    if find not in view.Name:
+        continue
+
+    new_name = view.Name.replace(find, replace)
+    entry = {"id": view.Id.IntegerValue, "old_name": view.Name, "new_name": new_name}
+    if args["dry_run"]:
+        renamed.append(entry)
+        continue
+    try:
+        view.Name = new_name
+        renamed.append(entry)
+    except Exception as e:
+        # Revit rejects duplicate names and some reserved characters
+        entry["error"] = str(e)
+        skipped.append(entry)
+
+result = {"dry_run": args["dry_run"], "renamed": renamed, "skipped": skipped}
@@ -0,0 +1,323 @@
+# -*- coding: UTF-8 -*-
+"""
+Change Journal Module for Revit MCP
+Records DocumentChanged events so clients can sync incrementally
+"""
+
+from pyrevit import routes, revit, DB
+from collections import deque
+import hashlib
+import logging
+import threading
+import uuid
+from System import AppDomain
+
+from utils import safe_make_response, document_key, get_request_params
+
+logger = logging.getLogger(__name__)
+
+# The journal is bounded both by number of events and by total element ids;
+# the oldest events are dropped first and clients holding older tokens must resync
+MAX_JOURNAL_EVENTS = 10000
+MAX_JOURNAL_IDS = 200000
+
+# Above this many changed ids a resync is cheaper than an incremental update
+MAX_RETURNED_IDS = 100000
+
+# AppDomain slot remembering our event handlers across pyRevit reloads
+HANDLERS_SLOT = "revit_mcp.changes.handlers"
+
+
+class ChangeJournal(object):
+    """
+    Bounded ring buffer of added/modified/deleted element ids.
+
+    Every recorded event gets the next value of a monotonically increasing
+    token. Tokens are only meaningful within one session, identified by
+    session_id, because the journal lives in memory.
+    """
+
+    def __init__(self, max_events=MAX_JOURNAL_EVENTS, max_ids=MAX_JOURNAL_IDS):
+        self.session_id = uuid.uuid4().hex
+        self._max_events = max_events
+        self._max_ids = max_ids
+        self._entries = deque()
+        self._id_count = 0
+        self._token = 0
+        self._evicted_through = 0
+        self._doc_versions = {}
+        self._doc_opened = {}
+        # doc_key -> {element id: token of its last change}; ids whose change
+        # was evicted from the journal are pruned once it grows past
+        # 2 * max_ids, and _pruned_through remembers the newest pruned token
+        self._last_changed = {}
+        self._tracked_ids = 0
+        self._pruned_through = {}
+        self._lock = threading.Lock()
+
+    @property
+    def current_token(self):
+        return self._token
+
+    def record(self, doc_key, added, modified, deleted):
+        """Append an event and return its token"""
+        with self._lock:
+            self._token += 1
+            entry = (self._token, doc_key, False, added, modified, deleted)
+            self._append(entry, len(added) + len(modified) + len(deleted))
+            self._doc_versions[doc_key] = self._token
+            last_changed = self._last_changed.setdefault(doc_key, {})
+            tracked = len(last_changed)
+            for element_ids in (added, modified, deleted):
+                for element_id in element_ids:
+                    last_changed[element_id] = self._token
+            self._tracked_ids += len(last_changed) - tracked
+            if self._tracked_ids > 2 * self._max_ids:
+                self._prune_last_changed()
+            return self._token
+
+    def reset(self, doc_key):
+        """
+        Record that a document was opened or closed. Clients holding an older
+        token for this document must resync, since changes made outside this
+        session are unknown.
+        """
+        with self._lock:
+            self._token += 1
+            self._append((self._token, doc_key, True, (), (), ()), 0)
+            self._doc_versions[doc_key] = self._token
+            self._doc_opened[doc_key] = self._token
+            self._tracked_ids -= len(self._last_changed.pop(doc_key, {}))
+            self._pruned_through.pop(doc_key, None)
+            return self._token
+
+    def _append(self, entry, id_count):
+        self._entries.append(entry)
+        self._id_count += id_count
+        while self._entries and (
+            len(self._entries) > self._max_events or self._id_count > self._max_ids
+        ):
+            evicted = self._entries.popleft()
+            self._id_count -= len(evicted[3]) + len(evicted[4]) + len(evicted[5])
+            self._evicted_through = evicted[0]
+
+    def _prune_last_changed(self):
+        """Forget last-change tokens of ids whose events were evicted"""
+        for doc_key, last_changed in self._last_changed.items():
+            stale = [
+                element_id for element_id, token in last_changed.items()
+                if token <= self._evicted_through
+            ]
+            if not stale:
+                continue
+            for element_id in stale:
+                del last_changed[element_id]
+            self._tracked_ids -= len(stale)
+            self._pruned_through[doc_key] = self._evicted_through
+
+    def document_version(self, doc_key):
+        """Token of the last change or reset recorded for the document"""
+        return self._doc_versions.get(doc_key, 0)
+
+    def elements_version(self, doc_key, element_ids):
+        """
+        Version string for a set of elements: changes whenever any of them is
+        changed or deleted, the set itself changes, or the document is reopened
+
+        If an element's last change may have been pruned, the newest pruned
+        token stands in for it: any later change is still tracked, so the
+        version only moves when a prune does, never with unrelated edits,
+        and never stays the same when the elements changed.
+        """
+        with self._lock:
+            last_changed = self._last_changed.get(doc_key, {})
+            tokens = [last_changed.get(element_id) for element_id in element_ids]
+            latest = max([token for token in tokens if token is not None] or [0])
+            if None in tokens and doc_key in self._pruned_through:
+                latest = max(latest, self._pruned_through[doc_key])
+            opened = self._doc_opened.get(doc_key, 0)
+        id_hash = hashlib.md5(
+            ",".join(str(element_id) for element_id in sorted(element_ids)).encode("utf-8")
+        ).hexdigest()
+        return "{}-{}-{}-{}".format(self.session_id[:8], opened, latest, id_hash[:16])
+
+    def changes_since(self, doc_key, token, session=None):
+        """
+        Merge all changes to doc_key recorded after token.
+
+        Tokens restart at 0 with every journal, so a token is only
+        meaningful with the session that issued it; pass that session to
+        get a resync instead of silently misread changes after a restart.
+
+        Returns:
+            dict: token, session, resync flag and net added/modified/deleted ids
+        """
+        with self._lock:
+            current = self._token
+            result = {
+                "token": current,
+                "session": self.session_id,
+                "resync": False,
+                "added": [],
+                "modified": [],
+                "deleted": []
+            }
+
+            if (session and session != self.session_id) or token > current:
+                result["resync"] = True
+                result["reason"] = "token is from a different session"
+                return result
+            if token < self._evicted_through:
+                result["resync"] = True
+                result["reason"] = "overflow - journal wrapped since token"
+                return result
+
+            added = set()
+            modified = set()
+            deleted = set()
+            for entry_token, entry_doc, is_reset, e_added, e_modified, e_deleted in self._entries:
+                if entry_token <= token or entry_doc != doc_key:
+                    continue
+                if is_reset:
+                    result["resync"] = True
+                    result["reason"] = "document was reopened"
+                    return result
+                added.update(e_added)
+                modified.update(e_modified)
+                for element_id in e_deleted:
+                    if element_id in added:
+                        # Created and deleted since the token: the client never saw it
+                        added.discard(element_id)
+                    else:
+                        deleted.add(element_id)
+                    modified.discard(element_id)
+
+        modified -= added
+        if len(added) + len(modified) + len(deleted) > MAX_RETURNED_IDS:
+            result["resync"] = True
+            result["reason"] = "too many changes for an incremental update"
+            return result
+
+        result["added"] = sorted(added)
+        result["modified"] = sorted(modified)
+        result["deleted"] = sorted(deleted)
+        return result
+
+
+journal = ChangeJournal()
+
+
+def get_document_version(doc):
+    """Return the journal version of a document (changes when the model changes)"""
+    return journal.document_version(document_key(doc))
+
+
+def _id_values(element_ids):
+    return [element_id.IntegerValue for element_id in element_ids]
+
+
+def _on_document_changed(sender, args):
+    try:
+        doc = args.GetDocument()
+        journal.record(
+            document_key(doc),
+            _id_values(args.GetAddedElementIds()),
+            _id_values(args.GetModifiedElementIds()),
+            _id_values(args.GetDeletedElementIds())
+        )
+    except Exception as e:
+        logger.debug("Could not record document change: {}".format(str(e)))
+
+
+def _on_document_reset(sender, args):
+    try:
+        journal.reset(document_key(args.Document))
+    except Exception as e:
+        logger.debug("Could not record document reset: {}".format(str(e)))
+
+
+def subscribe_document_events(app):
+    """
+    Subscribe the journal to application document events.
+
+    Handlers from a previous pyRevit reload are removed first so events are
+    not recorded twice.
+    """
+    previous = AppDomain.CurrentDomain.GetData(HANDLERS_SLOT)
+    if previous:
+        old_app, handlers = previous
+        try:
+            old_app.DocumentChanged -= handlers[0]
+            old_app.DocumentOpened -= handlers[1]
+            old_app.DocumentClosing -= handlers[1]
+        except Exception as e:
+            logger.warning("Could not remove previous journal handlers: {}".format(str(e)))
+
+    app.DocumentChanged += _on_document_changed
+    app.DocumentOpened += _on_document_reset
+    app.DocumentClosing += _on_document_reset
+    AppDomain.CurrentDomain.SetData(
+        HANDLERS_SLOT, (app, (_on_document_changed, _on_document_reset))
+    )
+    logger.info("Change journal subscribed to document events")
+
+
+def register_change_routes(api):
+    """Register change journal routes with the API"""
+
+    @api.route('/change_token/', methods=["GET"])
+    def change_token(doc):
+        """Return the current journal token to use as a sync baseline"""
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            return safe_make_response(data={
+                "status": "success",
+                "token": journal.current_token,
+                "session": journal.session_id,
+                "document_version": get_document_version(doc)
+            })
+
+        except Exception as e:
+            logger.error("Failed to get change token: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to get change token: {}".format(str(e))},
+                status=500
+            )
+
+    @api.route('/changes_since/<int:token>', methods=["GET"])
+    def changes_since(doc, request, token):
+        """
+        Return element ids added, modified or deleted in the active document
+        since token. If "resync" is true the client must reload its data.
+
+        Query parameters:
+            session: Session id returned with the token; a different
+                session (e.g. after a Revit restart) forces a resync
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            result = journal.changes_since(
+                document_key(doc), token, get_request_params(request).get("session")
+            )
+            result["status"] = "success"
+            result["document"] = document_key(doc)
+            return safe_make_response(data=result)
+
+        except Exception as e:
+            logger.error("Failed to get changes: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to get changes: {}".format(str(e))},
+                status=500
+            )
+
+    logger.info("Change journal routes registered successfully")
@@ -4,16 +4,815 @@ Code Execution Module for Revit MCP
 Handles direct execution of IronPython code in Revit context.
 """
 from pyrevit import routes, revit, DB
-from utils import safe_make_response
+from Autodesk.Revit.Exceptions import ModificationOutsideTransactionException
+from utils import (
+    safe_make_response,
+    export_workspace,
+    get_request_params,
+    parse_int_option,
+    document_key,
+)
+from changes import journal
+from collections import OrderedDict
+import codecs
+import hashlib
 import json
 import logging
+import os
 import sys
+import threading
+import time
 import traceback
-from StringIO import StringIO
 
 # Standard logger setup
 logger = logging.getLogger(__name__)
 
+MAX_COMPILED_CODE_ENTRIES = 128
+
+MAX_SESSIONS = 16
+SESSION_IDLE_SECONDS = 30 * 60
+# Estimated size of all session namespaces together
+MAX_SESSION_BYTES = 64 * 1024 * 1024
+
+# Output beyond this many characters is spilled to a file; only the last
+# OUTPUT_TAIL_CHARS stay in memory and in the response
+MAX_OUTPUT_MEMORY_CHARS = 1000000
+OUTPUT_TAIL_CHARS = 64 * 1024
+DEFAULT_OUTPUT_READ_CHARS = 64 * 1024
+# Finished jobs stay readable this long for a last /execute_output/ poll
+FINISHED_JOB_SECONDS = 5 * 60
+
+DEFAULT_PROFILE_LINES = 20
+MAX_PROFILE_LINES = 200
+
+# Execution budget: scripts are aborted after this many seconds unless the
+# request sets its own limit (0 disables it)
+DEFAULT_TIME_LIMIT_SECONDS = 300
+MAX_TIME_LIMIT_SECONDS = 3600
+# Scripts are compiled with file names "<mcp-code-...>" or "<procedure-...>",
+# so the tracer can tell script frames (including functions a session kept
+# from an earlier call) from library code
+CODE_FILENAME = "<mcp-code-{}>"
+PROCEDURE_FILENAME = "<procedure-{}>"
+SCRIPT_FILENAME_PREFIXES = ("<mcp-code-", "<procedure-")
+# Budget flags and the line limit are checked once per this many lines
+BUDGET_CHECK_LINES = 1000
+
+# Cached read-mode results, measured by their JSON size
+MAX_RESULT_CACHE_ENTRIES = 256
+MAX_RESULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# High resolution timer (time.clock on IronPython 2.7)
+_clock = getattr(time, "perf_counter", None) or time.clock
+
+
+class CompiledCodeCache(object):
+    """LRU cache of compiled code objects keyed by a hash of the source"""
+
+    def __init__(self, max_entries=MAX_COMPILED_CODE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source, traced=False):
+        """
+        Return (code object, cached) for the source
+
+        IronPython can only trace code compiled while sys.settrace is
+        active, so traced code is cached separately and must be requested
+        with tracing already installed. SyntaxError from compiling
+        propagates to the caller.
+        """
+        source_hash = hashlib.md5(source.encode("utf-8")).hexdigest()
+        key = (source_hash, traced)
+        with self._lock:
+            code = self._entries.pop(key, None)
+            if code is not None:
+                self._entries[key] = code
+                self.hits += 1
+                return code, True
+
+        code = compile(source, CODE_FILENAME.format(source_hash[:8]), "exec")
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = code
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return code, False
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _estimate_size(value, depth=0):
+    """Rough size in bytes of a value and, two levels deep, its contents"""
+    try:
+        size = sys.getsizeof(value)
+    except Exception:
+        size = 64
+    if depth < 2:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                size += _estimate_size(key, depth + 1) + _estimate_size(item, depth + 1)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            for item in value:
+                size += _estimate_size(item, depth + 1)
+    return size
+
+
+class ExecutionSessions(object):
+    """
+    Named namespaces that persist across /execute_code/ calls
+
+    Sessions expire after SESSION_IDLE_SECONDS without use. When the
+    estimated size of all namespaces exceeds max_bytes, least recently used
+    sessions are dropped; a session that alone exceeds it is dropped too.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS,
+                 max_bytes=MAX_SESSION_BYTES):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_seconds
+        for name, session in list(self._sessions.items()):
+            if session["last_used"] < cutoff:
+                del self._sessions[name]
+                logger.info("Execution session '{}' expired".format(name))
+
+    def namespace(self, name, reset=False):
+        """Return the session's namespace, creating it if needed"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.pop(name, None)
+            if session is None or reset:
+                session = {"namespace": {}, "size": 0, "calls": 0}
+            session["last_used"] = time.time()
+            session["calls"] += 1
+            self._sessions[name] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session["namespace"]
+
+    def update_size(self, name, reserved_names=()):
+        """
+        Re-estimate a session after a call and enforce the memory cap
+
+        Returns:
+            bool: False if the session was dropped for exceeding the cap
+        """
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                return False
+            session["size"] = sum(
+                _estimate_size(value)
+                for key, value in session["namespace"].items()
+                if key not in reserved_names
+            )
+            if session["size"] > self.max_bytes:
+                del self._sessions[name]
+                return False
+            total = sum(item["size"] for item in self._sessions.values())
+            for other in list(self._sessions):
+                if total <= self.max_bytes:
+                    break
+                if other != name:
+                    total -= self._sessions.pop(other)["size"]
+            return True
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "sessions": [
+                    {
+                        "name": name,
+                        "calls": session["calls"],
+                        "estimated_bytes": session["size"],
+                        "idle_seconds": int(now - session["last_used"]),
+                    }
+                    for name, session in self._sessions.items()
+                ],
+                "max_bytes": self.max_bytes,
+            }
+
+
+class OutputChannel(object):
+    """
+    Script output that can be read while the script is still running
+
+    Used as sys.stdout. Offsets count characters from the start of the
+    output. Past max_chars everything is written to a file in the export
+    workspace and only the tail stays in memory.
+    """
+
+    def __init__(self, max_chars=MAX_OUTPUT_MEMORY_CHARS, tail_chars=OUTPUT_TAIL_CHARS):
+        self.max_chars = max_chars
+        self.tail_chars = tail_chars
+        self.export_id = None
+        self.path = None
+        self.done = False
+        self.finished_at = None
+        self._chunks = []
+        self._start = 0
+        self._size = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if not text:
+            return
+        if not isinstance(text, unicode):
+            text = unicode(text, "utf-8", "replace")
+        with self._lock:
+            self._chunks.append(text)
+            self._size += len(text)
+            if self._file is not None:
+                self._file.write(text)
+            elif self._size - self._start > self.max_chars:
+                self._spill()
+            if self._file is not None and self._size - self._start > 2 * self.tail_chars:
+                self._trim()
+
+    def flush(self):
+        pass
+
+    def _spill(self):
+        export_id, folder = export_workspace.create("output")
+        path = os.path.join(folder, "output.txt")
+        try:
+            output_file = codecs.open(path, "w", "utf-8")
+            output_file.write(u"".join(self._chunks))
+        except Exception:
+            export_workspace.release(export_id)
+            raise
+        self.export_id, self.path, self._file = export_id, path, output_file
+
+    def _trim(self):
+        text = u"".join(self._chunks)[-self.tail_chars:]
+        self._chunks = [text]
+        self._start = self._size - len(text)
+
+    def read(self, offset, limit=DEFAULT_OUTPUT_READ_CHARS):
+        """
+        Read output from offset
+
+        Returns:
+            tuple: (text, next offset, characters skipped because they are
+            no longer in memory)
+        """
+        with self._lock:
+            skipped = max(0, self._start - offset)
+            offset = max(offset, self._start)
+            text = u"".join(self._chunks)[offset - self._start:offset - self._start + limit]
+            return text, offset + len(text), skipped
+
+    def close(self):
+        """Mark the output complete and return (tail text, truncated)"""
+        with self._lock:
+            self.done = True
+            self.finished_at = time.time()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._trim()
+                # Publishing ends the export's open state, so the file is
+                # only collectable once the script stopped writing it
+                export_workspace.publish(self.export_id, self.path)
+            return u"".join(self._chunks), self._start > 0
+
+    @property
+    def size(self):
+        return self._size
+
+
+class ExecutionJob(object):
+    """Output and cancellation flag of one script execution"""
+
+    def __init__(self):
+        self.output = OutputChannel()
+        self.cancel_event = threading.Event()
+        self.tracer = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.check_soon()
+
+
+class ExecutionJobs(object):
+    """Running and recently finished executions by job id"""
+
+    def __init__(self, finished_seconds=FINISHED_JOB_SECONDS):
+        self.finished_seconds = finished_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, job_id):
+        job = ExecutionJob()
+        with self._lock:
+            cutoff = time.time() - self.finished_seconds
+            for old_id, old_job in list(self._jobs.items()):
+                if old_job.output.done and old_job.output.finished_at < cutoff:
+                    del self._jobs[old_id]
+            if job_id:
+                self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class ResultCache(object):
+    """
+    LRU cache of read-mode execution responses
+
+    Entries are keyed by source hash, arguments, document and the document's
+    change journal version, so any model change makes earlier results
+    unreachable and they age out of the cache. Only scripts whose output
+    depends on nothing but the model and their arguments (not the active
+    view, selection, files or time) should be cached.
+    """
+
+    def __init__(self, max_entries=MAX_RESULT_CACHE_ENTRIES, max_bytes=MAX_RESULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(doc, source, args):
+        doc_key = document_key(doc)
+        return (
+            hashlib.md5(source.encode("utf-8")).hexdigest(),
+            json.dumps(args, sort_keys=True),
+            doc_key,
+            journal.document_version(doc_key),
+        )
+
+    def get(self, key):
+        """Return a copy of the cached response and its age in seconds, or None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+        response, _, stored_at = entry
+        return dict(response), time.time() - stored_at
+
+    def put(self, key, response):
+        size = len(json.dumps(response))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (dict(response), size, time.time())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= dropped[1]
+
+    def run(self, doc, source, args, execute, refresh=False):
+        """
+        Return the cached response for this script, or execute() and cache it
+
+        execute returns (response data, HTTP status); only successful
+        responses whose output was not spilled to a file are cached, and
+        only if the document did not change while the script ran.
+
+        Returns:
+            tuple: (response data with "cache" set to "hit", "miss" or
+            "refresh", HTTP status)
+        """
+        key = self.key(doc, source, args)
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                response, age = cached
+                response["cache"] = "hit"
+                response["cache_age_seconds"] = round(age, 1)
+                return response, 200
+
+        response, status = execute()
+        if (
+            status == 200
+            and not response.get("output_truncated")
+            and self.key(doc, source, args) == key
+        ):
+            self.put(key, response)
+        response["cache"] = "refresh" if refresh else "miss"
+        return response, status
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ExecutionAborted(BaseException):
+    """
+    Raised inside a script that ran out of budget or was cancelled
+
+    Derives from BaseException so "except Exception" in scripts does not
+    swallow it.
+    """
+
+    def __init__(self, reason, message):
+        BaseException.__init__(self, message)
+        self.reason = reason
+
+
+class ScriptTracer(object):
+    """
+    sys.settrace hook for budgets, cancellation and line profiling
+
+    Only script frames are traced: the running script, functions it
+    defines, and functions a session kept from earlier scripts or
+    procedures (recognized by SCRIPT_FILENAME_PREFIXES). The hook counts script lines, and every BUDGET_CHECK_LINES
+    lines (or on reaching max_lines) raises ExecutionAborted if the line
+    limit is hit, the time limit passed or the cancel flag is set. A
+    watchdog timer marks the time limit, so no clock is read per line
+    unless profiling. A single long Revit API call cannot be interrupted,
+    but the script stops soon after it returns.
+
+    With profile, each line is timed; time spent in library code or Revit
+    API calls counts toward the script line that made the call, and so
+    does time in functions kept from earlier scripts. A line's self time
+    excludes time spent in nested functions of the running script.
+
+    IronPython only traces code compiled while tracing is active, so the
+    script must be compiled after install(); set filename to the compiled
+    code's co_filename before running it. Session functions from a script
+    that ran without tracing are not traced either.
+    """
+
+    def __init__(self, profile=False, time_limit=None, max_lines=None, cancel_event=None):
+        self.profile = profile
+        self.time_limit = time_limit
+        self.max_lines = max_lines
+        self.cancel_event = cancel_event
+        self.filename = None
+        self.lines = {}
+        self.line_count = 0
+        self._next_check = 0
+        self._stack = []
+        self._started = None
+        self._watchdog = None
+        self._timed_out = False
+        self.elapsed = 0.0
+
+    def install(self):
+        self._started = _clock()
+        if self.time_limit:
+            self._watchdog = threading.Timer(self.time_limit, self._time_up)
+            self._watchdog.daemon = True
+            self._watchdog.start()
+        sys.settrace(self._trace_call)
+
+    def remove(self):
+        sys.settrace(None)
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        now = _clock()
+        while self._stack:
+            self._close_line(self._stack.pop(), now)
+        self.elapsed = now - self._started
+
+    def check_soon(self):
+        """Check the budget at the next line rather than up to BUDGET_CHECK_LINES later"""
+        self._next_check = 0
+
+    def _time_up(self):
+        self._timed_out = True
+        self.check_soon()
+
+    def _trace_call(self, frame, event, arg):
+        if event != "call":
+            return None
+        filename = frame.f_code.co_filename
+        if not filename.startswith(SCRIPT_FILENAME_PREFIXES):
+            return None
+        if not self.profile or filename != self.filename:
+            return self._count_line
+        self._stack.append({"frame": frame, "line": None, "start": _clock(), "child": 0.0})
+        return self._trace_line
+
+    def _count_line(self, frame, event, arg):
+        if event == "line":
+            self.line_count += 1
+            if self.line_count >= self._next_check:
+                self._check_budget()
+        return self._count_line
+
+    def _close_line(self, record, now):
+        if record["line"] is None:
+            return
+        elapsed = now - record["line_start"]
+        stats = self.lines.setdefault(record["line"], [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - record["child"]
+
+    def _check_budget(self):
+        self._next_check = self.line_count + BUDGET_CHECK_LINES
+        if self.max_lines:
+            if self.line_count > self.max_lines:
+                raise ExecutionAborted(
+                    "line_limit", "Execution exceeded the limit of {} lines".format(self.max_lines)
+                )
+            self._next_check = min(self._next_check, self.max_lines + 1)
+        if self._timed_out:
+            raise ExecutionAborted(
+                "time_limit", "Execution exceeded the time limit of {} seconds".format(self.time_limit)
+            )
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ExecutionAborted("cancelled", "Execution was cancelled")
+
+    def _trace_line(self, frame, event, arg):
+        now = _clock()
+        if not self._stack or self._stack[-1]["frame"] is not frame:
+            return self._trace_line
+        record = self._stack[-1]
+        if event == "line":
+            self.line_count += 1
+            if self.line_count >= self._next_check:
+                self._check_budget()
+            self._close_line(record, now)
+            record["line"] = frame.f_lineno
+            record["line_start"] = now
+            record["child"] = 0.0
+        elif event == "return":
+            self._close_line(record, now)
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["child"] += now - record["start"]
+        return self._trace_line
+
+    def report(self, source, top=DEFAULT_PROFILE_LINES):
+        """
+        Summarize the hottest lines by self time
+
+        Revit API (and other .NET) calls produce no trace events, so their
+        time is estimated as each line's self time beyond the cost of the
+        cheapest traced line, per hit.
+        """
+        source_lines = source.splitlines()
+        per_hit = [
+            self_time / hits for hits, _, self_time in self.lines.values() if hits
+        ]
+        overhead = min(per_hit) if per_hit else 0.0
+        api_time = sum(
+            max(0.0, self_time - hits * overhead)
+            for hits, _, self_time in self.lines.values()
+        )
+
+        hottest = sorted(self.lines.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        return {
+            "total_ms": round(self.elapsed * 1000, 2),
+            "revit_api_ms": round(api_time * 1000, 2),
+            "python_ms": round(max(0.0, self.elapsed - api_time) * 1000, 2),
+            "lines": [
+                {
+                    "line": line,
+                    "code": source_lines[line - 1].strip() if 0 < line <= len(source_lines) else "",
+                    "hits": hits,
+                    "total_ms": round(total * 1000, 3),
+                    "self_ms": round(self_time * 1000, 3),
+                }
+                for line, (hits, total, self_time) in hottest
+            ],
+        }
+
+
+class ReadOnlyModeError(Exception):
+    """Raised when a read-mode script tries to start a transaction"""
+
+
+class _ReadOnlyNamespace(object):
+    """Proxy for a module that refuses access to its transaction classes"""
+
+    def __init__(self, module, blocked_names):
+        self._module = module
+        self._blocked_names = blocked_names
+
+    def __getattr__(self, name):
+        if name in self._blocked_names:
+            raise ReadOnlyModeError(
+                "{} is not available in read mode".format(name)
+            )
+        return getattr(self._module, name)
+
+
+code_cache = CompiledCodeCache()
+execution_sessions = ExecutionSessions()
+execution_jobs = ExecutionJobs()
+result_cache = ResultCache()
+
+EXECUTION_MODES = ("read", "write")
+
+# Hidden from DB and pyrevit.revit in read mode
+_TRANSACTION_CLASSES = ("Transaction", "SubTransaction", "TransactionGroup")
+
+# Names provided by the route in every namespace; not part of session state
+_INJECTED_NAMES = ("doc", "DB", "revit", "print", "__builtins__", "args")
+
+
+def run_code(doc, load_code, description, mode="write", namespace=None, job_id=None,
+             time_limit=DEFAULT_TIME_LIMIT_SECONDS, max_lines=0, profile=False,
+             profile_top=DEFAULT_PROFILE_LINES, source=""):
+    """
+    Run code in Revit context with output capture, transaction handling,
+    budgets and optional profiling
+
+    Args:
+        doc: Active document
+        load_code: Callable taking "traced" and returning (code object,
+            cached). It is called after tracing starts, since IronPython only
+            traces code compiled while tracing is active.
+        description: Used in the transaction name and logs
+        mode: "write" runs in a transaction committed on success; "read"
+            runs without one and rejects modifications
+        namespace: Namespace to run in (e.g. a session's); the common
+            Revit names are added to it
+        job_id: Registers the execution for /execute_output/ and
+            /cancel_execution/
+        source: Script source, for profile line text
+
+    Returns:
+        tuple: (response data, HTTP status)
+    """
+    logger.info("Executing code ({} mode): {}".format(mode, description))
+
+    if mode == "write":
+        # Create a transaction for any model modifications
+        t = DB.Transaction(doc, "MCP Code Execution: {}".format(description))
+    else:
+        # Not a transaction: rolling the group back undoes any
+        # transaction a read-mode script still manages to commit
+        t = DB.TransactionGroup(doc, "MCP Read-Only Execution")
+    t.Start()
+
+    # Capture stdout to return any print statements
+    job = execution_jobs.start(job_id)
+    captured_output = job.output
+    old_stdout = sys.stdout
+
+    try:
+        sys.stdout = captured_output
+
+        # Make common Revit objects available
+        if namespace is None:
+            namespace = {}
+        namespace.update({
+            "doc": doc,
+            "DB": DB if mode == "write" else _ReadOnlyNamespace(DB, _TRANSACTION_CLASSES),
+            "revit": revit if mode == "write" else _ReadOnlyNamespace(revit, _TRANSACTION_CLASSES),
+            "__builtins__": __builtins__,
+            "print": lambda *args: captured_output.write(
+                " ".join(str(arg) for arg in args) + "\n"
+            ),
+        })
+
+        # Execute the code, traced when it has a budget, can be
+        # cancelled or is profiled
+        if profile or time_limit or max_lines or job_id:
+            tracer = ScriptTracer(
+                profile=profile,
+                time_limit=time_limit,
+                max_lines=max_lines,
+                cancel_event=job.cancel_event,
+            )
+            job.tracer = tracer
+            tracer.install()
+            try:
+                code_object, code_cached = load_code(True)
+                tracer.filename = code_object.co_filename
+                exec(code_object, namespace)
+            finally:
+                tracer.remove()
+        else:
+            code_object, code_cached = load_code(False)
+            exec(code_object, namespace)
+
+        # Restore stdout
+        sys.stdout = old_stdout
+
+        # Get any printed output
+        output, output_truncated = captured_output.close()
+
+        # Commit the transaction, or end the read-only group
+        if mode == "write":
+            t.Commit()
+        else:
+            t.RollBack()
+
+        response_data = {
+            "status": "success",
+            "description": description,
+            "mode": mode,
+            "output": (
+                output
+                if output
+                else "Code executed successfully (no output)"
+            ),
+            "compile_cached": code_cached,
+        }
+        if output_truncated:
+            response_data.update({
+                "output_truncated": True,
+                "output_chars": captured_output.size,
+                "output_file": captured_output.path,
+                "output_export_id": captured_output.export_id,
+            })
+        if profile:
+            response_data["profile"] = tracer.report(source, profile_top)
+        return response_data, 200
+
+    except (Exception, ExecutionAborted) as exec_error:
+        # Restore stdout if something went wrong
+        sys.stdout = old_stdout
+
+        # Rollback transaction if it's still active
+        try:
+            if t.HasStarted() and not t.HasEnded():
+                t.RollBack()
+        except Exception as rollback_error:
+            logger.error("Rollback failed: {}".format(str(rollback_error)))
+
+        output, output_truncated = captured_output.close()
+
+        # Get the full traceback
+        error_traceback = traceback.format_exc()
+
+        logger.error("Code execution failed: {}".format(str(exec_error)))
+        logger.error("Traceback: {}".format(error_traceback))
+
+        error_message = str(exec_error)
+        if mode == "read" and isinstance(
+            exec_error, (ModificationOutsideTransactionException, ReadOnlyModeError)
+        ):
+            error_message = (
+                "Read mode cannot modify the document; use mode='write'. ({})".format(
+                    error_message
+                )
+            )
+
+        response_data = {
+            "status": "error",
+            "error": error_message,
+            "traceback": error_traceback,
+            "output": output,
+        }
+        if isinstance(exec_error, ExecutionAborted):
+            response_data["status"] = "aborted"
+            response_data["reason"] = exec_error.reason
+            response_data["rolled_back"] = mode == "write"
+        if output_truncated:
+            response_data.update({
+                "output_truncated": True,
+                "output_file": captured_output.path,
+                "output_export_id": captured_output.export_id,
+            })
+        return response_data, 500
+
+
+def parse_execution_options(data):
+    """Read the execution options shared by /execute_code/ and /run_procedure/"""
+    return {
+        "job_id": data.get("job_id"),
+        "time_limit": parse_int_option(
+            data.get("time_limit"), DEFAULT_TIME_LIMIT_SECONDS, 0, MAX_TIME_LIMIT_SECONDS
+        ),
+        "max_lines": parse_int_option(data.get("max_lines"), 0, 0, sys.maxsize),
+        "profile": bool(data.get("profile")),
+        "profile_top": parse_int_option(
+            data.get("profile_top"), DEFAULT_PROFILE_LINES, 1, MAX_PROFILE_LINES
+        ),
+    }
+
 
 def register_code_execution_routes(api):
     """Register code execution routes with the API."""
@@ -26,8 +825,57 @@ def register_code_execution_routes(api):
         Expected payload:
         {
             "code": "python code as string",
-            "description": "optional description of what the code does"
+            "description": "optional description of what the code does",
+            "mode": "write" (default) or "read",
+            "session": "optional name of a namespace kept between calls",
+            "reset_session": false,
+            "args": {"optional": "values available to the code as args"},
+            "cache": false,
+            "refresh": false,
+            "job_id": "optional client-generated id for /execute_output/",
+            "echo_code": false,
+            "profile": false,
+            "profile_top": 20,
+            "time_limit": 300,
+            "max_lines": 0
         }
+
+        In write mode the code runs in a transaction that is committed on
+        success and rolled back on error. Read mode opens no transaction, so
+        queries skip commit, regeneration and undo entries; attempts to
+        modify the document fail, and transactions cannot be started.
+
+        Compiled code is cached by source hash, so re-sending the same
+        script skips compilation. With "session", variables, functions and
+        imports defined by one call are available to later calls with the
+        same session name.
+
+        With "job_id", output printed so far can be polled from
+        /execute_output/<job_id>/<offset> while the script runs. Output
+        beyond about a million characters is spilled to a file; the
+        response then holds only its tail plus "output_file" and an
+        "output_export_id" for /export_chunk/.
+
+        With "profile", every line of the script is timed and the response
+        includes the profile_top lines with the most self time, their hit
+        counts and cumulative time, and total time split into estimated
+        Revit API time and Python time. Tracing slows the script down, so
+        compare lines with each other rather than with unprofiled runs.
+
+        With "cache", a read-mode script's response is cached by source,
+        args and document version, and repeated calls return it without
+        executing until the model changes ("cache": "hit" in the response).
+        "refresh" re-executes and replaces the cached response. Caching
+        cannot be combined with write mode or a session, and is bypassed
+        when profiling.
+
+        Scripts are aborted, and their transaction rolled back, once they
+        run longer than "time_limit" seconds (0 for no limit), execute more
+        than "max_lines" lines (0 for no limit), or are cancelled through
+        /cancel_execution/<job_id>. Limits and cancellation are checked
+        every 1000 script lines (time limit and cancellation at the next
+        line once they trigger), so a single long Revit API call still
+        runs to completion.
         """
         try:
             # Parse the request data
@@ -38,87 +886,139 @@ def register_code_execution_routes(api):
             )
             code_to_execute = data.get("code", "")
             description = data.get("description", "Code execution")
+            mode = data.get("mode", "write")
+            session_name = data.get("session")
+            echo_code = bool(data.get("echo_code"))
+            args = data.get("args") or {}
+            use_cache = bool(data.get("cache"))
 
             if not code_to_execute:
                 return safe_make_response(
                     data={"error": "No code provided"}, status=400
                 )
 
-            logger.info("Executing code: {}".format(description))
+            if mode not in EXECUTION_MODES:
+                return safe_make_response(
+                    data={"error": "mode must be 'read' or 'write'"}, status=400
+                )
 
-            # Create a transaction for any model modifications
-            t = DB.Transaction(doc, "MCP Code Execution: {}".format(description))
-            t.Start()
+            if not isinstance(args, dict):
+                return safe_make_response(
+                    data={"error": "args must be an object"}, status=400
+                )
 
-            try:
-                # Capture stdout to return any print statements
-                old_stdout = sys.stdout
-                captured_output = StringIO()
-                sys.stdout = captured_output
-
-                # Create a namespace with common Revit objects available
-                namespace = {
-                    "doc": doc,
-                    "DB": DB,
-                    "revit": revit,
-                    "__builtins__": __builtins__,
-                    "print": lambda *args: captured_output.write(
-                        " ".join(str(arg) for arg in args) + "\n"
-                    ),
-                }
+            if use_cache and (mode != "read" or session_name):
+                return safe_make_response(
+                    data={"error": "cache requires mode='read' and no session"},
+                    status=400,
+                )
+
+            # Use the session's namespace or a fresh one
+            if session_name:
+                namespace = execution_sessions.namespace(
+                    session_name, reset=bool(data.get("reset_session"))
+                )
+            else:
+                namespace = {}
+            namespace["args"] = args
 
-                # Execute the code
-                exec(code_to_execute, namespace)
+            options = parse_execution_options(data)
 
-                # Restore stdout
-                sys.stdout = old_stdout
+            def execute():
+                return run_code(
+                    doc,
+                    lambda traced: code_cache.get(code_to_execute, traced=traced),
+                    description,
+                    mode=mode,
+                    namespace=namespace,
+                    source=code_to_execute,
+                    **options
+                )
 
-                # Get any printed output
-                output = captured_output.getvalue()
-                captured_output.close()
+            if use_cache and not options["profile"]:
+                response_data, status = result_cache.run(
+                    doc, code_to_execute, args, execute, refresh=bool(data.get("refresh"))
+                )
+            else:
+                response_data, status = execute()
 
-                # Commit the transaction
-                t.Commit()
+            if echo_code:
+                key = "code_executed" if status == 200 else "code_attempted"
+                response_data[key] = code_to_execute
+            if session_name and status == 200:
+                response_data["session"] = session_name
+                response_data["session_kept"] = execution_sessions.update_size(
+                    session_name, _INJECTED_NAMES
+                )
+            return safe_make_response(data=response_data, status=status)
 
+        except Exception as e:
+            logger.error("Execute code request failed: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    @api.route("/execute_output/<job_id>/<int:offset>", methods=["GET"])
+    def execute_output(job_id, offset, request):
+        """
+        Read output of a running or recently finished execution from offset.
+
+        Query parameters:
+            limit: Characters to return (default 65536)
+
+        Runs on the server thread, so it answers while the script runs.
+        "skipped" counts characters that were spilled to the output file
+        and are no longer in memory.
+        """
+        try:
+            job = execution_jobs.get(job_id)
+            if job is None:
                 return safe_make_response(
-                    data={
-                        "status": "success",
-                        "description": description,
-                        "output": (
-                            output
-                            if output
-                            else "Code executed successfully (no output)"
-                        ),
-                        "code_executed": code_to_execute,
-                    }
+                    data={"error": "Unknown execution job '{}'".format(job_id)},
+                    status=404,
                 )
+            channel = job.output
 
-            except Exception as exec_error:
-                # Restore stdout if something went wrong
-                sys.stdout = old_stdout
-
-                # Rollback transaction if it's still active
-                if t.HasStarted() and not t.HasEnded():
-                    t.RollBack()
+            limit = parse_int_option(
+                get_request_params(request).get("limit"),
+                DEFAULT_OUTPUT_READ_CHARS, 1, MAX_OUTPUT_MEMORY_CHARS
+            )
+            done = channel.done
+            text, next_offset, skipped = channel.read(offset, limit)
+            return safe_make_response(data={
+                "output": text,
+                "offset": next_offset,
+                "skipped": skipped,
+                "done": done and next_offset >= channel.size,
+            })
 
-                # Get the full traceback
-                error_traceback = traceback.format_exc()
+        except Exception as e:
+            logger.error("Failed to read execution output: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
 
-                logger.error("Code execution failed: {}".format(str(exec_error)))
-                logger.error("Traceback: {}".format(error_traceback))
+    @api.route("/cancel_execution/<job_id>", methods=["POST"])
+    def cancel_execution(job_id):
+        """
+        Ask a running execution to stop at its next script line.
 
+        Runs on the server thread, so it is handled while the script runs.
+        The execution's response reports status "aborted" with reason
+        "cancelled", and its transaction is rolled back.
+        """
+        try:
+            job = execution_jobs.get(job_id)
+            if job is None:
                 return safe_make_response(
-                    data={
-                        "status": "error",
-                        "error": str(exec_error),
-                        "traceback": error_traceback,
-                        "code_attempted": code_to_execute,
-                    },
-                    status=500,
+                    data={"error": "Unknown execution job '{}'".format(job_id)},
+                    status=404,
                 )
+            if job.output.done:
+                return safe_make_response(data={"status": "finished", "job_id": job_id})
+
+            job.cancel()
+            logger.info("Cancelling execution {}".format(job_id))
+            return safe_make_response(data={"status": "cancelling", "job_id": job_id})
 
         except Exception as e:
-            logger.error("Execute code request failed: {}".format(str(e)))
+            logger.error("Failed to cancel execution: {}".format(str(e)))
             return safe_make_response(data={"error": str(e)}, status=500)
 
     logger.info("Code execution routes registered successfully.")
@@ -566,6 +566,72 @@ def get_parameter_value_for_sorting(element, parameter_name):
         return ("None", "None")
 
 
+def parameter_value_sort_key(display_value, raw_value):
+    """
+    Sorting key for grouped parameter values that handles different data types
+
+    Numbers sort first (numerically), then booleans and strings, then "None".
+    """
+    # Handle None values
+    if display_value == "None" or raw_value == "None":
+        return (2, 0)  # Put None at the end
+
+    # Handle boolean values
+    if display_value in ["True", "False"]:
+        return (1, 0 if display_value == "False" else 1)
+
+    # Handle numeric values (int or float)
+    if isinstance(raw_value, (int, float)):
+        return (0, raw_value)
+
+    # Handle string values that might contain numbers
+    try:
+        numeric_sort_value = safe_float_conversion(display_value)
+        if numeric_sort_value != float('inf'):
+            return (0, numeric_sort_value)
+    except:
+        pass
+
+    # Fallback to string sorting
+    return (1.5, str(display_value).lower())
+
+
+def group_elements_by_parameters(elements, parameter_names, value_getter=None):
+    """
+    Group elements by the display values of one or more parameters
+
+    Args:
+        elements: Iterable of Revit elements
+        parameter_names (list): Names of the parameters to group by
+        value_getter: Function (element, parameter_name) -> (raw_value, display_value);
+            defaults to get_parameter_value_for_sorting
+
+    Returns:
+        tuple: (groups, sorted_keys) where groups maps a tuple of display values
+        to its list of elements and sorted_keys orders the group keys
+    """
+    value_getter = value_getter or get_parameter_value_for_sorting
+    groups = defaultdict(list)
+    value_data = {}  # Raw value of the first element seen per (position, display value)
+
+    for element in elements:
+        key = []
+        for position, parameter_name in enumerate(parameter_names):
+            raw_value, display_value = value_getter(element, parameter_name)
+            key.append(display_value)
+            if (position, display_value) not in value_data:
+                value_data[(position, display_value)] = raw_value
+        groups[tuple(key)].append(element)
+
+    def sort_key(key):
+        return tuple(
+            parameter_value_sort_key(display_value, value_data[(position, display_value)])
+            for position, display_value in enumerate(key)
+        )
+
+    return groups, sorted(groups.keys(), key=sort_key)
+
+
 def color_elements_by_parameter(
     doc, category_name, parameter_name, use_gradient=False, custom_colors=None
 ):
@@ -613,48 +679,9 @@ def color_elements_by_parameter(
             }
 
         # Group elements by parameter value using improved method
-        parameter_groups = defaultdict(list)
-        value_data = {}  # Store both raw and display values
-
-        for element in elements:
-            raw_value, display_value = get_parameter_value_for_sorting(element, parameter_name)
-            
-            # Use display value as key for grouping
-            parameter_groups[display_value].append(element)
-            
-            # Store raw value for sorting
-            if display_value not in value_data:
-                value_data[display_value] = raw_value
-
-        # Sort values properly based on their type and content
-        def sort_key(display_value):
-            """Advanced sorting key that handles different data types"""
-            raw_value = value_data[display_value]
-            
-            # Handle None values
-            if display_value == "None" or raw_value == "None":
-                return (2, 0)  # Put None at the end
-            
-            # Handle boolean values
-            if display_value in ["True", "False"]:
-                return (1, 0 if display_value == "False" else 1)
-            
-            # Handle numeric values (int or float)
-            if isinstance(raw_value, (int, float)):
-                return (0, raw_value)
-            
-            # Handle string values that might contain numbers
-            try:
-                numeric_sort_value = safe_float_conversion(display_value)
-                if numeric_sort_value != float('inf'):
-                    return (0, numeric_sort_value)
-            except:
-                pass
-            
-            # Fallback to string sorting
-            return (1.5, str(display_value).lower())
-
-        unique_values = sorted(parameter_groups.keys(), key=sort_key)
+        groups, sorted_keys = group_elements_by_parameters(elements, [parameter_name])
+        parameter_groups = dict((key[0], group) for key, group in groups.items())
+        unique_values = [key[0] for key in sorted_keys]
         value_count = len(unique_values)
 
         logger.info("Sorted values for gradient: %s", unique_values[:10])  # Log first 10 for debugging
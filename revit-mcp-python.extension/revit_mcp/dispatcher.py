@@ -0,0 +1,353 @@
+# -*- coding: UTF-8 -*-
+"""
+Request Dispatcher Module for Revit MCP
+Queues Revit-context requests and runs several of them per external event
+"""
+from Autodesk.Revit.UI import ExternalEvent, ExternalEventRequest, IExternalEventHandler
+from collections import deque
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from utils import safe_make_response
+
+logger = logging.getLogger(__name__)
+
+# "0"/"off" registers routes directly with pyRevit, one external event per request
+DISPATCHER_ENABLED = os.environ.get("REVIT_MCP_DISPATCHER", "1").lower() not in (
+    "0", "off", "false", "no"
+)
+
+# Each external event keeps draining queued requests until this much time
+# has passed, then yields to Revit and raises the event again
+DRAIN_BUDGET_SECONDS = 0.25
+# Reads go first, but a write never waits longer than this for reads
+WRITE_MAX_DEFER_SECONDS = 1.0
+# Requests still queued after this long (e.g. Revit stuck in a modal
+# dialog) are dropped with a 503; requests already running are awaited
+QUEUE_TIMEOUT_SECONDS = 10 * 60
+# Waiting requests retry raising the event this often in case Revit
+# refused an earlier Raise()
+RAISE_RETRY_SECONDS = 1.0
+# Wait and run times of this many recent requests are kept for stats
+TIMING_SAMPLES = 1000
+
+# Handler arguments that make pyRevit run a handler in Revit context
+CONTEXT_ARGS = ("uiapp", "uidoc", "doc")
+
+# POST routes that only read the model; all GET routes are reads too
+READ_ONLY_POST_ROUTES = (
+    "/list_category_parameters/",
+    "/export_model_data/",
+    "/get_parameters/",
+    "/query/",
+    "/aggregate/",
+    "/sheet_versions/",
+)
+# Routes that are reads when their payload has "mode": "read"
+MODE_ROUTES = ("/execute_code/",)
+# Routes that are reads when the stored procedure they run is read-mode
+PROCEDURE_ROUTES = ("/run_procedure/<name>",)
+
+_clock = getattr(time, "perf_counter", None) or time.clock
+
+
+class DispatchJob(object):
+    """One queued request for a Revit-context handler"""
+
+    def __init__(self, handler, kwargs, context_args, read):
+        self.handler = handler
+        self.kwargs = kwargs
+        self.context_args = context_args
+        self.read = read
+        self.enqueued_at = _clock()
+        self.started_at = None
+        self.response = None
+        self.done = threading.Event()
+
+
+class RequestDispatcher(IExternalEventHandler):
+    """
+    External event handler that drains a queue of route requests
+
+    pyRevit raises one external event per Revit-context request, so every
+    request waits for its own idle cycle. Here the HTTP threads queue their
+    requests and wait, and each external event runs as many queued requests
+    as fit in DRAIN_BUDGET_SECONDS (always at least one), reads first.
+    """
+
+    def __init__(self, budget=DRAIN_BUDGET_SECONDS):
+        self.budget = budget
+        self._reads = deque()
+        self._writes = deque()
+        self._lock = threading.Lock()
+        self._event = None
+        self._raised = False
+        self.cycles = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.max_cycle_jobs = 0
+        self._waits = {"read": deque(maxlen=TIMING_SAMPLES), "write": deque(maxlen=TIMING_SAMPLES)}
+        self._run_times = deque(maxlen=TIMING_SAMPLES)
+
+    def start(self):
+        """Create the external event; must be called in Revit API context"""
+        self._event = ExternalEvent.Create(self)
+
+    def GetName(self):
+        return "Revit MCP Request Dispatcher"
+
+    def dispatch(self, handler, kwargs, context_args, read):
+        """Queue a handler call, wait for it to run and return its response"""
+        job = DispatchJob(handler, kwargs, context_args, read)
+        with self._lock:
+            (self._reads if read else self._writes).append(job)
+        self._ensure_raised()
+
+        deadline = _clock() + QUEUE_TIMEOUT_SECONDS
+        while not job.done.wait(RAISE_RETRY_SECONDS):
+            if _clock() < deadline:
+                self._ensure_raised()
+                continue
+            with self._lock:
+                queue = self._reads if read else self._writes
+                if job.started_at is None and job in queue:
+                    queue.remove(job)
+                    self.timed_out += 1
+                    return safe_make_response(
+                        data={"error": "Revit did not process the request in time; it may be busy"},
+                        status=503,
+                    )
+            job.done.wait()
+            break
+        return job.response
+
+    def _ensure_raised(self):
+        """Raise the event if requests are queued and it is not raised yet"""
+        with self._lock:
+            if self._raised or not (self._reads or self._writes):
+                return
+            self._raised = True
+        self._raise()
+
+    def _raise(self):
+        """Raise the event; if Revit does not accept it, mark it not raised"""
+        try:
+            result = self._event.Raise()
+        except Exception as e:
+            logger.error("Failed to raise dispatcher event: {}".format(str(e)))
+            result = None
+        if result != ExternalEventRequest.Accepted:
+            logger.warning("Dispatcher event not accepted: {}".format(result))
+            with self._lock:
+                self._raised = False
+
+    def _next_job(self):
+        if self._writes and (
+            not self._reads
+            or _clock() - self._writes[0].enqueued_at > WRITE_MAX_DEFER_SECONDS
+        ):
+            return self._writes.popleft()
+        if self._reads:
+            return self._reads.popleft()
+        return None
+
+    def Execute(self, uiapp):
+        deadline = _clock() + self.budget
+        count = 0
+        try:
+            while True:
+                with self._lock:
+                    if count and _clock() >= deadline:
+                        break
+                    job = self._next_job()
+                    if job is None:
+                        break
+                    job.started_at = _clock()
+                self._run(job, uiapp)
+                count += 1
+        finally:
+            # Whatever happened, leave the event raised exactly when
+            # requests are still queued
+            with self._lock:
+                raise_again = bool(self._reads or self._writes)
+                self._raised = raise_again
+            self.cycles += 1
+            self.max_cycle_jobs = max(self.max_cycle_jobs, count)
+            if raise_again:
+                self._raise()
+
+    def _run(self, job, uiapp):
+        try:
+            uidoc = uiapp.ActiveUIDocument
+            context = {
+                "uiapp": uiapp,
+                "uidoc": uidoc,
+                "doc": uidoc.Document if uidoc else None,
+            }
+            kwargs = dict(job.kwargs)
+            for name in job.context_args:
+                kwargs[name] = context[name]
+            job.response = job.handler(**kwargs)
+        except Exception as e:
+            logger.error("Dispatched request failed: {}".format(str(e)))
+            job.response = safe_make_response(data={"error": str(e)}, status=500)
+        finally:
+            finished_at = _clock()
+            self._waits["read" if job.read else "write"].append(job.started_at - job.enqueued_at)
+            self._run_times.append(finished_at - job.started_at)
+            self.completed += 1
+            job.done.set()
+
+    def stats(self):
+        with self._lock:
+            now = _clock()
+            queued = list(self._reads) + list(self._writes)
+            depth = {"read": len(self._reads), "write": len(self._writes)}
+            oldest = max([now - job.enqueued_at for job in queued] or [0])
+
+        def summary(samples):
+            samples = sorted(samples)
+            if not samples:
+                return {"count": 0}
+            return {
+                "count": len(samples),
+                "avg_ms": round(1000 * sum(samples) / len(samples), 1),
+                "p95_ms": round(1000 * samples[int(0.95 * (len(samples) - 1))], 1),
+                "max_ms": round(1000 * samples[-1], 1),
+            }
+
+        return {
+            "enabled": True,
+            "queue_depth": depth,
+            "oldest_queued_seconds": round(oldest, 3),
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "cycles": self.cycles,
+            "avg_requests_per_cycle": round(self.completed / float(self.cycles), 2) if self.cycles else 0,
+            "max_requests_per_cycle": self.max_cycle_jobs,
+            "wait": {name: summary(samples) for name, samples in self._waits.items()},
+            "run": summary(self._run_times),
+            "budget_seconds": self.budget,
+        }
+
+
+def _is_read_procedure(name):
+    # Imported on use so the dispatcher does not load the code execution modules
+    from procedures import procedure_registry
+    procedure = procedure_registry.get(name)
+    return procedure is not None and procedure.mode == "read"
+
+
+def _is_read_request(request):
+    try:
+        data = request.data
+        if isinstance(data, str):
+            data = json.loads(data)
+        return data.get("mode") == "read"
+    except Exception:
+        return False
+
+
+class DispatchingAPI(object):
+    """
+    Wrapper around a routes.API that sends Revit-context handlers through
+    the dispatcher
+
+    Handlers without uiapp/uidoc/doc arguments are registered unchanged.
+    Others are registered as a generated function with the same path
+    parameters and no context arguments, so pyRevit runs it on the HTTP
+    thread, where it queues the real handler and waits for its response.
+    """
+
+    def __init__(self, api, dispatcher):
+        self._api = api
+        self._dispatcher = dispatcher
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def route(self, pattern, methods=None):
+        register = self._api.route(pattern, methods=methods or ["GET"])
+
+        def decorator(handler):
+            arg_names = inspect.getargspec(handler)[0]
+            context_args = [name for name in arg_names if name in CONTEXT_ARGS]
+            if not context_args:
+                return register(handler)
+            register(self._make_wrapper(pattern, methods or ["GET"], handler, arg_names, context_args))
+            return handler
+
+        return decorator
+
+    def _make_wrapper(self, pattern, methods, handler, arg_names, context_args):
+        dispatcher = self._dispatcher
+        always_read = pattern in READ_ONLY_POST_ROUTES or all(
+            method.upper() == "GET" for method in methods
+        )
+        path_args = [name for name in arg_names if name not in CONTEXT_ARGS and name != "request"]
+
+        def submit(request, kwargs):
+            if "request" in arg_names:
+                kwargs["request"] = request
+            read = (
+                always_read
+                or (pattern in MODE_ROUTES and _is_read_request(request))
+                or (pattern in PROCEDURE_ROUTES and _is_read_procedure(kwargs.get("name")))
+            )
+            return dispatcher.dispatch(handler, kwargs, context_args, read)
+
+        # pyRevit passes path parameters and the request by argument name,
+        # so the wrapper needs a real signature rather than *args/**kwargs
+        source = "def {name}({args}):\n    return _submit(request, {{{kwargs}}})\n".format(
+            name=handler.__name__,
+            args=", ".join(path_args + ["request"]),
+            kwargs=", ".join("{0!r}: {0}".format(name) for name in path_args),
+        )
+        namespace = {"_submit": submit}
+        exec(source, namespace)
+        wrapper = namespace[handler.__name__]
+        wrapper.__doc__ = handler.__doc__
+        return wrapper
+
+
+request_dispatcher = RequestDispatcher() if DISPATCHER_ENABLED else None
+
+
+def create_route_api(api):
+    """
+    Return the API object route modules should register with
+
+    Starts the dispatcher's external event, so it must be called in Revit
+    API context (e.g. from startup.py). Returns api itself when the
+    dispatcher is disabled.
+    """
+    if request_dispatcher is None:
+        logger.info("Request dispatcher disabled")
+        return api
+    request_dispatcher.start()
+    return DispatchingAPI(api, request_dispatcher)
+
+
+def register_dispatcher_routes(api):
+    """Register dispatcher routes with the API"""
+
+    @api.route("/dispatcher_stats/", methods=["GET"])
+    def dispatcher_stats():
+        """
+        Queue depth and wait times of Revit-context requests.
+
+        Runs on the server thread, so it answers while requests are queued.
+        """
+        try:
+            if request_dispatcher is None:
+                return safe_make_response(data={"enabled": False})
+            return safe_make_response(data=request_dispatcher.stats())
+        except Exception as e:
+            logger.error("Failed to get dispatcher stats: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    logger.info("Dispatcher routes registered successfully.")
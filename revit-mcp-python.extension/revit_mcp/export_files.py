@@ -0,0 +1,100 @@
+# -*- coding: UTF-8 -*-
+"""
+Export Files Module for Revit MCP
+Download and lifecycle routes for export files handed off to the MCP server
+"""
+
+from pyrevit import routes
+import base64
+import logging
+import os
+
+from utils import (
+    safe_make_response,
+    export_workspace,
+    get_request_params,
+    parse_int_option,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def register_export_file_routes(api):
+    """Register export file routes with the API"""
+
+    @api.route('/export_chunk/<export_id>/<int:offset>', methods=["GET"])
+    def export_chunk(export_id, offset, request):
+        """
+        Return one piece of a published export file.
+
+        Query parameters:
+            length: Bytes to read (default 4 MB, at most 16 MB)
+
+        Runs on the server thread and reads only the requested range, so
+        large exports never sit in memory as a whole.
+        """
+        try:
+            length = parse_int_option(
+                get_request_params(request).get("length"),
+                DEFAULT_CHUNK_BYTES, 1, MAX_CHUNK_BYTES
+            )
+            # Reading marks the export as used and keeps it from being
+            # collected mid-download
+            with export_workspace.in_use(export_id):
+                path = export_workspace.published_file(export_id)
+                if path is None or not os.path.isfile(path):
+                    return safe_make_response(
+                        data={"error": "Unknown or already released export '{}'".format(export_id)},
+                        status=404
+                    )
+
+                total_size = os.path.getsize(path)
+                with open(path, "rb") as export_file:
+                    export_file.seek(offset)
+                    chunk = export_file.read(length)
+
+            return safe_make_response(data={
+                "status": "success",
+                "export_id": export_id,
+                "offset": offset,
+                "length": len(chunk),
+                "total_size": total_size,
+                "eof": offset + len(chunk) >= total_size,
+                "data": base64.b64encode(chunk).decode("utf-8")
+            })
+
+        except Exception as e:
+            logger.error("Failed to read export chunk: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to read export chunk: {}".format(str(e))},
+                status=500
+            )
+
+    @api.route('/release_export/<export_id>', methods=["POST"])
+    def release_export(export_id):
+        """
+        Delete a handed-off export once the client has read it.
+
+        Runs on the server thread, so it never waits for Revit.
+        """
+        try:
+            if export_workspace.path(export_id) is None:
+                return safe_make_response(
+                    data={"error": "Unknown or already released export '{}'".format(export_id)},
+                    status=404
+                )
+
+            export_workspace.release(export_id)
+            return safe_make_response(data={"status": "success", "export_id": export_id})
+
+        except Exception as e:
+            logger.error("Failed to release export: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to release export: {}".format(str(e))},
+                status=500
+            )
+
+    logger.info("Export file routes registered successfully")
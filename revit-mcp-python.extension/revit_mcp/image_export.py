@@ -0,0 +1,512 @@
+# -*- coding: UTF-8 -*-
+"""
+Image Export Module for Revit MCP
+Shared view and sheet image export with an on-disk render cache
+"""
+
+from pyrevit import DB
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from System.Collections.Generic import List
+
+from utils import document_key, export_workspace
+from changes import journal
+
+logger = logging.getLogger(__name__)
+
+# Each RenderCache uses its own folder under this root, so Revit sessions
+# running side by side do not delete each other's files
+RENDER_CACHE_ROOT = os.path.join(tempfile.gettempdir(), "RevitMCPRenderCache")
+# Folders and files in the root untouched for this long are left over from
+# ended sessions and removed at startup
+RENDER_CACHE_STALE_SECONDS = 24 * 60 * 60
+MAX_RENDER_CACHE_BYTES = 256 * 1024 * 1024
+MAX_RENDER_CACHE_ENTRIES = 500
+
+# Above this many changed ids since a render, re-rendering is cheaper than
+# checking whether the changes touch the view
+MAX_REVALIDATE_CHANGES = 5000
+
+# Limits for caller-supplied export options
+IMAGE_RESOLUTIONS = (72, 150, 300, 600)
+MIN_PIXEL_SIZE = 64
+MAX_PIXEL_SIZE = 8192
+# Cropped exports render the full view larger so the crop keeps its pixel size
+MAX_EXPORT_PIXEL_SIZE = 15000
+
+# format name -> (ImageFileType member, content type, file extension)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", ".png"),
+    "jpeg": ("JPEGMedium", "image/jpeg", ".jpg"),
+}
+
+IMAGE_PRESETS = {
+    "default": {"resolution": 150, "pixel_size": 1024, "format": "png"},
+    "thumbnail": {"resolution": 72, "pixel_size": 512, "format": "jpeg"},
+    "high_res": {"resolution": 300, "pixel_size": 4096, "format": "png"},
+}
+
+# Changes to these elements can alter a view's appearance without touching
+# any element visible in it, so they always invalidate cached renders
+_STYLE_CLASSES = (
+    DB.ElementType,
+    DB.Material,
+    DB.GraphicsStyle,
+    DB.View,
+    DB.FillPatternElement,
+    DB.LinePatternElement,
+)
+
+
+class ImageExportError(Exception):
+    """Raised when Revit does not produce an image file"""
+
+
+class ImageOptionsError(ValueError):
+    """Raised for invalid image export options (reported as HTTP 400)"""
+
+
+def _parse_crop(value):
+    if isinstance(value, (list, tuple)):
+        parts = value
+    else:
+        parts = str(value).split(",")
+    try:
+        crop = tuple(round(float(part), 4) for part in parts)
+    except (TypeError, ValueError):
+        crop = ()
+    if len(crop) != 4:
+        raise ImageOptionsError("crop must be four numbers: left,top,right,bottom")
+    left, top, right, bottom = crop
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        raise ImageOptionsError(
+            "crop values are fractions of the image with 0 <= left < right <= 1 "
+            "and 0 <= top < bottom <= 1"
+        )
+    return crop
+
+
+def parse_image_options(params):
+    """
+    Validate image export options from request parameters
+
+    Args:
+        params: dict with optional preset, resolution, pixel_size, format,
+            zoom and crop values (strings or numbers)
+
+    Returns:
+        tuple: Sorted (name, value) pairs, usable as a cache key
+    """
+    preset_name = params.get("preset") or "default"
+    if preset_name not in IMAGE_PRESETS:
+        raise ImageOptionsError("preset must be one of: {}".format(
+            ", ".join(sorted(IMAGE_PRESETS))
+        ))
+    options = dict(IMAGE_PRESETS[preset_name])
+
+    if params.get("resolution") is not None:
+        try:
+            options["resolution"] = int(params["resolution"])
+        except (TypeError, ValueError):
+            options["resolution"] = None
+        if options["resolution"] not in IMAGE_RESOLUTIONS:
+            raise ImageOptionsError("resolution must be one of: {}".format(
+                ", ".join(str(dpi) for dpi in IMAGE_RESOLUTIONS)
+            ))
+
+    if params.get("pixel_size") is not None:
+        try:
+            options["pixel_size"] = int(params["pixel_size"])
+        except (TypeError, ValueError):
+            raise ImageOptionsError("pixel_size must be an integer")
+        if not MIN_PIXEL_SIZE <= options["pixel_size"] <= MAX_PIXEL_SIZE:
+            raise ImageOptionsError("pixel_size must be between {} and {}".format(
+                MIN_PIXEL_SIZE, MAX_PIXEL_SIZE
+            ))
+
+    if params.get("format") is not None:
+        image_format = str(params["format"]).lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in IMAGE_FORMATS:
+            raise ImageOptionsError("format must be png or jpeg")
+        options["format"] = image_format
+
+    # zoom is a percentage of actual size; without it the view is fit to pixel_size
+    options["zoom"] = None
+    if params.get("zoom") not in (None, "", "fit"):
+        try:
+            options["zoom"] = int(params["zoom"])
+        except (TypeError, ValueError):
+            options["zoom"] = 0
+        if not 1 <= options["zoom"] <= 100:
+            raise ImageOptionsError("zoom must be 'fit' or a percentage from 1 to 100")
+
+    options["crop"] = None
+    if params.get("crop") not in (None, ""):
+        options["crop"] = _parse_crop(params["crop"])
+
+    return tuple(sorted(options.items()))
+
+
+def image_content_type(options):
+    """Content type of images exported with the given options"""
+    return IMAGE_FORMATS[dict(options)["format"]][1]
+
+
+DEFAULT_IMAGE_OPTIONS = parse_image_options({})
+
+
+def _visible_element_ids(doc, view):
+    return set(
+        element_id.IntegerValue
+        for element_id in DB.FilteredElementCollector(doc, view.Id).ToElementIds()
+    )
+
+
+class RenderCache(object):
+    """
+    LRU cache of exported images on disk.
+
+    Entries are keyed by (document, view id, export options) and remember the
+    journal version of the document when they were rendered. A version
+    mismatch is not an automatic miss for views: if none of the changed
+    elements are (or were) visible in the view, the entry is revalidated.
+    Sheets are always invalidated by any document change, since their
+    content comes from the views placed on them.
+
+    The index lives in memory, so each cache starts with a new folder of
+    its own under root; only stale leftovers of other sessions are removed.
+    """
+
+    def __init__(self, root=RENDER_CACHE_ROOT, max_bytes=MAX_RENDER_CACHE_BYTES,
+                 max_entries=MAX_RENDER_CACHE_ENTRIES, stale_seconds=RENDER_CACHE_STALE_SECONDS):
+        self.root = root
+        self.folder = os.path.join(root, "cache_{}".format(uuid.uuid4().hex))
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._remove_stale(stale_seconds)
+        os.makedirs(self.folder)
+
+    def _remove_stale(self, stale_seconds):
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        cutoff = time.time() - stale_seconds
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def lookup(self, doc, view, options):
+        """Return cached image bytes for the view, or None on a miss"""
+        key = (document_key(doc), view.Id.IntegerValue, options)
+        entry = self._entries.pop(key, None)
+        if entry is not None and not self._is_current(doc, view, key[0], entry):
+            self._discard(entry)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        try:
+            with open(entry["path"], "rb") as image_file:
+                data = image_file.read()
+        except (IOError, OSError):
+            self._discard(entry)
+            self.misses += 1
+            return None
+
+        # Re-insert as most recently used
+        self._entries[key] = entry
+        self.hits += 1
+        return data
+
+    def store(self, doc, view, options, source_path, version, visible_ids):
+        """Move an exported file into the cache"""
+        key = (document_key(doc), view.Id.IntegerValue, options)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._discard(previous)
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        name = hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+        path = os.path.join(self.folder, name + os.path.splitext(source_path)[1])
+        shutil.move(source_path, path)
+
+        size = os.path.getsize(path)
+        self._entries[key] = {
+            "path": path,
+            "size": size,
+            "version": version,
+            "visible_ids": visible_ids
+        }
+        self._bytes += size
+
+        while self._entries and (
+            self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            self._discard(self._entries.popitem(last=False)[1])
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _discard(self, entry):
+        self._bytes -= entry["size"]
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
+    def _is_current(self, doc, view, doc_key, entry):
+        version = journal.document_version(doc_key)
+        if version == entry["version"]:
+            return True
+        if entry["visible_ids"] is None:
+            return False
+
+        changes = journal.changes_since(doc_key, entry["version"])
+        if changes["resync"]:
+            return False
+        changed = changes["added"] + changes["modified"]
+        if len(changed) + len(changes["deleted"]) > MAX_REVALIDATE_CHANGES:
+            return False
+
+        visible_before = entry["visible_ids"]
+        if view.Id.IntegerValue in changed:
+            return False
+        for element_id in changes["deleted"]:
+            if element_id in visible_before:
+                return False
+
+        visible_now = _visible_element_ids(doc, view)
+        for element_id in changed:
+            if element_id in visible_before or element_id in visible_now:
+                return False
+            element = doc.GetElement(DB.ElementId(element_id))
+            if isinstance(element, _STYLE_CLASSES):
+                return False
+
+        entry["version"] = version
+        entry["visible_ids"] = visible_now
+        return True
+
+
+render_cache = RenderCache()
+
+
+def _normalized_file_name(name):
+    """Lower-case alphanumerics only, so Revit's file name sanitizing does not matter"""
+    for extension in (".png", ".jpg", ".jpeg"):
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return "".join(c for c in name.lower() if c.isalnum())
+
+
+def _export_image_files(doc, views, options):
+    """
+    Export views or sheets with a single ExportImage call into a new
+    export workspace directory
+
+    Files are mapped back to views with ImageExportOptions.GetFileName, so
+    nothing depends on file times or on other exports running meanwhile.
+
+    Returns:
+        tuple: (export id, dict of view id -> file path); views that
+            produced no file are missing from the dict
+    """
+    export_id, folder = export_workspace.create("image")
+    try:
+        options = dict(options)
+        file_type_name, _, extension = IMAGE_FORMATS[options["format"]]
+        file_type = getattr(DB.ImageFileType, file_type_name)
+        crop = options["crop"]
+
+        ieo = DB.ImageExportOptions()
+        ieo.ExportRange = DB.ExportRange.SetOfViews
+        view_ids = List[DB.ElementId]()
+        for view in views:
+            view_ids.Add(view.Id)
+        ieo.SetViewsAndSheets(view_ids)
+        ieo.FilePath = os.path.join(folder, "export")
+        ieo.HLRandWFViewsFileType = file_type
+        ieo.ShadowViewsFileType = file_type
+        ieo.ImageResolution = getattr(DB.ImageResolution, "DPI_{}".format(options["resolution"]))
+        if options["zoom"]:
+            ieo.ZoomType = DB.ZoomFitType.Zoom
+            ieo.Zoom = options["zoom"]
+        else:
+            pixel_size = options["pixel_size"]
+            if crop:
+                pixel_size = min(MAX_EXPORT_PIXEL_SIZE, int(pixel_size / (crop[2] - crop[0])))
+            ieo.ZoomType = DB.ZoomFitType.FitToPage
+            ieo.PixelSize = pixel_size
+
+        doc.ExportImage(ieo)
+
+        remaining = dict(
+            (_normalized_file_name(f), os.path.join(folder, f))
+            for f in os.listdir(folder)
+            if f.lower().endswith(extension)
+        )
+        paths = {}
+        unmatched = []
+        for view in views:
+            try:
+                expected = _normalized_file_name(
+                    os.path.basename(DB.ImageExportOptions.GetFileName(doc, view.Id))
+                )
+            except Exception:
+                expected = None
+            candidates = [
+                name for name in remaining
+                if expected and name.endswith(expected)
+            ]
+            if candidates:
+                # If several files end with the expected name, the shortest is exact
+                name = min(candidates, key=len)
+                paths[view.Id.IntegerValue] = remaining.pop(name)
+            else:
+                unmatched.append(view)
+
+        if len(unmatched) == 1 and len(remaining) == 1:
+            paths[unmatched[0].Id.IntegerValue] = list(remaining.values())[0]
+        elif unmatched:
+            logger.warning("No exported image found for views: {}".format(
+                [view.Id.IntegerValue for view in unmatched]
+            ))
+
+        if crop:
+            for view_id, path in paths.items():
+                paths[view_id] = _crop_image_file(path, crop, options["format"])
+    except Exception:
+        # The workspace stays open until released, so failures must release it
+        export_workspace.release(export_id)
+        raise
+    return export_id, paths
+
+
+def _crop_image_file(path, crop, image_format):
+    """Crop an exported image to fractional bounds, replacing the file"""
+    import clr
+    clr.AddReference("System.Drawing")
+    from System.Drawing import Bitmap, Rectangle
+    from System.Drawing.Imaging import ImageFormat
+
+    root, extension = os.path.splitext(path)
+    cropped_path = root + "_crop" + extension
+    source = Bitmap(path)
+    try:
+        left = int(source.Width * crop[0])
+        top = int(source.Height * crop[1])
+        width = max(1, int(source.Width * crop[2]) - left)
+        height = max(1, int(source.Height * crop[3]) - top)
+        cropped = source.Clone(Rectangle(left, top, width, height), source.PixelFormat)
+    finally:
+        source.Dispose()
+
+    try:
+        cropped.Save(cropped_path, ImageFormat.Jpeg if image_format == "jpeg" else ImageFormat.Png)
+    finally:
+        cropped.Dispose()
+    os.remove(path)
+    return cropped_path
+
+
+def export_view_images(doc, views, options=DEFAULT_IMAGE_OPTIONS):
+    """
+    Export several views or sheets, rendering every render cache miss in a
+    single ExportImage call
+
+    Args:
+        views: Views or sheets to export (without duplicates)
+        options: Validated options from parse_image_options
+
+    Returns:
+        list: (view, image bytes or None if Revit produced no file, cached)
+            tuples in the order of views
+    """
+    results = {}
+    misses = []
+    for view in views:
+        data = render_cache.lookup(doc, view, options)
+        if data is not None:
+            results[view.Id.IntegerValue] = (data, True)
+        else:
+            misses.append(view)
+
+    if misses:
+        # Read the version before exporting so changes made meanwhile invalidate it
+        version = journal.document_version(document_key(doc))
+        visible_ids = {}
+        for view in misses:
+            if not isinstance(view, DB.ViewSheet):
+                visible_ids[view.Id.IntegerValue] = _visible_element_ids(doc, view)
+
+        logger.info("Exporting {} view images ({} cached)".format(
+            len(misses), len(views) - len(misses)
+        ))
+        export_id, paths = _export_image_files(doc, misses, options)
+        try:
+            for view in misses:
+                view_id = view.Id.IntegerValue
+                path = paths.get(view_id)
+                if path is None:
+                    continue
+                with open(path, "rb") as image_file:
+                    results[view_id] = (image_file.read(), False)
+                try:
+                    render_cache.store(
+                        doc, view, options, path, version, visible_ids.get(view_id)
+                    )
+                except Exception as e:
+                    logger.warning("Could not cache render: {}".format(str(e)))
+        finally:
+            export_workspace.release(export_id)
+
+    return [
+        (view,) + results.get(view.Id.IntegerValue, (None, False))
+        for view in views
+    ]
+
+
+def export_view_image(doc, view, options=DEFAULT_IMAGE_OPTIONS):
+    """
+    Export a view or sheet as an image, serving it from the render cache
+    when nothing relevant changed since the last export
+
+    Args:
+        options: Validated options from parse_image_options
+
+    Returns:
+        tuple: (image bytes, True if served from the cache)
+    """
+    _, data, cached = export_view_images(doc, [view], options)[0]
+    if data is None:
+        raise ImageExportError("Export failed - no image file was created")
+    return data, cached
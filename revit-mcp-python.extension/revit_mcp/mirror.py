@@ -0,0 +1,241 @@
+# -*- coding: UTF-8 -*-
+"""
+Mirror Export Module for Revit MCP
+Pages model metadata out of Revit so the MCP server can keep a local mirror
+"""
+
+from pyrevit import routes, revit, DB
+import clr
+import json
+import logging
+from System import Type
+from System.Collections.Generic import List
+
+from utils import *
+from parameters import ParameterValueReader
+from changes import journal
+
+logger = logging.getLogger(__name__)
+
+EXPORT_KINDS = ("elements", "types", "levels", "views", "sheets")
+DEFAULT_EXPORT_LIMIT = 2000
+MAX_EXPORT_LIMIT = 10000
+DEFAULT_MIRROR_PARAMETERS = ["Mark", "Comments"]
+
+
+def _category_name(element):
+    try:
+        return element.Category.Name if element.Category else None
+    except Exception:
+        return None
+
+
+def _element_kind(element):
+    """Classify an element into one of EXPORT_KINDS, or None if it is not mirrored"""
+    if isinstance(element, DB.ViewSheet):
+        return "sheets"
+    if isinstance(element, DB.View):
+        return None if element.IsTemplate else "views"
+    if isinstance(element, DB.Level):
+        return "levels"
+    try:
+        if element.Category is None:
+            return None
+        if isinstance(element, DB.ElementType):
+            return "types"
+        if element.Category.CategoryType == DB.CategoryType.Model and not element.ViewSpecific:
+            return "elements"
+    except Exception:
+        pass
+    return None
+
+
+def _category_filter(doc, model_only=False):
+    """ElementMulticategoryFilter for all (or all model) categories of doc"""
+    category_ids = [
+        category.Id for category in doc.Settings.Categories
+        if not model_only or category.CategoryType == DB.CategoryType.Model
+    ]
+    return DB.ElementMulticategoryFilter(List[DB.ElementId](category_ids))
+
+
+def _kind_collector(doc, kind):
+    """Collector filtered natively to match _element_kind (except view templates)"""
+    collector = DB.FilteredElementCollector(doc)
+    if kind == "sheets":
+        return collector.OfClass(DB.ViewSheet)
+    if kind == "views":
+        return collector.OfClass(DB.View).WherePasses(DB.ElementClassFilter(DB.ViewSheet, True))
+    if kind == "levels":
+        return collector.OfClass(DB.Level)
+    if kind == "types":
+        return collector.WhereElementIsElementType().WherePasses(_category_filter(doc))
+    return (
+        collector.WhereElementIsNotElementType()
+        .WhereElementIsViewIndependent()
+        .WherePasses(_category_filter(doc, model_only=True))
+        .WherePasses(DB.ElementMulticlassFilter(
+            List[Type]([clr.GetClrType(DB.View), clr.GetClrType(DB.Level)]), True
+        ))
+    )
+
+
+def _kind_ids(doc, kind):
+    """Sorted ids of all elements of a kind, so every page is full"""
+    ids = list(_kind_collector(doc, kind).ToElementIds())
+    if kind == "views":
+        # View templates have no native filter; there are few views
+        ids = [eid for eid in ids if not doc.GetElement(eid).IsTemplate]
+    ids.sort(key=lambda x: x.IntegerValue)
+    return ids
+
+
+def _element_row(doc, element, kind, reader, parameter_names):
+    """Build the mirror row for an element"""
+    row = {
+        "kind": kind,
+        "id": element.Id.IntegerValue,
+        "unique_id": element.UniqueId,
+        "name": get_element_name_safe(element),
+        "category": _category_name(element)
+    }
+
+    if kind == "sheets":
+        row["number"] = element.SheetNumber
+    elif kind == "views":
+        row["view_type"] = str(element.ViewType)
+    elif kind == "levels":
+        row["elevation"] = element.Elevation
+    elif kind == "types":
+        family_name = None
+        if isinstance(element, DB.FamilySymbol):
+            family_name = get_family_name_safe(element)
+        else:
+            try:
+                family_name = element.FamilyName
+            except Exception:
+                pass
+        row["family"] = family_name
+    else:
+        type_id = element.GetTypeId()
+        row["type_id"] = type_id.IntegerValue if type_id != DB.ElementId.InvalidElementId else None
+        try:
+            level_id = element.LevelId
+            row["level_id"] = level_id.IntegerValue if level_id != DB.ElementId.InvalidElementId else None
+        except Exception:
+            row["level_id"] = None
+
+        parameters = {}
+        for parameter_name in parameter_names:
+            try:
+                value = reader.read(element, parameter_name)
+            except Exception:
+                value = None
+            if value is not None and value[1] is not None:
+                parameters[parameter_name] = value[1]
+        row["parameters"] = parameters
+
+    return row
+
+
+def register_mirror_routes(api):
+    """Register mirror export routes with the API"""
+
+    @api.route('/export_model_data/', methods=["POST"])
+    def export_model_data(doc, request):
+        """
+        Export one page of model metadata for the MCP server's local mirror.
+
+        Either pages through one kind, or returns rows for specific element
+        ids (used for incremental updates from the change journal).
+
+        Expected request data:
+        {
+            "kind": "elements",            // elements, types, levels, views, sheets
+            "offset": 0,
+            "limit": 2000,
+            "parameters": ["Mark", "Comments"],
+            "element_ids": [123, 456]      // optional, overrides kind paging
+        }
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            parameter_names = data.get("parameters") or DEFAULT_MIRROR_PARAMETERS
+            offset = parse_int_option(data.get("offset"), 0, 0, 2 ** 31 - 1)
+            limit = parse_int_option(data.get("limit"), DEFAULT_EXPORT_LIMIT, 1, MAX_EXPORT_LIMIT)
+            element_ids = data.get("element_ids")
+            kind = data.get("kind", "elements")
+
+            # Take the token before reading so changes made while paging are
+            # picked up by the next incremental sync
+            token = journal.current_token
+            reader = ParameterValueReader(doc)
+            rows = []
+            missing_ids = []
+
+            if element_ids:
+                total = len(element_ids)
+                page_ids = element_ids[offset:offset + limit]
+                for raw_id in page_ids:
+                    try:
+                        element = doc.GetElement(DB.ElementId(int(raw_id)))
+                    except (TypeError, ValueError):
+                        element = None
+                    element_kind = _element_kind(element) if element is not None else None
+                    if element_kind is None:
+                        missing_ids.append(raw_id)
+                        continue
+                    rows.append(_element_row(doc, element, element_kind, reader, parameter_names))
+            else:
+                if kind not in EXPORT_KINDS:
+                    return safe_make_response(
+                        data={"error": "kind must be one of: {}".format(", ".join(EXPORT_KINDS))},
+                        status=400
+                    )
+                ids = _kind_ids(doc, kind)
+                total = len(ids)
+                for eid in ids[offset:offset + limit]:
+                    element = doc.GetElement(eid)
+                    if element is None or _element_kind(element) != kind:
+                        continue
+                    rows.append(_element_row(doc, element, kind, reader, parameter_names))
+
+            response_data = {
+                "status": "success",
+                "document": document_key(doc),
+                "session": journal.session_id,
+                "token": token,
+                "kind": None if element_ids else kind,
+                "rows": rows,
+                "offset": offset,
+                "next_offset": offset + limit if offset + limit < total else None
+            }
+            if missing_ids:
+                response_data["missing_ids"] = missing_ids
+
+            return safe_make_response(data=response_data)
+
+        except Exception as e:
+            logger.error("Failed to export model data: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to export model data: {}".format(str(e))},
+                status=500
+            )
+
+    logger.info("Mirror routes registered successfully")
@@ -17,7 +17,7 @@ def register_model_info_routes(api):
     """Register all model information routes with the API"""
     
     @api.route('/model_info/', methods=["GET"])
-    def get_model_info():
+    def get_model_info(request):
         """
         Get comprehensive information about the current Revit model
         
@@ -37,6 +37,11 @@ def register_model_info_routes(api):
                     status=503
                 )
 
+            etag = document_etag(doc, "model_info")
+            not_modified = not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
             # ============ PROJECT INFORMATION ============
             try:
                 revit_project_info = RevitProjectInfo(doc)
@@ -290,7 +295,7 @@ def register_model_info_routes(api):
                 }
             }
 
-            return safe_make_response(data=model_data)
+            return safe_make_response(data=model_data, etag=etag)
             
         except Exception as e:
             logger.error("Failed to get model info: {}".format(str(e)))
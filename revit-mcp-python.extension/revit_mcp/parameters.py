@@ -0,0 +1,476 @@
+# -*- coding: UTF-8 -*-
+"""
+Parameters Module for Revit MCP
+Handles bulk parameter reads and writes across many elements
+"""
+
+from pyrevit import routes, revit, DB
+import json
+import logging
+
+from utils import *
+
+logger = logging.getLogger(__name__)
+
+# Number of element edits applied per Transaction before it is committed
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+# Number of example "<element_id>:<parameter>" entries kept per failure reason
+MAX_FAILURE_EXAMPLES = 10
+
+# Page size limits for the parameter matrix
+DEFAULT_READ_LIMIT = 5000
+MAX_READ_LIMIT = 20000
+
+VALUE_MODES = ("display", "raw", "both")
+
+
+class ParameterResolver(object):
+    """
+    Resolves parameter names to definitions once per category.
+
+    LookupParameter scans every parameter on the element by name, so after the
+    first hit in a category the resolved Definition is reused through
+    get_Parameter, falling back to a name lookup when the cached definition
+    does not apply (e.g. family parameters of a different family).
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._definitions = {}
+
+    def lookup(self, element, parameter_name):
+        """Return the instance parameter named parameter_name, or None"""
+        category_id = None
+        try:
+            if element.Category:
+                category_id = element.Category.Id.IntegerValue
+        except Exception:
+            pass
+
+        key = (category_id, parameter_name)
+        definition = self._definitions.get(key)
+        if definition is not None:
+            try:
+                param = element.get_Parameter(definition)
+                if param is not None:
+                    return param
+            except Exception:
+                pass
+
+        param = element.LookupParameter(parameter_name)
+        if param is not None and key not in self._definitions:
+            self._definitions[key] = param.Definition
+        return param
+
+
+class ParameterValueReader(object):
+    """
+    Reads parameter values with an instance-to-type fallback.
+
+    Values found on the element type are cached per (type id, parameter name),
+    so a thousand doors sharing ten types only read type parameters ten times.
+    Element names referenced by ElementId parameters (levels, phases, ...) are
+    cached as well. With element_id_names=True, the raw value of an ElementId
+    parameter is the referenced element's name instead of its integer id.
+    """
+
+    def __init__(self, doc, resolver=None, element_id_names=False):
+        self.doc = doc
+        self.resolver = resolver or ParameterResolver(doc)
+        self.element_id_names = element_id_names
+        self._type_values = {}
+        self._element_names = {}
+
+    def read(self, element, parameter_name):
+        """
+        Read a parameter from the element, or from its type if the instance
+        does not have it.
+
+        Returns:
+            tuple: (raw_value, display_value), or None if the parameter does not exist
+        """
+        param = self.resolver.lookup(element, parameter_name)
+        if param is not None:
+            return self.parameter_value(param)
+
+        try:
+            type_id = element.GetTypeId()
+        except Exception:
+            return None
+        if type_id is None or type_id == DB.ElementId.InvalidElementId:
+            return None
+
+        key = (type_id.IntegerValue, parameter_name)
+        if key not in self._type_values:
+            value = None
+            element_type = self.doc.GetElement(type_id)
+            if element_type is not None:
+                type_param = self.resolver.lookup(element_type, parameter_name)
+                if type_param is not None:
+                    value = self.parameter_value(type_param)
+            self._type_values[key] = value
+        return self._type_values[key]
+
+    def parameter_value(self, param):
+        """Return (raw_value, display_value) for a parameter, by storage type"""
+        if not param.HasValue:
+            return (None, None)
+
+        storage_type = param.StorageType
+        if storage_type == DB.StorageType.String:
+            value = param.AsString()
+            return (value, value)
+        elif storage_type == DB.StorageType.Integer:
+            raw_value = param.AsInteger()
+            return (raw_value, param.AsValueString() or str(raw_value))
+        elif storage_type == DB.StorageType.Double:
+            raw_value = param.AsDouble()
+            return (raw_value, param.AsValueString() or str(raw_value))
+        elif storage_type == DB.StorageType.ElementId:
+            id_val = param.AsElementId()
+            if id_val is None or id_val == DB.ElementId.InvalidElementId:
+                return (None, None)
+            name = self.element_name(id_val)
+            return (name if self.element_id_names else id_val.IntegerValue, name)
+        else:
+            value = param.AsValueString()
+            return (value, value)
+
+    def element_name(self, element_id):
+        """Return the cached name of the element referenced by element_id"""
+        key = element_id.IntegerValue
+        if key not in self._element_names:
+            name = None
+            try:
+                referenced = self.doc.GetElement(element_id)
+                if referenced is not None:
+                    name = get_element_name_safe(referenced)
+            except Exception:
+                pass
+            self._element_names[key] = name
+        return self._element_names[key]
+
+
+class FailureReport(object):
+    """Collects failures grouped by reason with a few examples of each"""
+
+    def __init__(self):
+        self.count = 0
+        self._reasons = {}
+
+    def add(self, reason, element_id, parameter_name=None):
+        self.count += 1
+        entry = self._reasons.setdefault(reason, {"count": 0, "examples": []})
+        entry["count"] += 1
+        if len(entry["examples"]) < MAX_FAILURE_EXAMPLES:
+            if parameter_name is None:
+                entry["examples"].append(str(element_id))
+            else:
+                entry["examples"].append("{}:{}".format(element_id, parameter_name))
+
+    def as_dict(self):
+        return self._reasons
+
+
+def _parse_element_id(value):
+    """Convert a JSON element id into a DB.ElementId, or None if invalid"""
+    try:
+        return DB.ElementId(int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def format_value_cell(value, value_mode):
+    """Shape a (raw, display) pair for the requested value mode"""
+    if value is None:
+        return None
+    if value_mode == "raw":
+        return value[0]
+    if value_mode == "both":
+        return [value[0], value[1]]
+    return value[1]
+
+
+def _apply_edit(doc, resolver, edit, failures):
+    """
+    Apply a single {element_id, parameters} edit inside an open transaction
+
+    Returns:
+        int: Number of parameters successfully set
+    """
+    element_id = edit.get("element_id") if isinstance(edit, dict) else None
+    parameters = edit.get("parameters") if isinstance(edit, dict) else None
+
+    if not isinstance(parameters, dict) or not parameters:
+        failures.add("invalid edit", element_id)
+        return 0
+
+    eid = _parse_element_id(element_id)
+    element = doc.GetElement(eid) if eid is not None else None
+    if element is None:
+        failures.add("element not found", element_id)
+        return 0
+
+    applied = 0
+    for param_name, param_value in parameters.items():
+        try:
+            param = resolver.lookup(element, param_name)
+            if not param:
+                failures.add("not found", element_id, param_name)
+            elif param.IsReadOnly:
+                failures.add("read-only", element_id, param_name)
+            elif set_parameter_value(param, param_value):
+                applied += 1
+            else:
+                failures.add("unsupported type", element_id, param_name)
+        except (TypeError, ValueError):
+            failures.add("invalid value", element_id, param_name)
+        except Exception as param_error:
+            failures.add("error: {}".format(str(param_error)), element_id, param_name)
+    return applied
+
+
+def register_parameter_routes(api):
+    """Register parameter read/write routes with the API"""
+
+    @api.route('/set_parameters/', methods=["POST"])
+    def set_parameters(doc, request):
+        """
+        Set instance parameters on many elements in one grouped transaction.
+
+        Edits are committed in chunks of chunk_size elements inside a single
+        TransactionGroup, which is assimilated into one undo entry.
+
+        Expected request data:
+        {
+            "edits": [
+                {"element_id": 12345, "parameters": {"Mark": "D-101", "Comments": "..."}},
+                {"element_id": 12346, "parameters": {"Mark": "D-102"}}
+            ],
+            "chunk_size": 1000
+        }
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not data or not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            edits = data.get("edits")
+            if not isinstance(edits, list) or not edits:
+                return safe_make_response(
+                    data={"error": "No edits provided"},
+                    status=400
+                )
+
+            chunk_size = parse_int_option(
+                data.get("chunk_size"), DEFAULT_CHUNK_SIZE, 1, MAX_CHUNK_SIZE
+            )
+
+            logger.info("Setting parameters on {} elements".format(len(edits)))
+
+            resolver = ParameterResolver(doc)
+            failures = FailureReport()
+            parameters_set = 0
+            chunks_committed = 0
+
+            group = DB.TransactionGroup(doc, "Set Parameters via MCP")
+            group.Start()
+
+            try:
+                for start in range(0, len(edits), chunk_size):
+                    t = DB.Transaction(
+                        doc,
+                        "Set Parameters via MCP ({}-{})".format(
+                            start + 1, min(start + chunk_size, len(edits))
+                        )
+                    )
+                    t.Start()
+                    try:
+                        for edit in edits[start:start + chunk_size]:
+                            parameters_set += _apply_edit(doc, resolver, edit, failures)
+                        t.Commit()
+                        chunks_committed += 1
+                    except Exception:
+                        if t.HasStarted() and not t.HasEnded():
+                            t.RollBack()
+                        raise
+
+                group.Assimilate()
+
+            except Exception as tx_error:
+                if group.HasStarted() and not group.HasEnded():
+                    group.RollBack()
+                    logger.error("Transaction group rolled back due to error")
+                raise tx_error
+
+            return safe_make_response(data={
+                "status": "success",
+                "elements_processed": len(edits),
+                "parameters_set": parameters_set,
+                "parameters_failed": failures.count,
+                "failures": failures.as_dict(),
+                "chunks_committed": chunks_committed
+            })
+
+        except Exception as e:
+            logger.error("Failed to set parameters: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to set parameters: {}".format(str(e))},
+                status=500
+            )
+
+    @api.route('/get_parameters/', methods=["POST"])
+    def get_parameters(doc, request):
+        """
+        Read a matrix of parameter values (elements x parameters).
+
+        Elements are selected either by id or by category name. Parameters not
+        found on an instance are read from its type.
+
+        Expected request data:
+        {
+            "parameter_names": ["Mark", "Level", "Fire Rating"],
+            "element_ids": [12345, 12346],      // or
+            "category_name": "Doors",
+            "value_mode": "display",            // "display", "raw" or "both"
+            "offset": 0,
+            "limit": 5000
+        }
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not data or not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            parameter_names = data.get("parameter_names")
+            if not isinstance(parameter_names, list) or not parameter_names:
+                return safe_make_response(
+                    data={"error": "parameter_names must be a non-empty list"},
+                    status=400
+                )
+
+            value_mode = data.get("value_mode", "display")
+            if value_mode not in VALUE_MODES:
+                return safe_make_response(
+                    data={"error": "value_mode must be one of: {}".format(", ".join(VALUE_MODES))},
+                    status=400
+                )
+
+            offset = parse_int_option(data.get("offset"), 0, 0, 2 ** 31 - 1)
+            limit = parse_int_option(data.get("limit"), DEFAULT_READ_LIMIT, 1, MAX_READ_LIMIT)
+
+            element_ids = data.get("element_ids")
+            category_name = data.get("category_name")
+            missing_ids = []
+
+            if element_ids:
+                if not isinstance(element_ids, list):
+                    return safe_make_response(
+                        data={"error": "element_ids must be a list"},
+                        status=400
+                    )
+                total = len(element_ids)
+                elements = []
+                for raw_id in element_ids[offset:offset + limit]:
+                    eid = _parse_element_id(raw_id)
+                    element = doc.GetElement(eid) if eid is not None else None
+                    if element is None:
+                        missing_ids.append(raw_id)
+                    else:
+                        elements.append(element)
+            elif category_name:
+                category = find_category_by_name(doc, category_name)
+                if not category:
+                    return safe_make_response(
+                        data={"error": "Category '{}' not found".format(category_name)},
+                        status=404
+                    )
+                ids = list(
+                    DB.FilteredElementCollector(doc)
+                    .OfCategoryId(category.Id)
+                    .WhereElementIsNotElementType()
+                    .ToElementIds()
+                )
+                ids.sort(key=lambda x: x.IntegerValue)
+                total = len(ids)
+                elements = [doc.GetElement(eid) for eid in ids[offset:offset + limit]]
+            else:
+                return safe_make_response(
+                    data={"error": "Provide element_ids or category_name"},
+                    status=400
+                )
+
+            logger.info("Reading {} parameters from {} elements".format(
+                len(parameter_names), len(elements)
+            ))
+
+            reader = ParameterValueReader(doc)
+            rows = []
+            row_ids = []
+            for element in elements:
+                row = []
+                for parameter_name in parameter_names:
+                    try:
+                        value = reader.read(element, parameter_name)
+                    except Exception as read_error:
+                        logger.debug("Could not read {} from {}: {}".format(
+                            parameter_name, element.Id.IntegerValue, str(read_error)
+                        ))
+                        value = None
+                    row.append(format_value_cell(value, value_mode))
+                rows.append(row)
+                row_ids.append(element.Id.IntegerValue)
+
+            next_offset = offset + limit if offset + limit < total else None
+
+            response_data = {
+                "status": "success",
+                "parameters": parameter_names,
+                "element_ids": row_ids,
+                "values": rows,
+                "value_mode": value_mode,
+                "total_elements": total,
+                "offset": offset,
+                "next_offset": next_offset
+            }
+            if missing_ids:
+                response_data["missing_ids"] = missing_ids
+
+            return safe_make_response(data=response_data)
+
+        except Exception as e:
+            logger.error("Failed to get parameters: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to get parameters: {}".format(str(e))},
+                status=500
+            )
+
+    logger.info("Parameter routes registered successfully")
@@ -209,14 +209,7 @@ def register_placement_routes(api):
                         param = new_instance.LookupParameter(param_name)
                         if param and not param.IsReadOnly:
                             # Set parameter based on its storage type
-                            if param.StorageType == DB.StorageType.String:
-                                param.Set(str(param_value))
-                                properties_set.append(param_name)
-                            elif param.StorageType == DB.StorageType.Integer:
-                                param.Set(int(param_value))
-                                properties_set.append(param_name)
-                            elif param.StorageType == DB.StorageType.Double:
-                                param.Set(float(param_value))
+                            if set_parameter_value(param, param_value):
                                 properties_set.append(param_name)
                             else:
                                 properties_failed.append("{} (unsupported type)".format(param_name))
@@ -327,7 +320,7 @@ def register_placement_routes(api):
     
 
     @api.route('/list_family_categories/', methods=["GET"])
-    def list_family_categories(doc):
+    def list_family_categories(doc, request):
         """
         Get a list of all family categories in the current Revit model
         
@@ -341,6 +334,11 @@ def register_placement_routes(api):
                     status=503
                 )
             
+            etag = document_etag(doc, "list_family_categories")
+            not_modified = not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
             logger.info("Listing all family categories")
             
             # Get all family symbols
@@ -374,7 +372,7 @@ def register_placement_routes(api):
                 "categories": sorted_categories,
                 "total_categories": len(sorted_categories),
                 "status": "success"
-            })
+            }, etag=etag)
             
         except Exception as e:
             logger.error("Failed to list family categories: {}".format(str(e)))
@@ -384,7 +382,7 @@ def register_placement_routes(api):
             )
 
     @api.route('/list_levels/', methods=["GET"])
-    def list_levels(doc):
+    def list_levels(doc, request):
         """
         Get a list of all levels in the current Revit model
         
@@ -398,6 +396,11 @@ def register_placement_routes(api):
                     status=503
                 )
             
+            etag = document_etag(doc, "list_levels")
+            not_modified = not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
             logger.info("Listing all available levels")
             
             # Get all levels
@@ -430,7 +433,7 @@ def register_placement_routes(api):
                 "levels": levels_info,
                 "total_levels": len(levels_info),
                 "status": "success"
-            })
+            }, etag=etag)
             
         except Exception as e:
             logger.error("Failed to list levels: {}".format(str(e)))
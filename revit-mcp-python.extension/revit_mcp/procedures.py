@@ -0,0 +1,414 @@
+# -*- coding: UTF-8 -*-
+"""
+Stored Procedures Module for Revit MCP
+Named, pre-compiled IronPython scripts invoked with JSON arguments
+"""
+from utils import safe_make_response
+from code_execution import (
+    EXECUTION_MODES,
+    PROCEDURE_FILENAME,
+    parse_execution_options,
+    result_cache,
+    run_code,
+)
+from collections import OrderedDict
+import codecs
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# <extension>/procedures/<name>.py with an optional <name>.json metadata file
+PROCEDURES_FOLDER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "procedures"
+)
+
+PROCEDURE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# JSON type names accepted in parameter schemas
+_PARAMETER_TYPES = {
+    "string": (basestring,),
+    "integer": (int, long),
+    "number": (int, long, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+
+class ProcedureError(Exception):
+    """Raised for invalid procedure definitions or arguments"""
+
+
+class Procedure(object):
+    """A compiled script with its declared mode and parameters"""
+
+    def __init__(self, name, source, description="", mode="read", parameters=None,
+                 origin="api"):
+        if not PROCEDURE_NAME_PATTERN.match(name or ""):
+            raise ProcedureError(
+                "Procedure names may contain only letters, digits and underscores"
+            )
+        if mode not in EXECUTION_MODES:
+            raise ProcedureError("mode must be 'read' or 'write'")
+
+        parameters = parameters or {}
+        if not isinstance(parameters, dict):
+            raise ProcedureError("parameters must be an object of name: schema")
+        for param_name, schema in parameters.items():
+            if not isinstance(schema, dict):
+                raise ProcedureError(
+                    "Schema of parameter '{}' must be an object".format(param_name)
+                )
+            if schema.get("type", "string") not in _PARAMETER_TYPES:
+                raise ProcedureError(
+                    "Parameter '{}' has unknown type '{}'; use one of: {}".format(
+                        param_name, schema.get("type"),
+                        ", ".join(sorted(_PARAMETER_TYPES))
+                    )
+                )
+
+        self.name = name
+        self.source = source
+        self.description = description
+        self.mode = mode
+        self.parameters = parameters
+        self.origin = origin
+        self.calls = 0
+        # SyntaxError propagates to whoever registers the procedure
+        self.code = compile(source, PROCEDURE_FILENAME.format(name), "exec")
+        self._traced_code = None
+
+    def load_code(self, traced):
+        """
+        Return (code object, cached) for run_code
+
+        IronPython only traces code compiled while tracing is active, so the
+        traced variant is compiled on the first traced run, after run_code
+        has installed its tracer, and reused afterwards.
+        """
+        if not traced:
+            return self.code, True
+        if self._traced_code is None:
+            self._traced_code = compile(self.source, self.code.co_filename, "exec")
+            return self._traced_code, False
+        return self._traced_code, True
+
+    def bind_args(self, args):
+        """
+        Validate arguments against the parameter schema
+
+        Returns:
+            dict: Arguments with defaults filled in
+        """
+        if args is None:
+            args = {}
+        if not isinstance(args, dict):
+            raise ProcedureError("args must be an object")
+
+        unknown = sorted(set(args) - set(self.parameters))
+        if unknown:
+            raise ProcedureError(
+                "Unknown argument(s) for '{}': {}".format(self.name, ", ".join(unknown))
+            )
+
+        bound = {}
+        for param_name, schema in self.parameters.items():
+            if param_name not in args or args[param_name] is None:
+                if schema.get("required"):
+                    raise ProcedureError(
+                        "Missing required argument '{}'".format(param_name)
+                    )
+                bound[param_name] = schema.get("default")
+                continue
+
+            value = args[param_name]
+            param_type = schema.get("type", "string")
+            # bool is an int subclass, so booleans are only booleans
+            if not isinstance(value, _PARAMETER_TYPES[param_type]) or (
+                param_type != "boolean" and isinstance(value, bool)
+            ):
+                raise ProcedureError(
+                    "Argument '{}' must be of type {}".format(param_name, param_type)
+                )
+            if "enum" in schema and value not in schema["enum"]:
+                raise ProcedureError(
+                    "Argument '{}' must be one of: {}".format(
+                        param_name, ", ".join(str(option) for option in schema["enum"])
+                    )
+                )
+            bound[param_name] = value
+        return bound
+
+    def info(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "mode": self.mode,
+            "parameters": self.parameters,
+            "origin": self.origin,
+            "calls": self.calls,
+        }
+
+
+class ProcedureRegistry(object):
+    """
+    Stored procedures by name
+
+    Procedures are loaded from the extension's procedures folder at startup
+    or registered through /register_procedure/. Registered procedures live
+    in memory only; add a file to keep one across Revit sessions.
+    """
+
+    def __init__(self, folder=PROCEDURES_FOLDER):
+        self.folder = folder
+        self._procedures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self._procedures.get(name)
+
+    def register(self, procedure, replace=False):
+        with self._lock:
+            if procedure.name in self._procedures and not replace:
+                raise ProcedureError(
+                    "Procedure '{}' already exists; set replace to overwrite it".format(
+                        procedure.name
+                    )
+                )
+            self._procedures[procedure.name] = procedure
+
+    def list(self):
+        with self._lock:
+            return [procedure.info() for procedure in self._procedures.values()]
+
+    def load_folder(self):
+        """
+        (Re)load file procedures; procedures registered through the API stay
+
+        Returns:
+            tuple: (names loaded, {file name: error} for files that failed)
+        """
+        loaded = []
+        errors = {}
+        if not os.path.isdir(self.folder):
+            return loaded, errors
+
+        procedures = []
+        for file_name in sorted(os.listdir(self.folder)):
+            name, extension = os.path.splitext(file_name)
+            if extension.lower() != ".py" or name.startswith("_"):
+                continue
+            try:
+                procedures.append(self._load_file(name))
+            except Exception as e:
+                errors[file_name] = str(e)
+                logger.error("Failed to load procedure {}: {}".format(file_name, str(e)))
+
+        with self._lock:
+            for name in [
+                name for name, procedure in self._procedures.items()
+                if procedure.origin == "file"
+            ]:
+                del self._procedures[name]
+            for procedure in procedures:
+                self._procedures[procedure.name] = procedure
+                loaded.append(procedure.name)
+        return loaded, errors
+
+    def _load_file(self, name):
+        with codecs.open(os.path.join(self.folder, name + ".py"), "r", "utf-8") as script:
+            source = script.read()
+
+        metadata = {}
+        metadata_path = os.path.join(self.folder, name + ".json")
+        if os.path.isfile(metadata_path):
+            with codecs.open(metadata_path, "r", "utf-8") as metadata_file:
+                metadata = json.load(metadata_file)
+
+        return Procedure(
+            name,
+            source,
+            description=metadata.get("description", ""),
+            mode=metadata.get("mode", "read"),
+            parameters=metadata.get("parameters"),
+            origin="file",
+        )
+
+
+procedure_registry = ProcedureRegistry()
+
+
+def register_procedure_routes(api):
+    """Register stored procedure routes with the API"""
+
+    loaded, errors = procedure_registry.load_folder()
+    logger.info("Loaded {} stored procedure(s)".format(len(loaded)))
+
+    @api.route("/procedures/", methods=["GET"])
+    def list_procedures():
+        """List stored procedures with their modes and parameter schemas"""
+        try:
+            return safe_make_response(data={
+                "status": "success",
+                "procedures": procedure_registry.list(),
+            })
+        except Exception as e:
+            logger.error("Failed to list procedures: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    @api.route("/register_procedure/", methods=["POST"])
+    def register_procedure(request):
+        """
+        Compile and register a stored procedure.
+
+        Expected payload:
+        {
+            "name": "rename_views",
+            "code": "python code as string",
+            "description": "what the procedure does",
+            "mode": "read" (default) or "write",
+            "parameters": {"prefix": {"type": "string", "required": true}},
+            "replace": false
+        }
+
+        Parameter types are JSON types: string, integer, number, boolean,
+        array or object; schemas may also set "default" and "enum". The
+        code sees validated arguments as the dict "args" and may assign a
+        JSON-serializable "result" to return it.
+        """
+        try:
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not data.get("code"):
+                return safe_make_response(
+                    data={"error": "No code provided"}, status=400
+                )
+
+            try:
+                procedure = Procedure(
+                    data.get("name"),
+                    data["code"],
+                    description=data.get("description", ""),
+                    mode=data.get("mode", "read"),
+                    parameters=data.get("parameters"),
+                )
+                procedure_registry.register(procedure, replace=bool(data.get("replace")))
+            except (ProcedureError, SyntaxError) as e:
+                return safe_make_response(data={"error": str(e)}, status=400)
+
+            logger.info("Registered procedure {}".format(procedure.name))
+            return safe_make_response(data={
+                "status": "success",
+                "procedure": procedure.info(),
+            })
+
+        except Exception as e:
+            logger.error("Failed to register procedure: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    @api.route("/reload_procedures/", methods=["POST"])
+    def reload_procedures():
+        """Reload procedures from the extension's procedures folder"""
+        try:
+            loaded, errors = procedure_registry.load_folder()
+            return safe_make_response(data={
+                "status": "success" if not errors else "partial",
+                "loaded": loaded,
+                "errors": errors,
+            })
+        except Exception as e:
+            logger.error("Failed to reload procedures: {}".format(str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    @api.route("/run_procedure/<name>", methods=["POST"])
+    def run_procedure(doc, request, name):
+        """
+        Run a stored procedure by name.
+
+        Expected payload:
+        {
+            "args": {"prefix": "A-"},
+            "cache": false,
+            "refresh": false,
+            "job_id": "optional client-generated id for /execute_output/",
+            "profile": false,
+            "time_limit": 300,
+            "max_lines": 0
+        }
+
+        Arguments are validated against the procedure's parameter schema.
+        The procedure runs in its declared mode (a "mode" in the payload
+        is only a client scheduling hint and is ignored), with the same output
+        capture, budgets and cancellation as /execute_code/. Read-mode
+        procedures can use the /execute_code/ result cache with "cache"
+        and "refresh".
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"}, status=503
+                )
+
+            procedure = procedure_registry.get(name)
+            if procedure is None:
+                return safe_make_response(
+                    data={"error": "Unknown procedure '{}'".format(name)}, status=404
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            ) or {}
+            try:
+                args = procedure.bind_args(data.get("args"))
+            except ProcedureError as e:
+                return safe_make_response(data={"error": str(e)}, status=400)
+
+            use_cache = bool(data.get("cache"))
+            if use_cache and procedure.mode != "read":
+                return safe_make_response(
+                    data={"error": "cache is only available for read procedures"},
+                    status=400,
+                )
+
+            procedure.calls += 1
+            options = parse_execution_options(data)
+
+            def execute():
+                namespace = {"args": args}
+                response_data, status = run_code(
+                    doc,
+                    procedure.load_code,
+                    "Procedure {}".format(name),
+                    mode=procedure.mode,
+                    namespace=namespace,
+                    source=procedure.source,
+                    **options
+                )
+                if status == 200 and "result" in namespace:
+                    response_data["result"] = namespace["result"]
+                return response_data, status
+
+            if use_cache and not options["profile"]:
+                response_data, status = result_cache.run(
+                    doc, procedure.source, args, execute, refresh=bool(data.get("refresh"))
+                )
+            else:
+                response_data, status = execute()
+            response_data["procedure"] = name
+            return safe_make_response(data=response_data, status=status)
+
+        except Exception as e:
+            logger.error("Failed to run procedure {}: {}".format(name, str(e)))
+            return safe_make_response(data={"error": str(e)}, status=500)
+
+    logger.info("Stored procedure routes registered successfully.")
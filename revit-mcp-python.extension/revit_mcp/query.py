@@ -0,0 +1,740 @@
+# -*- coding: UTF-8 -*-
+"""
+Query Module for Revit MCP
+Compiles declarative element queries into native Revit collector filters
+"""
+
+from pyrevit import routes, revit, DB
+import clr
+import json
+import logging
+from collections import OrderedDict
+from System import Type
+from System.Collections.Generic import List
+
+from utils import *
+from parameters import ParameterValueReader, format_value_cell, VALUE_MODES
+from colors import group_elements_by_parameters
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_LIMIT = 500
+MAX_QUERY_LIMIT = 20000
+
+# Tolerance used by rules on Double parameters (internal units)
+DEFAULT_EPSILON = 1e-6
+
+STRING_OPS = (
+    "equals", "not_equals", "contains", "not_contains", "begins_with",
+    "not_begins_with", "ends_with", "not_ends_with", "greater",
+    "greater_or_equal", "less", "less_or_equal",
+)
+NUMERIC_OPS = (
+    "equals", "not_equals", "greater", "greater_or_equal", "less", "less_or_equal",
+)
+VALUE_OPS = ("has_value", "has_no_value")
+
+AGGREGATE_OPS = ("count", "sum", "min", "max", "avg")
+MAX_AGGREGATE_GROUPS = 5000
+
+
+class QueryError(ValueError):
+    """Raised for queries that cannot be compiled; reported as HTTP 400"""
+    pass
+
+
+def _rule_factory(op):
+    """Return the ParameterFilterRuleFactory method for an operator name"""
+    factory = DB.ParameterFilterRuleFactory
+    return {
+        "equals": factory.CreateEqualsRule,
+        "not_equals": factory.CreateNotEqualsRule,
+        "contains": factory.CreateContainsRule,
+        "not_contains": factory.CreateNotContainsRule,
+        "begins_with": factory.CreateBeginsWithRule,
+        "not_begins_with": factory.CreateNotBeginsWithRule,
+        "ends_with": factory.CreateEndsWithRule,
+        "not_ends_with": factory.CreateNotEndsWithRule,
+        "greater": factory.CreateGreaterRule,
+        "greater_or_equal": factory.CreateGreaterOrEqualRule,
+        "less": factory.CreateLessRule,
+        "less_or_equal": factory.CreateLessOrEqualRule,
+    }[op]
+
+
+def create_parameter_rule(param_id, storage_type, op, value, epsilon=DEFAULT_EPSILON):
+    """
+    Create a FilterRule for a parameter, choosing the overload by StorageType
+
+    Args:
+        param_id (DB.ElementId): Parameter id (built-in or shared/project)
+        storage_type (DB.StorageType): Storage type of the parameter
+        op (str): Operator name (equals, greater, contains, has_value, ...)
+        value: Value to compare against, in Revit internal units for numbers
+        epsilon (float): Tolerance for Double comparisons
+
+    Returns:
+        DB.FilterRule: Rule for an ElementParameterFilter
+    """
+    factory = DB.ParameterFilterRuleFactory
+
+    if op in VALUE_OPS:
+        try:
+            if op == "has_value":
+                return factory.CreateHasValueParameterRule(param_id)
+            return factory.CreateHasNoValueParameterRule(param_id)
+        except AttributeError:
+            raise QueryError("Operator '{}' requires Revit 2022 or newer".format(op))
+
+    if storage_type == DB.StorageType.String:
+        if op not in STRING_OPS:
+            raise QueryError("Operator '{}' is not supported for text parameters".format(op))
+        creator = _rule_factory(op)
+        try:
+            return creator(param_id, unicode(value))
+        except TypeError:
+            # Revit 2022 and older require the caseSensitive argument
+            return creator(param_id, unicode(value), False)
+
+    if op not in NUMERIC_OPS:
+        raise QueryError("Operator '{}' is only supported for text parameters".format(op))
+    creator = _rule_factory(op)
+
+    try:
+        if storage_type == DB.StorageType.Double:
+            return creator(param_id, float(value), float(epsilon))
+        elif storage_type == DB.StorageType.Integer:
+            if isinstance(value, bool):
+                value = 1 if value else 0
+            return creator(param_id, int(value))
+        elif storage_type == DB.StorageType.ElementId:
+            return creator(param_id, DB.ElementId(int(value)))
+    except (TypeError, ValueError):
+        raise QueryError("Invalid value for operator '{}': {}".format(op, value))
+
+    raise QueryError("Unsupported parameter storage type: {}".format(storage_type))
+
+
+def _resolve_category_id(doc, name):
+    """Resolve a category display name ("Doors") or BuiltInCategory name ("OST_Doors")"""
+    if isinstance(name, basestring) and name.startswith("OST_"):
+        bic = getattr(DB.BuiltInCategory, name, None)
+        if bic is not None:
+            return DB.ElementId(bic)
+    category = find_category_by_name(doc, name)
+    if not category:
+        raise QueryError("Category '{}' not found".format(name))
+    return category.Id
+
+
+def _resolve_class(name):
+    """Resolve a Revit API class name such as "Wall" or "Architecture.Room" to a System.Type"""
+    target = DB
+    for part in str(name).split("."):
+        target = getattr(target, part, None)
+        if target is None:
+            raise QueryError("Class '{}' not found in the Revit API".format(name))
+    try:
+        return clr.GetClrType(target)
+    except Exception:
+        raise QueryError("'{}' is not a Revit API class".format(name))
+
+
+def _resolve_level_id(doc, value):
+    """Resolve a level by element id or name"""
+    if isinstance(value, int) or (isinstance(value, basestring) and value.isdigit()):
+        level = doc.GetElement(DB.ElementId(int(value)))
+        if isinstance(level, DB.Level):
+            return level.Id
+    levels = DB.FilteredElementCollector(doc).OfClass(DB.Level).ToElements()
+    for level in levels:
+        if get_element_name_safe(level) == value:
+            return level.Id
+    raise QueryError("Level '{}' not found".format(value))
+
+
+def _resolve_view_id(doc, value):
+    """Resolve a view by element id or name"""
+    if isinstance(value, int) or (isinstance(value, basestring) and value.isdigit()):
+        view = doc.GetElement(DB.ElementId(int(value)))
+        if isinstance(view, DB.View):
+            return view.Id
+    views = DB.FilteredElementCollector(doc).OfClass(DB.View).ToElements()
+    for view in views:
+        if hasattr(view, "IsTemplate") and view.IsTemplate:
+            continue
+        if get_element_name_safe(view) == value:
+            return view.Id
+    raise QueryError("View '{}' not found".format(value))
+
+
+def _xyz(point, label):
+    try:
+        return DB.XYZ(float(point["x"]), float(point["y"]), float(point["z"]))
+    except (KeyError, TypeError, ValueError):
+        raise QueryError("bbox.{} must include numeric x, y, z".format(label))
+
+
+class CompiledQuery(object):
+    """
+    A query compiled to Revit filters.
+
+    Quick filters (category, class, level, bounding box) are applied before
+    slow ElementParameterFilters so Revit can reject elements without
+    expanding them.
+    """
+
+    def __init__(self, doc, spec):
+        self.doc = doc
+        self.spec = spec
+        self.view_id = None
+        self.element_types = bool(spec.get("element_types", False))
+        self.category_ids = []
+        self.category_filters = []
+        self.quick_filters = []
+        self.slow_filters = []
+        self.description = []
+        self.empty = False
+        self._samples = None
+
+        self._compile_scope()
+        self._compile_parameters()
+
+    # ---- Compilation ----
+
+    def _compile_scope(self):
+        spec = self.spec
+
+        if spec.get("view") is not None:
+            self.view_id = _resolve_view_id(self.doc, spec["view"])
+            self.description.append("view:{}".format(self.view_id.IntegerValue))
+
+        categories = spec.get("categories") or []
+        if isinstance(categories, basestring):
+            categories = [categories]
+        if categories:
+            category_ids = [_resolve_category_id(self.doc, c) for c in categories]
+            self.category_ids = category_ids
+            if len(category_ids) == 1:
+                self.category_filters.append(DB.ElementCategoryFilter(category_ids[0]))
+                self.description.append("ElementCategoryFilter")
+            else:
+                self.category_filters.append(
+                    DB.ElementMulticategoryFilter(List[DB.ElementId](category_ids))
+                )
+                self.description.append("ElementMulticategoryFilter")
+
+        classes = spec.get("classes") or []
+        if isinstance(classes, basestring):
+            classes = [classes]
+        if classes:
+            types = [_resolve_class(c) for c in classes]
+            try:
+                if len(types) == 1:
+                    self.quick_filters.append(DB.ElementClassFilter(types[0]))
+                    self.description.append("ElementClassFilter")
+                else:
+                    self.quick_filters.append(DB.ElementMulticlassFilter(List[Type](types)))
+                    self.description.append("ElementMulticlassFilter")
+            except Exception as class_error:
+                raise QueryError("Unsupported class filter: {}".format(str(class_error)))
+
+        if spec.get("level") is not None:
+            level_id = _resolve_level_id(self.doc, spec["level"])
+            self.quick_filters.append(DB.ElementLevelFilter(level_id))
+            self.description.append("ElementLevelFilter")
+
+        bbox = spec.get("bbox")
+        if bbox:
+            if not isinstance(bbox, dict):
+                raise QueryError("bbox must be an object with min and max points")
+            outline = DB.Outline(_xyz(bbox.get("min"), "min"), _xyz(bbox.get("max"), "max"))
+            if bbox.get("mode", "intersects") == "inside":
+                self.quick_filters.append(DB.BoundingBoxIsInsideFilter(outline))
+                self.description.append("BoundingBoxIsInsideFilter")
+            else:
+                self.quick_filters.append(DB.BoundingBoxIntersectsFilter(outline))
+                self.description.append("BoundingBoxIntersectsFilter")
+
+    def _compile_parameters(self):
+        rules = self.spec.get("parameters") or []
+        if not isinstance(rules, list):
+            raise QueryError("parameters must be a list of rules")
+
+        for rule_spec in rules:
+            if not isinstance(rule_spec, dict) or not rule_spec.get("name"):
+                raise QueryError("Each parameter rule needs a name")
+            name = rule_spec["name"]
+            op = rule_spec.get("op", "equals")
+            if op not in STRING_OPS and op not in VALUE_OPS:
+                raise QueryError("Unknown operator '{}'".format(op))
+            if op not in VALUE_OPS and "value" not in rule_spec:
+                raise QueryError("Rule on '{}' needs a value".format(name))
+
+            resolved = self._resolve_parameter(name)
+            if resolved is None:
+                # No element passes the scope filters, so nothing can match
+                self.empty = True
+                return
+
+            filters = []
+            for level, param_id, storage_type in resolved:
+                rule = create_parameter_rule(
+                    param_id, storage_type, op, rule_spec.get("value"),
+                    rule_spec.get("epsilon", DEFAULT_EPSILON)
+                )
+                if level == "instance":
+                    filters.append(DB.ElementParameterFilter(rule))
+                else:
+                    type_filter = self._type_parameter_filter(rule)
+                    if type_filter is not None:
+                        filters.append(type_filter)
+            if not filters:
+                self.empty = True
+                return
+
+            levels = sorted(set(level for level, _, _ in resolved))
+            if len(filters) == 1:
+                self.slow_filters.append(filters[0])
+            else:
+                # The name maps to different parameters in different families
+                self.slow_filters.append(DB.LogicalOrFilter(List[DB.ElementFilter](filters)))
+            self.description.append("ElementParameterFilter({}{} {}{})".format(
+                "type " if levels == ["type"] else "",
+                name,
+                op,
+                " x{}".format(len(resolved)) if len(resolved) > 1 else "",
+            ))
+
+    def _parameter_samples(self):
+        """
+        Elements in scope to resolve rule parameter names on, collected
+        once per query
+
+        A parameter name can map to different ids in different families
+        (non-shared family parameters get their own id in each family), and
+        can be an instance parameter in one family and a type parameter in
+        another. Parameters are defined per family, so one instance of each
+        loadable family in scope is sampled, found natively with a
+        FamilyInstanceFilter on the family's types, plus the first other
+        element of each category in scope (system families and untyped
+        elements, whose parameters do not vary within a category).
+        """
+        if self._samples is not None:
+            return self._samples
+
+        if self.element_types:
+            # The scope is types, which are few: one per family or category
+            samples = OrderedDict()
+            for element in self._scoped_collector():
+                family = getattr(element, "Family", None)
+                if family is not None:
+                    key = ("family", family.Id.IntegerValue)
+                else:
+                    category = element.Category
+                    key = ("category", category.Id.IntegerValue if category else None)
+                samples.setdefault(key, element)
+            self._samples = list(samples.values())
+            return self._samples
+
+        symbol_ids_by_family = OrderedDict()
+        symbols = DB.FilteredElementCollector(self.doc).OfClass(DB.FamilySymbol)
+        for category_filter in self.category_filters:
+            symbols = symbols.WherePasses(category_filter)
+        for symbol in symbols:
+            symbol_ids_by_family.setdefault(symbol.Family.Id.IntegerValue, []).append(symbol.Id)
+
+        samples = []
+        for symbol_ids in symbol_ids_by_family.values():
+            filters = [DB.FamilyInstanceFilter(self.doc, symbol_id) for symbol_id in symbol_ids]
+            family_filter = (
+                filters[0] if len(filters) == 1
+                else DB.LogicalOrFilter(List[DB.ElementFilter](filters))
+            )
+            sample = self._scoped_collector().WherePasses(family_filter).FirstElement()
+            if sample is not None:
+                samples.append(sample)
+
+        category_ids = self.category_ids or [
+            category.Id for category in self.doc.Settings.Categories
+        ]
+        not_family_instance = DB.ElementClassFilter(DB.FamilyInstance, True)
+        for category_id in category_ids:
+            sample = (
+                self._scoped_collector()
+                .WherePasses(DB.ElementCategoryFilter(category_id))
+                .WherePasses(not_family_instance)
+                .FirstElement()
+            )
+            if sample is not None:
+                samples.append(sample)
+
+        self._samples = samples
+        return samples
+
+    def _resolve_parameter(self, name):
+        """
+        Find the parameter ids and storage types for a rule.
+
+        Built-in parameter names (e.g. "ALL_MODEL_MARK") are used directly;
+        other names are looked up on each sample element (see
+        _parameter_samples), then on its type.
+
+        Returns:
+            list: ("instance" or "type", parameter id, storage type) for each
+            distinct parameter the name maps to, or None if no element is in
+            scope
+        """
+        samples = self._parameter_samples()
+        if not samples:
+            return None
+
+        bip = getattr(DB.BuiltInParameter, name, None) if str(name).isupper() else None
+        resolved = []
+        seen = set()
+        for sample in samples:
+            candidates = [("instance", sample)]
+            if not self.element_types:
+                type_id = sample.GetTypeId()
+                if type_id is not None and type_id != DB.ElementId.InvalidElementId:
+                    candidates.append(("type", self.doc.GetElement(type_id)))
+
+            for level, element in candidates:
+                if element is None:
+                    continue
+                param = element.get_Parameter(bip) if bip is not None else element.LookupParameter(name)
+                if param is None:
+                    continue
+                param_id = DB.ElementId(bip) if bip is not None else param.Id
+                key = (level, param_id.IntegerValue)
+                if key not in seen:
+                    seen.add(key)
+                    resolved.append((level, param_id, param.StorageType))
+                break
+
+        if not resolved:
+            raise QueryError("Parameter '{}' not found on elements in scope".format(name))
+        return resolved
+
+    def _type_parameter_filter(self, rule):
+        """
+        Compile a rule on a type parameter into an instance filter.
+
+        Matching types are found natively, then instances are matched on
+        their type id (ELEM_TYPE_PARAM) so filtering stays inside Revit.
+        """
+        collector = DB.FilteredElementCollector(self.doc).WhereElementIsElementType()
+        for category_filter in self.category_filters:
+            collector = collector.WherePasses(category_filter)
+        type_ids = list(collector.WherePasses(DB.ElementParameterFilter(rule)).ToElementIds())
+        if not type_ids:
+            return None
+
+        type_param = DB.ElementId(DB.BuiltInParameter.ELEM_TYPE_PARAM)
+        filters = [
+            DB.ElementParameterFilter(
+                DB.ParameterFilterRuleFactory.CreateEqualsRule(type_param, type_id)
+            )
+            for type_id in type_ids
+        ]
+        if len(filters) == 1:
+            return filters[0]
+        return DB.LogicalOrFilter(List[DB.ElementFilter](filters))
+
+    # ---- Execution ----
+
+    def _scoped_collector(self):
+        """Collector with the view scope and quick filters applied"""
+        if self.view_id is not None:
+            collector = DB.FilteredElementCollector(self.doc, self.view_id)
+        else:
+            collector = DB.FilteredElementCollector(self.doc)
+
+        if self.element_types:
+            collector = collector.WhereElementIsElementType()
+        else:
+            collector = collector.WhereElementIsNotElementType()
+
+        for element_filter in self.category_filters + self.quick_filters:
+            collector = collector.WherePasses(element_filter)
+        return collector
+
+    def collector(self):
+        """Collector with all compiled filters applied"""
+        collector = self._scoped_collector()
+        for element_filter in self.slow_filters:
+            collector = collector.WherePasses(element_filter)
+        return collector
+
+    def element_ids(self):
+        """Return matching element ids sorted by integer value"""
+        if self.empty:
+            return []
+        ids = list(self.collector().ToElementIds())
+        ids.sort(key=lambda x: x.IntegerValue)
+        return ids
+
+
+def compile_query(doc, spec):
+    """Compile a query spec dict into a CompiledQuery (raises QueryError)"""
+    if not isinstance(spec, dict):
+        raise QueryError("Invalid query - expected JSON object")
+    return CompiledQuery(doc, spec)
+
+
+def _grouping_value_getter(reader):
+    """Adapt ParameterValueReader to the (raw, display) shape used for grouping"""
+    def getter(element, parameter_name):
+        value = reader.read(element, parameter_name)
+        if value is None or value[1] is None:
+            return ("None", "None")
+        return value
+    return getter
+
+
+def _numeric_raw_value(reader, element, parameter_name):
+    """Return the raw numeric value of a parameter as a float, or None"""
+    value = reader.read(element, parameter_name)
+    if value is None:
+        return None
+    raw_value = value[0]
+    if isinstance(raw_value, bool) or not isinstance(raw_value, (int, float)):
+        return None
+    return float(raw_value)
+
+
+def _parse_metrics(metrics):
+    """Validate metric specs and return (op, parameter, column name) tuples"""
+    if not metrics:
+        metrics = [{"op": "count"}]
+    if not isinstance(metrics, list):
+        raise QueryError("metrics must be a list")
+
+    parsed = []
+    for metric in metrics:
+        if not isinstance(metric, dict):
+            raise QueryError("Each metric must be an object like {\"op\": \"sum\", \"parameter\": \"Area\"}")
+        op = metric.get("op", "count")
+        if op not in AGGREGATE_OPS:
+            raise QueryError("Unknown metric '{}'; use one of: {}".format(op, ", ".join(AGGREGATE_OPS)))
+        parameter = metric.get("parameter")
+        if op != "count" and not parameter:
+            raise QueryError("Metric '{}' needs a parameter".format(op))
+        column = "{}({})".format(op, parameter) if parameter else op
+        parsed.append((op, parameter, column))
+    return parsed
+
+
+def _aggregate(values, op, element_count):
+    """Compute one aggregate over a list of floats"""
+    if op == "count":
+        return element_count if values is None else len(values)
+    if not values:
+        return None
+    if op == "sum":
+        return sum(values)
+    if op == "min":
+        return min(values)
+    if op == "max":
+        return max(values)
+    return sum(values) / len(values)
+
+
+def register_query_routes(api):
+    """Register query routes with the API"""
+
+    @api.route('/query/', methods=["POST"])
+    def query_elements(doc, request):
+        """
+        Query elements with a declarative filter evaluated natively by Revit.
+
+        Expected request data:
+        {
+            "categories": ["Doors"],                // names or OST_ names
+            "classes": ["FamilyInstance"],          // Revit API class names
+            "element_types": false,                 // query types instead of instances
+            "level": "Level 1",                     // name or id
+            "view": "Level 1",                      // only elements visible in this view
+            "parameters": [
+                {"name": "Mark", "op": "begins_with", "value": "D-"},
+                {"name": "Width", "op": "greater", "value": 3.0}
+            ],
+            "bbox": {"min": {"x": 0, "y": 0, "z": 0},
+                     "max": {"x": 50, "y": 50, "z": 10},
+                     "mode": "intersects"},         // or "inside"
+            "fields": ["Mark", "Level"],            // optional projected parameters
+            "value_mode": "display",
+            "offset": 0,
+            "limit": 500
+        }
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not data or not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            fields = data.get("fields") or []
+            value_mode = data.get("value_mode", "display")
+            if value_mode not in VALUE_MODES:
+                return safe_make_response(
+                    data={"error": "value_mode must be one of: {}".format(", ".join(VALUE_MODES))},
+                    status=400
+                )
+
+            try:
+                query = compile_query(doc, data)
+            except QueryError as query_error:
+                return safe_make_response(data={"error": str(query_error)}, status=400)
+
+            offset = parse_int_option(data.get("offset"), 0, 0, 2 ** 31 - 1)
+            limit = parse_int_option(data.get("limit"), DEFAULT_QUERY_LIMIT, 1, MAX_QUERY_LIMIT)
+
+            ids = query.element_ids()
+            total = len(ids)
+            page = ids[offset:offset + limit]
+
+            response_data = {
+                "status": "success",
+                "total": total,
+                "offset": offset,
+                "next_offset": offset + limit if offset + limit < total else None,
+                "element_ids": [eid.IntegerValue for eid in page],
+                "filters": query.description
+            }
+
+            if fields:
+                reader = ParameterValueReader(doc)
+                rows = []
+                for eid in page:
+                    element = doc.GetElement(eid)
+                    row = []
+                    for field in fields:
+                        try:
+                            value = reader.read(element, field)
+                        except Exception:
+                            value = None
+                        row.append(format_value_cell(value, value_mode))
+                    rows.append(row)
+                response_data["fields"] = fields
+                response_data["values"] = rows
+                response_data["value_mode"] = value_mode
+
+            return safe_make_response(data=response_data)
+
+        except Exception as e:
+            logger.error("Query failed: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Query failed: {}".format(str(e))},
+                status=500
+            )
+
+    @api.route('/aggregate/', methods=["POST"])
+    def aggregate_elements(doc, request):
+        """
+        Group elements by parameters and compute count/sum/min/max/avg.
+
+        Elements are selected with the same filters as /query/. Numeric
+        metrics use raw values in Revit internal units; only the aggregate
+        table is returned.
+
+        Expected request data:
+        {
+            "categories": ["Walls"],
+            "group_by": ["Type", "Base Constraint"],
+            "metrics": [{"op": "count"},
+                        {"op": "sum", "parameter": "Area"}]
+        }
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not data or not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            group_by = data.get("group_by") or []
+            if isinstance(group_by, basestring):
+                group_by = [group_by]
+
+            try:
+                metrics = _parse_metrics(data.get("metrics"))
+                query = compile_query(doc, data)
+            except QueryError as query_error:
+                return safe_make_response(data={"error": str(query_error)}, status=400)
+
+            ids = query.element_ids()
+            elements = [doc.GetElement(eid) for eid in ids]
+
+            logger.info("Aggregating {} elements by {}".format(len(elements), group_by))
+
+            reader = ParameterValueReader(doc, element_id_names=True)
+            if group_by:
+                groups, sorted_keys = group_elements_by_parameters(
+                    elements, group_by, _grouping_value_getter(reader)
+                )
+            else:
+                groups, sorted_keys = {(): elements}, [()]
+
+            truncated = len(sorted_keys) > MAX_AGGREGATE_GROUPS
+            rows = []
+            for key in sorted_keys[:MAX_AGGREGATE_GROUPS]:
+                group = groups[key]
+                numeric_values = {}
+                row = list(key)
+                for op, parameter, column in metrics:
+                    values = None
+                    if parameter:
+                        if parameter not in numeric_values:
+                            numeric_values[parameter] = [
+                                v for v in (
+                                    _numeric_raw_value(reader, element, parameter)
+                                    for element in group
+                                ) if v is not None
+                            ]
+                        values = numeric_values[parameter]
+                    row.append(_aggregate(values, op, len(group)))
+                rows.append(row)
+
+            return safe_make_response(data={
+                "status": "success",
+                "columns": list(group_by) + [column for _, _, column in metrics],
+                "rows": rows,
+                "total_elements": len(elements),
+                "total_groups": len(sorted_keys),
+                "truncated": truncated,
+                "units": "Revit internal units (feet, square feet, cubic feet, radians)",
+                "filters": query.description
+            })
+
+        except Exception as e:
+            logger.error("Aggregation failed: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Aggregation failed: {}".format(str(e))},
+                status=500
+            )
+
+    logger.info("Query routes registered successfully")
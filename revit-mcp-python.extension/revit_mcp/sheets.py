@@ -10,18 +10,231 @@ import json
 import tempfile
 import os
 import base64
+import re
+import shutil
 from System.Collections.Generic import List
 
-from utils import get_element_name_safe, safe_make_response, normalize_string
+from utils import (
+    get_element_name_safe,
+    safe_make_response,
+    normalize_string,
+    document_etag,
+    not_modified_response,
+    get_request_params,
+    export_workspace,
+    document_key,
+)
+from changes import journal
+from image_export import (
+    export_view_image,
+    parse_image_options,
+    image_content_type,
+    ImageExportError,
+    ImageOptionsError,
+)
 
 logger = logging.getLogger(__name__)
 
+# Elements that can change how a sheet prints without being visible on it
+_SHEET_STYLE_CLASSES = (
+    DB.Material,
+    DB.GraphicsStyle,
+    DB.FillPatternElement,
+    DB.LinePatternElement,
+)
+
+
+def _resolve_sheets(doc, sheet_entries):
+    """Resolve sheet numbers or ids to sheets, returning (sheets, not_found)"""
+    all_sheets = (
+        DB.FilteredElementCollector(doc)
+        .OfCategory(DB.BuiltInCategory.OST_Sheets)
+        .WhereElementIsNotElementType()
+        .ToElements()
+    )
+
+    sheets_by_number = {s.SheetNumber: s for s in all_sheets}
+    sheets_by_id = {s.Id.IntegerValue: s for s in all_sheets}
+
+    target_sheets = []
+    not_found = []
+    for entry in sheet_entries:
+        sheet = None
+        if isinstance(entry, int) or (isinstance(entry, str) and str(entry).isdigit()):
+            try:
+                sheet_id = int(entry)
+                sheet = sheets_by_id.get(sheet_id)
+            except Exception:
+                sheet = None
+        else:
+            sheet = sheets_by_number.get(str(entry))
+
+        if sheet:
+            target_sheets.append(sheet)
+        else:
+            not_found.append(entry)
+
+    return target_sheets, not_found
+
+
+# File names are matched to sheet numbers ignoring characters Revit may
+# replace when it turns a sheet number into a file name
+_FILE_KEY_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _file_key(text):
+    return _FILE_KEY_PATTERN.sub("", text).lower()
+
+
+def _sheet_number_naming_rule():
+    """PDF naming rule that names each exported sheet after its number"""
+    rule = List[DB.TableCellCombinedParameterData]()
+    item = DB.TableCellCombinedParameterData.Create()
+    item.ParamId = DB.ElementId(DB.BuiltInParameter.SHEET_NUMBER)
+    item.CategoryId = DB.ElementId(DB.BuiltInCategory.OST_Sheets)
+    rule.Add(item)
+    return rule
+
+
+def _match_sheet_files(sheets, folder):
+    """
+    Map the PDFs of a per-sheet export back to their sheets
+
+    Returns:
+        tuple: ([(sheet, path)], sheets without an unambiguous file)
+    """
+    files = [name for name in os.listdir(folder) if name.lower().endswith(".pdf")]
+    if len(sheets) == 1 and len(files) == 1:
+        return [(sheets[0], os.path.join(folder, files[0]))], []
+
+    files_by_key = {}
+    for name in files:
+        files_by_key.setdefault(_file_key(os.path.splitext(name)[0]), []).append(name)
+    sheet_keys = [_file_key(sheet.SheetNumber) for sheet in sheets]
+
+    matched = []
+    missing = []
+    for sheet, key in zip(sheets, sheet_keys):
+        names = files_by_key.get(key, [])
+        if len(names) == 1 and sheet_keys.count(key) == 1:
+            matched.append((sheet, os.path.join(folder, names[0])))
+        else:
+            missing.append(sheet)
+    return matched, missing
+
+
+def _shared_content_ids(doc):
+    """
+    Ids of document-wide elements that can change how any sheet prints:
+    graphic styles and patterns, and what title blocks read from outside
+    the sheet (project information, and all revisions with their settings
+    and numbering sequences, since revision numbers depend on each other)
+    """
+    element_ids = set()
+    for style_class in _SHEET_STYLE_CLASSES:
+        for element_id in DB.FilteredElementCollector(doc).OfClass(style_class).ToElementIds():
+            element_ids.add(element_id.IntegerValue)
+    element_ids.update(_title_block_source_ids(doc))
+    return element_ids
+
+
+def _title_block_source_ids(doc):
+    """Ids of elements outside the sheet whose values title blocks print"""
+    element_ids = set()
+    try:
+        element_ids.add(doc.ProjectInformation.Id.IntegerValue)
+    except Exception:
+        pass
+    try:
+        element_ids.add(DB.RevisionSettings.GetRevisionSettings(doc).Id.IntegerValue)
+    except Exception:
+        pass
+    for revision_id in DB.Revision.GetAllRevisionIds(doc):
+        element_ids.add(revision_id.IntegerValue)
+    # Revision numbering sequences exist from Revit 2022
+    sequence_class = getattr(DB, "RevisionNumberingSequence", None)
+    if sequence_class is not None:
+        for element_id in DB.FilteredElementCollector(doc).OfClass(sequence_class).ToElementIds():
+            element_ids.add(element_id.IntegerValue)
+    return element_ids
+
+
+def _sheet_content_ids(doc, sheet):
+    """
+    Ids of everything that is printed on a sheet: the sheet and its own
+    elements and revisions, each placed view with its template, and the
+    elements visible in those views with their types. Document-wide inputs
+    come from _shared_content_ids().
+    """
+    element_ids = set([sheet.Id.IntegerValue])
+    # Revisions shown in the sheet's revision schedule
+    for revision_id in sheet.GetAllRevisionIds():
+        element_ids.add(revision_id.IntegerValue)
+    views = [sheet]
+    for view_id in sheet.GetAllPlacedViews():
+        view = doc.GetElement(view_id)
+        if view:
+            views.append(view)
+
+    for view in views:
+        element_ids.add(view.Id.IntegerValue)
+        try:
+            template_id = view.ViewTemplateId
+            if template_id != DB.ElementId.InvalidElementId:
+                element_ids.add(template_id.IntegerValue)
+        except Exception:
+            pass
+        for element in DB.FilteredElementCollector(doc, view.Id).ToElements():
+            element_ids.add(element.Id.IntegerValue)
+            try:
+                type_id = element.GetTypeId()
+                if type_id != DB.ElementId.InvalidElementId:
+                    element_ids.add(type_id.IntegerValue)
+            except Exception:
+                pass
+    return element_ids
+
+
+def _publish_sheet_files(sheets, folder, delivery):
+    """Give each PDF of a per-sheet export its own export id"""
+    matched, missing = _match_sheet_files(sheets, folder)
+    files = []
+    for sheet, path in matched:
+        entry = {
+            "sheet_id": sheet.Id.IntegerValue,
+            "sheet_number": sheet.SheetNumber,
+            "size_bytes": os.path.getsize(path),
+        }
+        if delivery == "inline":
+            with open(path, "rb") as f:
+                entry["pdf_data"] = base64.b64encode(f.read()).decode("utf-8")
+        else:
+            file_export_id, file_folder = export_workspace.create("pdf")
+            file_path = os.path.join(file_folder, os.path.basename(path))
+            try:
+                shutil.move(path, file_path)
+            except Exception:
+                export_workspace.release(file_export_id)
+                raise
+            export_workspace.publish(file_export_id, file_path)
+            entry["export_id"] = file_export_id
+            if delivery == "handoff":
+                entry["path"] = file_path
+        files.append(entry)
+
+    return {
+        "status": "success" if files else "error",
+        "files": files,
+        "missing": [sheet.SheetNumber for sheet in missing],
+        "sheets_exported": len(files),
+    }
+
 
 def register_sheet_routes(api):
     """Register sheet-related routes with the API"""
 
     @api.route('/list_sheets/', methods=["GET"])
-    def list_sheets(doc):
+    def list_sheets(doc, request):
         """Get a list of all sheets in the current Revit model"""
         try:
             if not doc:
@@ -30,6 +243,11 @@ def register_sheet_routes(api):
                     status=503
                 )
 
+            etag = document_etag(doc, "list_sheets")
+            not_modified = not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
             logger.info("Listing all sheets")
 
             sheets = (
@@ -59,7 +277,7 @@ def register_sheet_routes(api):
                 "sheets": sheets_info,
                 "total_sheets": len(sheets_info),
                 "status": "success"
-            })
+            }, etag=etag)
 
         except Exception as e:
             logger.error("Failed to list sheets: {}".format(str(e)))
@@ -160,7 +378,23 @@ def register_sheet_routes(api):
 
     @api.route('/export_sheets_pdf/', methods=["POST"])
     def export_sheets_pdf(doc, request):
-        """Export specified sheets to a combined PDF and return the data."""
+        """
+        Export specified sheets to a combined PDF and return the data.
+
+        With "combine": false every sheet is exported to its own PDF in the
+        same Document.Export call. The response then holds "files", one
+        entry per sheet with sheet_id and sheet_number plus its own
+        export_id and size_bytes (path with "handoff", pdf_data inline),
+        and "missing" lists sheets whose file could not be identified.
+
+        With "delivery": "handoff" the PDF is left in the export workspace and
+        its path and export_id are returned instead of base64 data. Clients on
+        the same machine read the file directly, then call /release_export/.
+
+        With "delivery": "chunked" only export_id and size_bytes are returned;
+        clients download the PDF in pieces from /export_chunk/ so neither side
+        holds the whole file in memory, then call /release_export/.
+        """
 
         try:
             if not doc:
@@ -198,32 +432,15 @@ def register_sheet_routes(api):
                     status=400,
                 )
 
-            # Collect sheets
-            all_sheets = (
-                DB.FilteredElementCollector(doc)
-                .OfCategory(DB.BuiltInCategory.OST_Sheets)
-                .WhereElementIsNotElementType()
-                .ToElements()
-            )
-
-            sheets_by_number = {s.SheetNumber: s for s in all_sheets}
-            sheets_by_id = {s.Id.IntegerValue: s for s in all_sheets}
-
-            target_sheets = []
-            for entry in sheet_entries:
-                sheet = None
-                if isinstance(entry, int) or (isinstance(entry, str) and str(entry).isdigit()):
-                    try:
-                        sheet_id = int(entry)
-                        sheet = sheets_by_id.get(sheet_id)
-                    except Exception:
-                        sheet = None
-                else:
-                    sheet = sheets_by_number.get(str(entry))
-
-                if sheet:
-                    target_sheets.append(sheet)
+            combine = data.get("combine", True) is not False
+            delivery = data.get("delivery", "inline")
+            if delivery not in ("inline", "handoff", "chunked"):
+                return safe_make_response(
+                    data={"error": "delivery must be 'inline', 'handoff' or 'chunked'"},
+                    status=400,
+                )
 
+            target_sheets, _ = _resolve_sheets(doc, sheet_entries)
             if not target_sheets:
                 return safe_make_response(
                     data={"error": "No matching sheets found"},
@@ -236,9 +453,7 @@ def register_sheet_routes(api):
             for sheet in target_sheets:
                 view_ids.Add(sheet.Id)
 
-            output_folder = tempfile.gettempdir()
             pdf_basename = "MCP_Sheets"
-            output_path = os.path.join(output_folder, pdf_basename + ".pdf")
 
             # Use Revit's PDFExportOptions API instead of PrintManager
             pdf_options = DB.PDFExportOptions()
@@ -247,9 +462,14 @@ def register_sheet_routes(api):
             except Exception:
                 pass
             try:
-                pdf_options.Combine = True
+                pdf_options.Combine = combine
             except Exception:
                 pass
+            if not combine:
+                try:
+                    pdf_options.SetNamingRule(_sheet_number_naming_rule())
+                except Exception as rule_err:
+                    logger.warning("Could not set PDF naming rule: {}".format(str(rule_err)))
 
             # Some Revit versions require specifying the export range
             try:
@@ -266,24 +486,48 @@ def register_sheet_routes(api):
                 except Exception:
                     pass
 
-            # Perform the export using Document.Export
-            doc.Export(output_folder, view_ids, pdf_options)
+            # A private export directory keeps concurrent exports apart and
+            # makes the output path predictable; it is created right before
+            # the try block that releases it
+            export_id, output_folder = export_workspace.create("pdf")
+            output_path = os.path.join(output_folder, pdf_basename + ".pdf")
+            handed_off = False
+            try:
+                # Perform the export using Document.Export
+                doc.Export(output_folder, view_ids, pdf_options)
 
-            if not os.path.exists(output_path):
-                return safe_make_response(
-                    data={"error": "PDF was not created"},
-                    status=500,
-                )
+                if not combine:
+                    return safe_make_response(data=_publish_sheet_files(
+                        target_sheets, output_folder, delivery
+                    ))
 
-            with open(output_path, "rb") as f:
-                pdf_data = f.read()
+                if not os.path.exists(output_path):
+                    return safe_make_response(
+                        data={"error": "PDF was not created"},
+                        status=500,
+                    )
 
-            encoded_data = base64.b64encode(pdf_data).decode("utf-8")
+                if delivery != "inline":
+                    handed_off = True
+                    export_workspace.publish(export_id, output_path)
+                    response_data = {
+                        "export_id": export_id,
+                        "size_bytes": os.path.getsize(output_path),
+                        "sheets_exported": len(target_sheets),
+                        "status": "success",
+                    }
+                    if delivery == "handoff":
+                        response_data["path"] = output_path
+                    return safe_make_response(data=response_data)
+
+                with open(output_path, "rb") as f:
+                    pdf_data = f.read()
+            finally:
+                # Handed-off files live until released or garbage-collected
+                if not handed_off:
+                    export_workspace.release(export_id)
 
-            try:
-                os.remove(output_path)
-            except Exception:
-                pass
+            encoded_data = base64.b64encode(pdf_data).decode("utf-8")
 
             return safe_make_response(
                 data={
@@ -300,9 +544,79 @@ def register_sheet_routes(api):
                 status=500,
             )
 
+    @api.route('/sheet_versions/', methods=["POST"])
+    def sheet_versions(doc, request):
+        """
+        Get a content version for each requested sheet
+
+        A sheet's version changes when anything printed on it changes: the
+        sheet itself, its placed views and their templates, elements visible
+        in those views or their types, and materials, graphics styles and
+        patterns. Clients use it to cache exported sheet PDFs and re-export
+        only stale sheets.
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503,
+                )
+
+            data = request.data if request else None
+            if isinstance(data, str):
+                try:
+                    data = json.loads(data)
+                except Exception as json_err:
+                    return safe_make_response(
+                        data={"error": "Invalid JSON format: {}".format(str(json_err))},
+                        status=400,
+                    )
+
+            sheet_entries = data.get("sheets") if isinstance(data, dict) else None
+            if not isinstance(sheet_entries, list) or not sheet_entries:
+                return safe_make_response(
+                    data={"error": "No sheets specified"},
+                    status=400,
+                )
+
+            target_sheets, not_found = _resolve_sheets(doc, sheet_entries)
+            doc_key = document_key(doc)
+            shared_ids = _shared_content_ids(doc)
+
+            sheets_info = []
+            for sheet in target_sheets:
+                content_ids = _sheet_content_ids(doc, sheet)
+                content_ids.update(shared_ids)
+                sheets_info.append({
+                    "id": sheet.Id.IntegerValue,
+                    "number": sheet.SheetNumber,
+                    "name": get_element_name_safe(sheet),
+                    "version": journal.elements_version(doc_key, content_ids),
+                })
+
+            return safe_make_response(
+                data={
+                    "document": doc_key,
+                    "sheets": sheets_info,
+                    "not_found": not_found,
+                    "status": "success",
+                }
+            )
+
+        except Exception as e:
+            logger.error("Failed to get sheet versions: %s", str(e))
+            return safe_make_response(
+                data={"error": "Failed to get sheet versions: {}".format(str(e))},
+                status=500,
+            )
+
     @api.route('/sheet_image/<sheet_number>', methods=["GET"])
-    def sheet_image(doc, sheet_number):
-        """Export a sheet as a PNG image and return encoded data"""
+    def sheet_image(doc, sheet_number, request):
+        """
+        Export a sheet as an image and return encoded data
+
+        Accepts the same image option query parameters as /get_view/.
+        """
 
         try:
             if not doc:
@@ -311,6 +625,14 @@ def register_sheet_routes(api):
                     status=503,
                 )
 
+            try:
+                options = parse_image_options(get_request_params(request))
+            except ImageOptionsError as e:
+                return safe_make_response(
+                    data={"error": str(e)},
+                    status=400,
+                )
+
             sheet_number = normalize_string(sheet_number)
             logger.info("Exporting sheet image: %s", sheet_number)
 
@@ -347,59 +669,23 @@ def register_sheet_routes(api):
                     status=404,
                 )
 
-            # Prepare export folder
-            output_folder = os.path.join(tempfile.gettempdir(), "RevitMCPExports")
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-
-            file_prefix = os.path.join(output_folder, "export")
-
-            # Set up export options
-            ieo = DB.ImageExportOptions()
-            ieo.ExportRange = DB.ExportRange.SetOfViews
-            view_ids = List[DB.ElementId]()
-            view_ids.Add(target_sheet.Id)
-            ieo.SetViewsAndSheets(view_ids)
-            ieo.FilePath = file_prefix
-            ieo.HLRandWFViewsFileType = DB.ImageFileType.PNG
-            ieo.ShadowViewsFileType = DB.ImageFileType.PNG
-            ieo.ImageResolution = DB.ImageResolution.DPI_150
-            ieo.ZoomType = DB.ZoomFitType.FitToPage
-            ieo.PixelSize = 1024
-
-            # Export the sheet image
-            doc.ExportImage(ieo)
-
-            matching_files = [
-                os.path.join(output_folder, f)
-                for f in os.listdir(output_folder)
-                if f.endswith('.png')
-            ]
-            matching_files.sort(key=lambda x: os.path.getctime(x), reverse=True)
-
-            if not matching_files:
+            try:
+                img_data, cached = export_view_image(doc, target_sheet, options)
+            except ImageExportError as e:
                 return safe_make_response(
-                    data={"error": "Export failed - no image file was created"},
+                    data={"error": str(e)},
                     status=500,
                 )
 
-            exported_file = matching_files[0]
-            with open(exported_file, 'rb') as img_file:
-                img_data = img_file.read()
-
             encoded_data = base64.b64encode(img_data).decode('utf-8')
 
-            try:
-                os.remove(exported_file)
-            except Exception as e:
-                logger.warning("Could not clean up temporary file: %s", str(e))
-
             return safe_make_response(
                 data={
                     "image_data": encoded_data,
-                    "content_type": "image/png",
+                    "content_type": image_content_type(options),
                     "sheet_number": sheet_number,
                     "file_size_bytes": len(img_data),
+                    "cached": cached,
                     "export_success": True,
                 }
             )
@@ -5,7 +5,9 @@ Handles API status and health check endpoints
 """
 
 from pyrevit import routes
-from utils import safe_make_response
+from utils import safe_make_response, export_workspace
+from image_export import render_cache
+from code_execution import code_cache, execution_sessions, result_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,11 @@ def register_status_routes(api):
                     "health": "healthy",
                     "revit_available": True,
                     "document_title": doc.Title if doc.Title else "Untitled",
+                    "render_cache": render_cache.stats(),
+                    "export_workspace": export_workspace.stats(),
+                    "compiled_code_cache": code_cache.stats(),
+                    "execution_sessions": execution_sessions.stats(),
+                    "result_cache": result_cache.stats(),
                     "api_name": "revit_mcp"
                 })
             else:
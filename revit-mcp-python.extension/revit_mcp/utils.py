@@ -1,5 +1,13 @@
 from pyrevit import DB, routes
+from contextlib import contextmanager
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
 import traceback
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
@@ -124,6 +132,329 @@ def find_family_symbol_safely(doc, target_family_name, target_type_name=None, ca
         return None
 
 
+def document_key(doc):
+    """Return a stable identifier for a document (its path, or title if unsaved)"""
+    try:
+        if doc.PathName:
+            return doc.PathName
+    except Exception:
+        pass
+    return doc.Title
+
+
+def find_category_by_name(doc, category_name):
+    """
+    Find a model category by its display name (e.g. "Walls", "Doors")
+
+    Returns:
+        DB.Category: Matching category, or None if not found
+    """
+    for cat in doc.Settings.Categories:
+        if cat.Name == category_name:
+            return cat
+    return None
+
+
+def parse_int_option(value, default, minimum, maximum):
+    """Parse an integer request option and clamp it to [minimum, maximum]"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, min(value, maximum))
+
+
+def set_parameter_value(param, value):
+    """
+    Set a parameter from a JSON value, coercing it by the parameter's StorageType
+
+    Args:
+        param: Revit parameter object (must not be read-only)
+        value: Value to assign (converted to str, int or float)
+
+    Returns:
+        bool: True if the value was assigned, False if the storage type is unsupported
+    """
+    if param.StorageType == DB.StorageType.String:
+        param.Set(str(value))
+    elif param.StorageType == DB.StorageType.Integer:
+        param.Set(int(value))
+    elif param.StorageType == DB.StorageType.Double:
+        param.Set(float(value))
+    else:
+        return False
+    return True
+
+
+# ---- Export Workspace ----
+
+EXPORT_ROOT = os.path.join(tempfile.gettempdir(), "RevitMCPExports")
+EXPORT_TTL_SECONDS = 30 * 60
+EXPORT_QUOTA_BYTES = 2 * 1024 * 1024 * 1024
+EXPORT_GC_INTERVAL_SECONDS = 5 * 60
+
+
+def _path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ExportWorkspace(object):
+    """
+    Gives each export its own directory under a shared root.
+
+    Exports are tracked in memory by id, so outputs are found by name rather
+    than by scanning for the newest file. An export is open from create()
+    until publish() or release(), and while in_use() blocks run; every
+    access marks it as used. A background thread removes exports that are
+    not open and have been idle longer than the TTL, then the least recently
+    used idle ones while the root is over quota. Anything else in the root
+    (from earlier sessions or older versions) is removed once it is older
+    than the TTL.
+    """
+
+    def __init__(self, root=EXPORT_ROOT, ttl=EXPORT_TTL_SECONDS,
+                 quota=EXPORT_QUOTA_BYTES, gc_interval=EXPORT_GC_INTERVAL_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        self.quota = quota
+        self.gc_interval = gc_interval
+        self._exports = {}
+        self._lock = threading.Lock()
+        self._gc_thread = None
+
+    def create(self, prefix="export"):
+        """
+        Create a unique export directory, open until published or released
+
+        Returns:
+            tuple: (export id, directory path)
+        """
+        export_id = "{}_{}".format(prefix, uuid.uuid4().hex)
+        path = os.path.join(self.root, export_id)
+        os.makedirs(path)
+        now = time.time()
+        with self._lock:
+            self._exports[export_id] = {
+                "path": path, "created": now, "last_used": now, "file": None, "open": 1
+            }
+        self._ensure_gc_thread()
+        return export_id, path
+
+    def _touch(self, export_id, opened=0):
+        """Mark an export as used now and adjust its open count"""
+        with self._lock:
+            entry = self._exports.get(export_id)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            entry["open"] = max(0, entry["open"] + opened)
+            return dict(entry)
+
+    def path(self, export_id):
+        """Directory of a live export, or None if unknown or already released"""
+        entry = self._touch(export_id)
+        return entry["path"] if entry else None
+
+    def publish(self, export_id, file_path):
+        """
+        Record the file an export delivers, for later download by id
+
+        Ends the open state that create() started; the export then lives
+        until released or idle longer than the TTL.
+        """
+        with self._lock:
+            entry = self._exports.get(export_id)
+            if entry:
+                if entry["file"] is None:
+                    entry["open"] = max(0, entry["open"] - 1)
+                entry["file"] = file_path
+                entry["last_used"] = time.time()
+
+    def published_file(self, export_id):
+        """File recorded with publish(), or None"""
+        entry = self._touch(export_id)
+        return entry["file"] if entry else None
+
+    @contextmanager
+    def in_use(self, export_id):
+        """Keep an export from being collected while the block runs"""
+        self._touch(export_id, 1)
+        try:
+            yield
+        finally:
+            self._touch(export_id, -1)
+
+    def release(self, export_id):
+        """Delete an export directory and forget it"""
+        with self._lock:
+            entry = self._exports.pop(export_id, None)
+        if entry:
+            _remove_path(entry["path"])
+
+    def _release_idle(self, export_id, idle_seconds):
+        """Release an export if it is not open and idle longer than idle_seconds"""
+        with self._lock:
+            entry = self._exports.get(export_id)
+            if (
+                entry is None
+                or entry["open"]
+                or time.time() - entry["last_used"] <= idle_seconds
+            ):
+                return False
+            del self._exports[export_id]
+        _remove_path(entry["path"])
+        return True
+
+    def collect(self):
+        """Remove expired exports and enforce the disk quota"""
+        now = time.time()
+        with self._lock:
+            known = dict(
+                (export_id, dict(entry)) for export_id, entry in self._exports.items()
+            )
+
+        for export_id in list(known):
+            if self._release_idle(export_id, self.ttl):
+                del known[export_id]
+
+        known_paths = set(os.path.normcase(entry["path"]) for entry in known.values())
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(self.root, name)
+            if os.path.normcase(path) in known_paths:
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    _remove_path(path)
+            except OSError:
+                pass
+
+        sizes = [
+            (entry["last_used"], export_id, _path_size(entry["path"]))
+            for export_id, entry in known.items()
+        ]
+        total = sum(size for _, _, size in sizes)
+        for _, export_id, size in sorted(sizes):
+            if total <= self.quota:
+                break
+            if self._release_idle(export_id, 0):
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"exports": len(self._exports), "root": self.root}
+
+    def _ensure_gc_thread(self):
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            return
+        self._gc_thread = threading.Thread(target=self._gc_loop, name="RevitMCPExportGC")
+        self._gc_thread.daemon = True
+        self._gc_thread.start()
+
+    def _gc_loop(self):
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                logger.warning("Export cleanup failed: {}".format(str(e)))
+            time.sleep(self.gc_interval)
+
+
+export_workspace = ExportWorkspace()
+
+
+# ---- Conditional Request Helpers ----
+
+def document_etag(doc, *parts):
+    """
+    Build an ETag from the document's change journal version plus any parts
+    that shape the response (route name, query parameters)
+
+    Returns:
+        str: Quoted ETag that changes whenever the document changes
+    """
+    # Imported here because the changes module itself imports utils
+    from changes import journal
+
+    key = document_key(doc)
+    seed = [journal.session_id, key, str(journal.document_version(key))]
+    seed.extend(unicode(part) for part in parts)
+    return '"{}"'.format(hashlib.md5(u"|".join(seed).encode("utf-8")).hexdigest())
+
+
+def get_request_header(request, name):
+    """Return a request header value (case-insensitive), or None"""
+    headers = getattr(request, "headers", None)
+    if not headers:
+        return None
+    name = name.lower()
+    for key in headers.keys():
+        if str(key).lower() == name:
+            return headers[key]
+    return None
+
+
+def get_request_params(request):
+    """
+    Return query string parameters as a dict of single values
+
+    Accepts the shapes different pyRevit versions use: a dict of values,
+    a dict of value lists, or a list of (key, value) pairs.
+    """
+    params = getattr(request, "params", None) if request else None
+    if not params:
+        return {}
+    if isinstance(params, (list, tuple)):
+        pairs = params
+    else:
+        pairs = [(key, params[key]) for key in params.keys()]
+
+    result = {}
+    for key, value in pairs:
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else None
+        result[str(key)] = value
+    return result
+
+
+def not_modified_response(request, etag):
+    """
+    Return a 304 response if the request's If-None-Match header matches etag,
+    otherwise None. Call before doing any collector work.
+    """
+    header = get_request_header(request, "If-None-Match")
+    if not header:
+        return None
+    candidates = [value.strip() for value in str(header).split(",")]
+    candidates = [value[2:] if value.startswith("W/") else value for value in candidates]
+    if etag in candidates or "*" in candidates:
+        # A 304 has no body: data=None would be serialized as JSON "null"
+        return routes.make_response(data="", status=304, headers={"ETag": etag})
+    return None
+
+
 # ---- Response Sanitization Helpers ----
 
 try:
@@ -173,7 +504,16 @@ def sanitize_data(data):
 
 
 def safe_make_response(*args, **kwargs):
-    """Wrapper around routes.make_response that sanitizes response data."""
+    """
+    Wrapper around routes.make_response that sanitizes response data.
+
+    Pass etag=document_etag(...) to add an ETag header for conditional GETs.
+    """
+    etag = kwargs.pop("etag", None)
+    if etag:
+        headers = dict(kwargs.get("headers") or {})
+        headers["ETag"] = etag
+        kwargs["headers"] = headers
     if "data" in kwargs:
         kwargs["data"] = sanitize_data(kwargs["data"])
     elif args:
@@ -8,25 +8,81 @@ from pyrevit import routes, revit, DB
 import tempfile
 import os
 import base64
+import io
+import json
 import logging
+import zipfile
 from System.Collections.Generic import List
 
 from utils import *
+from image_export import (
+    export_view_image,
+    export_view_images,
+    parse_image_options,
+    image_content_type,
+    ImageExportError,
+    ImageOptionsError,
+)
 
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_VIEWS = 100
+
+
+def _resolve_export_views(doc, entries):
+    """
+    Resolve view ids, view names or sheet numbers to exportable views
+
+    Returns:
+        tuple: (views without duplicates, entries that could not be resolved)
+    """
+    all_views = DB.FilteredElementCollector(doc).OfClass(DB.View).ToElements()
+    views_by_id = {}
+    views_by_name = {}
+    sheets_by_number = {}
+    for view in all_views:
+        try:
+            if view.IsTemplate or view.ViewType in (DB.ViewType.Internal, DB.ViewType.ProjectBrowser):
+                continue
+            views_by_id[view.Id.IntegerValue] = view
+            views_by_name.setdefault(get_element_name_safe(view), view)
+            if isinstance(view, DB.ViewSheet):
+                sheets_by_number[view.SheetNumber] = view
+        except Exception:
+            continue
+
+    views = []
+    seen = set()
+    not_found = []
+    for entry in entries:
+        view = None
+        if isinstance(entry, int) or (isinstance(entry, basestring) and entry.isdigit()):
+            view = views_by_id.get(int(entry))
+        if view is None and isinstance(entry, basestring):
+            entry_name = normalize_string(entry)
+            view = views_by_name.get(entry_name) or sheets_by_number.get(entry_name)
+        if view is None:
+            not_found.append(entry)
+        elif view.Id.IntegerValue not in seen:
+            seen.add(view.Id.IntegerValue)
+            views.append(view)
+    return views, not_found
+
 
 def register_views_routes(api):
     """Register all view-related routes with the API"""
     
     @api.route('/get_view/<view_name>', methods=["GET"])
-    def get_view(doc, view_name):
+    def get_view(doc, view_name, request):
         """
-        Export a named Revit view as a PNG image and return the image data
+        Export a named Revit view as an image and return the image data
         
         Args:
             doc: Revit document (provided by MCP context)
             view_name: Name of the view to export
+            request: Optional query parameters preset (default, thumbnail,
+                high_res), resolution, pixel_size, format (png, jpeg),
+                zoom (fit or percent) and crop (left,top,right,bottom fractions)
             
         Returns:
             dict: Contains base64 encoded image data and content type, or error message
@@ -38,20 +94,18 @@ def register_views_routes(api):
                     status=503
                 )
             
+            try:
+                options = parse_image_options(get_request_params(request))
+            except ImageOptionsError as e:
+                return safe_make_response(
+                    data={"error": str(e)},
+                    status=400
+                )
+
             # Normalize the view name
             view_name = normalize_string(view_name)
             logger.info("Exporting view: {}".format(view_name))
             
-            # Define output folder in temp directory
-            output_folder = os.path.join(tempfile.gettempdir(), "RevitMCPExports")
-            
-            # Create output folder if it doesn't exist
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-                
-            # Create filename prefix
-            file_path_prefix = os.path.join(output_folder, "export")
-            
             # Find the view by name
             target_view = None
             all_views = DB.FilteredElementCollector(doc).OfClass(DB.View).ToElements()
@@ -105,79 +159,25 @@ def register_views_routes(api):
             except Exception as e:
                 logger.warning("Could not check view properties: {}".format(str(e)))
             
-            # Set up export options
-            ieo = DB.ImageExportOptions()
-            ieo.ExportRange = DB.ExportRange.SetOfViews
-            
-            # Create list of view IDs to export
-            viewIds = List[DB.ElementId]()
-            viewIds.Add(target_view.Id)
-            ieo.SetViewsAndSheets(viewIds)
-            
-            ieo.FilePath = file_path_prefix
-            ieo.HLRandWFViewsFileType = DB.ImageFileType.PNG
-            ieo.ShadowViewsFileType = DB.ImageFileType.PNG
-            ieo.ImageResolution = DB.ImageResolution.DPI_150
-            ieo.ZoomType = DB.ZoomFitType.FitToPage
-            ieo.PixelSize = 1024  # Set a reasonable default size
-            
-            # Export the image
+            # Export the image (or reuse a cached render)
             logger.info("Starting image export for view: {}".format(view_name))
-            doc.ExportImage(ieo)
-            
-            # Find the exported file (most recent PNG in folder)
-            matching_files = []
             try:
-                matching_files = [os.path.join(output_folder, f) for f in os.listdir(output_folder) 
-                                if f.endswith('.png')]
-                matching_files.sort(key=lambda x: os.path.getctime(x), reverse=True)
-            except Exception as e:
-                logger.error("Could not list exported files: {}".format(str(e)))
+                img_data, cached = export_view_image(doc, target_view, options)
+            except ImageExportError as e:
                 return safe_make_response(
-                    data={"error": "Could not access export folder"},
+                    data={"error": str(e)},
                     status=500
                 )
-            
-            if not matching_files:
-                return safe_make_response(
-                    data={"error": "Export failed - no image file was created"},
-                    status=500
-                )
-                
-            exported_file = matching_files[0]
-            logger.info("Image exported successfully: {}".format(exported_file))
-            
-            # Read and encode the image
-            try:
-                with open(exported_file, 'rb') as img_file:
-                    img_data = img_file.read()
-                    
-                encoded_data = base64.b64encode(img_data).decode('utf-8')
-                
-                # Get file size for logging
-                file_size = len(img_data)
-                logger.info("Image encoded successfully. Size: {} bytes".format(file_size))
-                
-            except Exception as e:
-                logger.error("Could not read/encode image file: {}".format(str(e)))
-                return safe_make_response(
-                    data={"error": "Could not read exported image file"},
-                    status=500
-                )
-            finally:
-                # Clean up the file
-                try:
-                    if os.path.exists(exported_file):
-                        os.remove(exported_file)
-                        logger.info("Temporary export file cleaned up")
-                except Exception as e:
-                    logger.warning("Could not clean up temporary file: {}".format(str(e)))
+
+            encoded_data = base64.b64encode(img_data).decode('utf-8')
+            logger.info("Image encoded successfully. Size: {} bytes".format(len(img_data)))
 
             return safe_make_response(data={
                 "image_data": encoded_data,
-                "content_type": "image/png",
+                "content_type": image_content_type(options),
                 "view_name": view_name,
                 "file_size_bytes": len(img_data),
+                "cached": cached,
                 "export_success": True
             })
 
@@ -189,12 +189,13 @@ def register_views_routes(api):
             )
     
     @api.route('/list_views/', methods=["GET"])
-    def list_views(doc):
+    def list_views(doc, request):
         """
         Get a list of all exportable views in the current Revit model
         
         Returns:
-            dict: List of view names organized by type
+            dict: View names organized by type, and the matching view ids
+                in the same order
         """
         try:
             if not doc:
@@ -203,6 +204,11 @@ def register_views_routes(api):
                     status=503
                 )
             
+            etag = document_etag(doc, "list_views")
+            not_modified = not_modified_response(request, etag)
+            if not_modified:
+                return not_modified
+
             logger.info("Listing all exportable views")
             
             # Get all views
@@ -230,41 +236,48 @@ def register_views_routes(api):
                     
                     view_name = get_element_name_safe(view)
                     view_type = view.ViewType
+                    entry = (view_name, view.Id.IntegerValue)
                     
                     # Categorize views
                     if view_type == DB.ViewType.FloorPlan:
-                        views_by_type["floor_plans"].append(view_name)
+                        views_by_type["floor_plans"].append(entry)
                     elif view_type == DB.ViewType.CeilingPlan:
-                        views_by_type["ceiling_plans"].append(view_name)
+                        views_by_type["ceiling_plans"].append(entry)
                     elif view_type == DB.ViewType.Elevation:
-                        views_by_type["elevations"].append(view_name)
+                        views_by_type["elevations"].append(entry)
                     elif view_type == DB.ViewType.Section:
-                        views_by_type["sections"].append(view_name)
+                        views_by_type["sections"].append(entry)
                     elif view_type == DB.ViewType.ThreeD:
-                        views_by_type["3d_views"].append(view_name)
+                        views_by_type["3d_views"].append(entry)
                     elif view_type == DB.ViewType.DraftingView:
-                        views_by_type["drafting_views"].append(view_name)
+                        views_by_type["drafting_views"].append(entry)
                     elif view_type == DB.ViewType.Schedule:
-                        views_by_type["schedules"].append(view_name)
+                        views_by_type["schedules"].append(entry)
                     else:
-                        views_by_type["other"].append(view_name)
+                        views_by_type["other"].append(entry)
                         
                 except Exception as e:
                     logger.warning("Could not process view: {}".format(str(e)))
                     continue
             
-            # Sort all lists alphabetically
-            for view_list in views_by_type.values():
+            # Sort all lists alphabetically; names are not unique (a floor
+            # plan and a ceiling plan are often both "Level 1"), so ids are
+            # listed alongside them in the same order
+            view_ids_by_type = {}
+            for group, view_list in views_by_type.items():
                 view_list.sort()
+                views_by_type[group] = [name for name, _ in view_list]
+                view_ids_by_type[group] = [view_id for _, view_id in view_list]
             
             # Count total exportable views
             total_views = sum(len(view_list) for view_list in views_by_type.values())
             
             return safe_make_response(data={
                 "views_by_type": views_by_type,
+                "view_ids_by_type": view_ids_by_type,
                 "total_exportable_views": total_views,
                 "status": "success"
-            })
+            }, etag=etag)
             
         except Exception as e:
             logger.error("Failed to list views: {}".format(str(e)))
@@ -273,6 +286,129 @@ def register_views_routes(api):
                 status=500
             )
     
+    @api.route('/export_views/', methods=["POST"])
+    def export_views(doc, request):
+        """
+        Export several views or sheets as images in one ExportImage call
+
+        Expected request data:
+        {
+            "views": ["Level 1", 123456, "A101"],  // view names, ids or sheet numbers
+            "options": {"preset": "thumbnail"},     // same options as /get_view/
+            "payload": "list"                       // "list" or "zip"
+        }
+
+        Returns:
+            dict: "images" with base64 data per view, or "zip_data" with one
+            file per view and a "files" index, plus "not_found" and "failed"
+        """
+        try:
+            if not doc:
+                return safe_make_response(
+                    data={"error": "No active Revit document"},
+                    status=503
+                )
+
+            data = (
+                json.loads(request.data)
+                if isinstance(request.data, str)
+                else request.data
+            )
+            if not isinstance(data, dict):
+                return safe_make_response(
+                    data={"error": "Invalid data format - expected JSON object"},
+                    status=400
+                )
+
+            entries = data.get("views")
+            if not isinstance(entries, list) or not entries:
+                return safe_make_response(
+                    data={"error": "No views specified"},
+                    status=400
+                )
+            if len(entries) > MAX_BATCH_VIEWS:
+                return safe_make_response(
+                    data={"error": "At most {} views per request".format(MAX_BATCH_VIEWS)},
+                    status=400
+                )
+
+            payload = data.get("payload", "list")
+            if payload not in ("list", "zip"):
+                return safe_make_response(
+                    data={"error": "payload must be 'list' or 'zip'"},
+                    status=400
+                )
+
+            try:
+                options = parse_image_options(data.get("options") or {})
+            except ImageOptionsError as e:
+                return safe_make_response(
+                    data={"error": str(e)},
+                    status=400
+                )
+
+            views, not_found = _resolve_export_views(doc, entries)
+            if not views:
+                return safe_make_response(
+                    data={"error": "No matching views found", "not_found": not_found},
+                    status=404
+                )
+
+            content_type = image_content_type(options)
+            extension = ".jpg" if content_type == "image/jpeg" else ".png"
+            images = []
+            failed = []
+            for view, img_data, cached in export_view_images(doc, views, options):
+                if img_data is None:
+                    failed.append(view.Id.IntegerValue)
+                    continue
+                images.append({
+                    "view_id": view.Id.IntegerValue,
+                    "view_name": get_element_name_safe(view),
+                    "sheet_number": view.SheetNumber if isinstance(view, DB.ViewSheet) else None,
+                    "data": img_data,
+                    "cached": cached
+                })
+
+            response_data = {
+                "status": "success",
+                "content_type": content_type,
+                "exported": len(images),
+                "cached_count": sum(1 for image in images if image["cached"]),
+                "not_found": not_found,
+                "failed": failed
+            }
+
+            if payload == "zip":
+                buffer = io.BytesIO()
+                files = []
+                archive = zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED)
+                try:
+                    for image in images:
+                        file_name = "{}{}".format(image["view_id"], extension)
+                        archive.writestr(file_name, image.pop("data"))
+                        image["file_name"] = file_name
+                        files.append(image)
+                finally:
+                    archive.close()
+                response_data["zip_data"] = base64.b64encode(buffer.getvalue()).decode('utf-8')
+                response_data["files"] = files
+            else:
+                for image in images:
+                    img_data = image.pop("data")
+                    image["image_data"] = base64.b64encode(img_data).decode('utf-8')
+                    image["file_size_bytes"] = len(img_data)
+                response_data["images"] = images
+
+            return safe_make_response(data=response_data)
+
+        except Exception as e:
+            logger.error("Failed to export views: {}".format(str(e)))
+            return safe_make_response(
+                data={"error": "Failed to export views: {}".format(str(e))},
+                status=500
+            )
+
     @api.route('/current_view_info/', methods=["GET"])
     def get_current_view_info(uidoc):
         """
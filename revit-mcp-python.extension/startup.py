@@ -4,7 +4,7 @@ Revit MCP Extension Startup
 Registers all MCP routes and initializes the API
 """
 
-from pyrevit import routes
+from pyrevit import routes, HOST_APP
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,34 +16,65 @@ api = routes.API("revit_mcp")
 def register_routes():
     """Register all MCP route modules"""
     try:
+        # Revit-context handlers are queued through the request dispatcher
+        from revit_mcp.dispatcher import create_route_api, register_dispatcher_routes
+
+        route_api = create_route_api(api)
+        register_dispatcher_routes(api)
+
         # Import and register status routes
         from revit_mcp.status import register_status_routes
 
-        register_status_routes(api)
+        register_status_routes(route_api)
 
         from revit_mcp.model_info import register_model_info_routes
 
-        register_model_info_routes(api)
+        register_model_info_routes(route_api)
 
         from revit_mcp.views import register_views_routes
 
-        register_views_routes(api)
+        register_views_routes(route_api)
 
         from revit_mcp.placement import register_placement_routes
 
-        register_placement_routes(api)
+        register_placement_routes(route_api)
 
         from revit_mcp.sheets import register_sheet_routes
 
-        register_sheet_routes(api)
+        register_sheet_routes(route_api)
 
         from revit_mcp.colors import register_color_routes
 
-        register_color_routes(api)
+        register_color_routes(route_api)
 
         from revit_mcp.code_execution import register_code_execution_routes
 
-        register_code_execution_routes(api)
+        register_code_execution_routes(route_api)
+
+        from revit_mcp.procedures import register_procedure_routes
+
+        register_procedure_routes(route_api)
+
+        from revit_mcp.parameters import register_parameter_routes
+
+        register_parameter_routes(route_api)
+
+        from revit_mcp.query import register_query_routes
+
+        register_query_routes(route_api)
+
+        from revit_mcp.changes import register_change_routes, subscribe_document_events
+
+        subscribe_document_events(HOST_APP.app)
+        register_change_routes(route_api)
+
+        from revit_mcp.mirror import register_mirror_routes
+
+        register_mirror_routes(route_api)
+
+        from revit_mcp.export_files import register_export_file_routes
+
+        register_export_file_routes(route_api)
 
         logger.info("All MCP routes registered successfully")
 
@@ -10,6 +10,9 @@ def register_tools(mcp_server, revit_get_func, revit_post_func, revit_image_func
     from .model_tools import register_model_tools
     from .colors_tools import register_colors_tools
     from .code_execution_tools import register_code_execution_tools
+    from .parameter_tools import register_parameter_tools
+    from .query_tools import register_query_tools
+    from .mirror_tools import register_mirror_tools
 
     # Register tools from each module
     register_status_tools(mcp_server, revit_get_func)
@@ -20,3 +23,6 @@ def register_tools(mcp_server, revit_get_func, revit_post_func, revit_image_func
     register_code_execution_tools(
         mcp_server, revit_get_func, revit_post_func, revit_image_func
     )
+    register_parameter_tools(mcp_server, revit_get_func, revit_post_func)
+    register_query_tools(mcp_server, revit_get_func, revit_post_func)
+    register_mirror_tools(mcp_server, revit_get_func, revit_post_func)
@@ -1,16 +1,76 @@
 """Code execution tools for the MCP server."""
 
+import asyncio
+import uuid
 from mcp.server.fastmcp import Context
+from typing import Any, Dict, Optional
+
+# Scripts can run for a long time; output is streamed while waiting.
+# Revit aborts scripts after time_limit seconds, so the HTTP timeout only
+# needs a margin on top of it (or this default when there is no limit).
+EXECUTE_TIMEOUT_SECONDS = 600.0
+EXECUTE_TIMEOUT_MARGIN_SECONDS = 60.0
+OUTPUT_POLL_SECONDS = 1.0
+
+
+async def _stream_output(revit_get, job_id: str, request: asyncio.Task, ctx: Context):
+    """Relay script output to the client as log messages until the request finishes"""
+    offset = 0
+    while not request.done():
+        await asyncio.wait({request}, timeout=OUTPUT_POLL_SECONDS)
+        if request.done():
+            break
+        # Unknown job errors are expected until Revit starts the script
+        chunk = await revit_get(f"/execute_output/{job_id}/{offset}", ctx)
+        if not isinstance(chunk, dict) or "output" not in chunk:
+            continue
+        if chunk["skipped"]:
+            await ctx.info("[{} characters skipped]".format(chunk["skipped"]))
+        if chunk["output"]:
+            await ctx.info(chunk["output"].rstrip("\n"))
+        offset = chunk["offset"]
+
+
+async def _run_streamed(revit_get, revit_post, endpoint: str, payload: dict, time_limit: int,
+                        ctx: Context = None):
+    """Post a script run, relaying its output, and cancel it in Revit if the call is cancelled"""
+    payload["job_id"] = uuid.uuid4().hex
+    timeout = time_limit + EXECUTE_TIMEOUT_MARGIN_SECONDS if time_limit else EXECUTE_TIMEOUT_SECONDS
+    request = asyncio.ensure_future(revit_post(endpoint, payload, ctx, timeout=timeout))
+    try:
+        if ctx:
+            await _stream_output(revit_get, payload["job_id"], request, ctx)
+        return await request
+    except asyncio.CancelledError:
+        # The tool call was cancelled: stop the script in Revit too
+        await revit_post("/cancel_execution/{}".format(payload["job_id"]), {}, None)
+        raise
+    finally:
+        if not request.done():
+            request.cancel()
 
 
 def register_code_execution_tools(mcp, revit_get, revit_post, revit_image=None):
     """Register code execution tools with the MCP server."""
-    # Note: revit_get and revit_image are unused but kept for interface consistency
-    _ = revit_get, revit_image  # Acknowledge unused parameters
+    # Note: revit_image is unused but kept for interface consistency
+    _ = revit_image  # Acknowledge unused parameter
 
     @mcp.tool()
     async def execute_revit_code(
-        code: str, description: str = "Code execution", ctx: Context = None
+        code: str,
+        description: str = "Code execution",
+        mode: str = "write",
+        session: Optional[str] = None,
+        reset_session: bool = False,
+        args: Optional[Dict[str, Any]] = None,
+        cache: bool = False,
+        refresh: bool = False,
+        echo_code: bool = False,
+        profile: bool = False,
+        profile_top: int = 20,
+        time_limit: int = 300,
+        max_lines: Optional[int] = None,
+        ctx: Context = None,
     ) -> str:
         """
         Execute IronPython code directly in Revit context.
@@ -24,13 +84,50 @@ def register_code_execution_tools(mcp, revit_get, revit_post, revit_image=None):
 
         Use this when the existing MCP tools cannot accomplish what you need.
 
+        Use mode="read" for scripts that only query the model: they run
+        without a transaction, so no commit, regeneration or undo entry.
+        Modifying the document or starting a transaction fails in read mode.
+        mode="write" (the default) wraps the script in a transaction.
+
+        Pass a session name to keep variables, helper functions and imports
+        between calls: define helpers once, then call them in later scripts
+        with the same session instead of re-sending them. Sessions expire
+        after 30 minutes idle; "session_kept": false in the response means
+        the session was dropped for using too much memory.
+
+        For repeated read-mode queries (e.g. counting elements), set cache
+        to reuse the previous output until the model changes: the script
+        is not executed again and the response says "cache": "hit". Pass
+        values that vary between calls in args (available to the code as
+        args) rather than formatting them into the code. Only cache
+        scripts whose output depends on nothing but the model and args.
+
         Args:
             code: The IronPython code to execute (as a string)
             description: Optional description of what the code does
+            mode: "read" for queries, "write" (default) to modify the model
+            session: Optional name of a namespace that persists across calls
+            reset_session: Start the session with an empty namespace
+            args: Values available to the code as the dict args
+            cache: Reuse the output of an identical earlier read-mode call
+                (same code and args) while the model is unchanged. Cannot
+                be combined with mode="write" or a session.
+            refresh: With cache, execute anyway and replace the cached output
+            echo_code: Include the submitted code in the response
+            profile: Time every line and return the hottest ones, with
+                estimated Revit API time vs Python time. Use it to find slow
+                per-element loops worth replacing with collectors or filters.
+            profile_top: Number of lines to report when profiling
+            time_limit: Abort the script after this many seconds and roll
+                back its changes (0 for no limit)
+            max_lines: Abort the script after executing this many lines
             ctx: MCP context for logging
 
         Returns:
-            Execution results including any output or errors
+            Execution results including any output or errors. Output is
+            also streamed as log messages while the script runs. Very large
+            output is truncated to its tail, with the full text saved to
+            "output_file" on the Revit machine.
 
         Example:
             code = '''
@@ -48,15 +145,123 @@ def register_code_execution_tools(mcp, revit_get, revit_post, revit_image=None):
                     '''
         """
         try:
-            payload = {"code": code, "description": description}
+            payload = {
+                "code": code,
+                "description": description,
+                "mode": mode,
+                "echo_code": echo_code,
+                "time_limit": time_limit,
+            }
+            if args:
+                payload["args"] = args
+            if cache:
+                payload["cache"] = True
+                payload["refresh"] = refresh
+            if max_lines:
+                payload["max_lines"] = max_lines
+            if profile:
+                payload["profile"] = True
+                payload["profile_top"] = profile_top
+            if session:
+                payload["session"] = session
+                payload["reset_session"] = reset_session
 
             if ctx:
-                ctx.info("Executing code: {}".format(description))
-
-            return await revit_post("/execute_code/", payload, ctx)
+                await ctx.info("Executing code: {}".format(description))
+            return await _run_streamed(revit_get, revit_post, "/execute_code/", payload, time_limit, ctx)
 
         except (ConnectionError, ValueError, RuntimeError) as e:
             error_msg = "Error during code execution: {}".format(str(e))
             if ctx:
-                ctx.error(error_msg)
+                await ctx.error(error_msg)
+            return error_msg
+
+    # Procedure name -> declared mode, so read procedures are scheduled as
+    # interactive requests; Revit always runs the declared mode
+    procedure_modes: Dict[str, str] = {}
+
+    def _remember_modes(listing):
+        if isinstance(listing, dict):
+            for procedure in listing.get("procedures", []):
+                procedure_modes[procedure["name"]] = procedure.get("mode")
+
+    @mcp.tool()
+    async def list_procedures(ctx: Context = None) -> str:
+        """
+        List the stored procedures available in Revit.
+
+        Stored procedures are named IronPython scripts kept and pre-compiled
+        in Revit. Each entry has a description, its mode ("read" or
+        "write") and a parameter schema. Prefer a matching procedure over
+        sending equivalent code with execute_revit_code.
+
+        Args:
+            ctx: MCP context for logging
+
+        Returns:
+            Procedures with their names, descriptions, modes and parameters
+        """
+        listing = await revit_get("/procedures/", ctx)
+        _remember_modes(listing)
+        return listing
+
+    @mcp.tool()
+    async def run_procedure(
+        name: str,
+        args: Optional[Dict[str, Any]] = None,
+        cache: bool = False,
+        refresh: bool = False,
+        profile: bool = False,
+        time_limit: int = 300,
+        max_lines: Optional[int] = None,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Run a stored procedure in Revit by name.
+
+        Use list_procedures to see the available procedures and their
+        parameters. Arguments are checked against the procedure's schema
+        before it runs, and it runs in its declared mode: write procedures
+        are wrapped in a transaction that is rolled back on error.
+
+        Args:
+            name: Procedure name
+            args: Arguments by parameter name
+            cache: For read procedures, reuse the result of an earlier call
+                with the same args while the model is unchanged
+            refresh: With cache, run anyway and replace the cached result
+            profile: Time every line and return the hottest ones
+            time_limit: Abort the procedure after this many seconds and roll
+                back its changes (0 for no limit)
+            max_lines: Abort the procedure after executing this many lines
+            ctx: MCP context for logging
+
+        Returns:
+            The procedure's "result" and printed output, or errors. Output
+            is also streamed as log messages while it runs.
+        """
+        try:
+            payload = {"args": args or {}, "time_limit": time_limit}
+            if cache:
+                payload["cache"] = True
+                payload["refresh"] = refresh
+            if max_lines:
+                payload["max_lines"] = max_lines
+            if profile:
+                payload["profile"] = True
+            if name not in procedure_modes:
+                _remember_modes(await revit_get("/procedures/", ctx))
+            if procedure_modes.get(name):
+                payload["mode"] = procedure_modes[name]
+
+            if ctx:
+                await ctx.info("Running procedure: {}".format(name))
+            return await _run_streamed(
+                revit_get, revit_post, "/run_procedure/{}".format(name), payload, time_limit, ctx
+            )
+
+        except (ConnectionError, ValueError, RuntimeError) as e:
+            error_msg = "Error running procedure: {}".format(str(e))
+            if ctx:
+                await ctx.error(error_msg)
             return error_msg
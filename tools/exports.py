@@ -0,0 +1,149 @@
+"""Helpers for receiving export files from Revit"""
+
+import base64
+import io
+import mmap
+import os
+import shutil
+from mcp.server.fastmcp import Context
+from typing import Any, Dict, Optional
+
+# "auto" tries a local file handoff and falls back to chunked downloads for
+# the rest of the session if Revit's export path is not visible from here
+# (e.g. Revit on another machine); "off" always downloads in chunks.
+HANDOFF_MODE = os.getenv("REVIT_MCP_FILE_HANDOFF", "auto").lower()
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+_handoff_available = HANDOFF_MODE not in ("off", "0", "false", "no")
+
+
+class ExportTransferError(Exception):
+    """Raised when an export cannot be downloaded from Revit"""
+
+
+def read_file_base64(path: str) -> str:
+    """Base64-encode a file, memory-mapping large files to avoid an extra copy"""
+    if os.path.getsize(path) < MMAP_THRESHOLD_BYTES:
+        with open(path, "rb") as handle:
+            return base64.b64encode(handle.read()).decode("ascii")
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return base64.b64encode(mapped).decode("ascii")
+
+
+async def _download_chunks(revit_get, export_id: str, size: int, handle, ctx: Context = None,
+                           report_progress: bool = True):
+    """Download a published export piece by piece into an open binary file"""
+    offset = 0
+    while offset < size:
+        chunk = await revit_get(
+            f"/export_chunk/{export_id}/{offset}", ctx,
+            params={"length": CHUNK_BYTES}, timeout=120.0,
+        )
+        if not isinstance(chunk, dict):
+            raise ExportTransferError(chunk)
+        if "error" in chunk:
+            raise ExportTransferError(chunk["error"])
+        data = base64.b64decode(chunk["data"])
+        if not data:
+            break
+        handle.write(data)
+        offset += len(data)
+        if ctx and report_progress:
+            await ctx.report_progress(offset, size)
+    if offset != size:
+        raise ExportTransferError(f"download stopped at byte {offset} of {size}")
+
+
+def preferred_delivery() -> str:
+    """Delivery mode to request from export routes ("handoff" or "chunked")"""
+    return "handoff" if _handoff_available else "chunked"
+
+
+async def deliver_export(
+    revit_get,
+    revit_post,
+    export: Dict[str, Any],
+    data_key: str,
+    ctx: Context = None,
+    output_path: Optional[str] = None,
+    report_progress: bool = True,
+) -> Dict[str, Any]:
+    """
+    Receive one file published by an export route and release it
+
+    export holds the route's "export_id" and "size_bytes", plus "path" with a
+    handoff. The file is copied to output_path (or encoded into data_key)
+    straight from disk if that path is visible from here; otherwise it is
+    downloaded in chunks, so memory use stays bounded when writing to
+    output_path. The export is released afterwards either way.
+
+    Returns:
+        export without export_id and path, with "output_path" set if the
+        file was saved or data_key holding base64 data, plus "delivery"
+    """
+    global _handoff_available
+
+    result = dict(export)
+    export_id = result.pop("export_id")
+    path = result.pop("path", None)
+    try:
+        if path is not None and os.path.isfile(path):
+            if output_path:
+                shutil.copyfile(path, output_path)
+                result["output_path"] = output_path
+            else:
+                result[data_key] = read_file_base64(path)
+            result["delivery"] = "handoff"
+            return result
+
+        if path is not None:
+            _handoff_available = False
+            if ctx:
+                await ctx.info("Export path not visible locally; downloading in chunks")
+
+        size = result["size_bytes"]
+        if output_path:
+            with open(output_path, "wb") as handle:
+                await _download_chunks(revit_get, export_id, size, handle, ctx, report_progress)
+            result["output_path"] = output_path
+        else:
+            buffer = io.BytesIO()
+            await _download_chunks(revit_get, export_id, size, buffer, ctx, report_progress)
+            result[data_key] = base64.b64encode(buffer.getvalue()).decode("ascii")
+        result["delivery"] = "chunked"
+        return result
+    except ExportTransferError as e:
+        return {"error": f"Failed to download export: {e}"}
+    finally:
+        await revit_post(f"/release_export/{export_id}", {}, ctx)
+
+
+async def receive_export(
+    revit_get,
+    revit_post,
+    endpoint: str,
+    data: Dict[str, Any],
+    data_key: str,
+    ctx: Context = None,
+    output_path: Optional[str] = None,
+    timeout: float = 300.0,
+    report_progress: bool = True,
+) -> Dict[str, Any]:
+    """
+    Request an export and receive the file without a single large transfer
+
+    The route leaves the file in Revit's export workspace and the file is
+    received with deliver_export().
+
+    Returns:
+        The route response with "output_path" set if the file was saved,
+        or with data_key holding base64 data, plus "delivery"
+    """
+    result = await revit_post(endpoint, dict(data, delivery=preferred_delivery()), ctx, timeout=timeout)
+    if not isinstance(result, dict) or "export_id" not in result:
+        return result
+    return await deliver_export(revit_get, revit_post, result, data_key, ctx, output_path, report_progress)
@@ -0,0 +1,236 @@
+"""Contact sheets, visual diffs and the worker process pool for image work"""
+
+import asyncio
+import atexit
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image as PILImage
+from PIL import ImageChops, ImageDraw, ImageFont
+
+# Image work is CPU-bound, so it runs in separate processes to keep the
+# event loop (and every other tool call) responsive
+IMAGE_WORKERS = int(os.getenv("REVIT_MCP_IMAGE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+LABEL_HEIGHT = 18
+TILE_PADDING = 4
+BACKGROUND = (255, 255, 255)
+BORDER = (200, 200, 200)
+LABEL_COLOR = (0, 0, 0)
+
+# Visual diff settings: changes are located on a grid of DIFF_TILE_SIZE
+# tiles; channel differences up to DIFF_NOISE_LEVEL are ignored (JPEG noise)
+DIFF_TILE_SIZE = 32
+DIFF_NOISE_LEVEL = 24
+DIFF_REGION_PADDING = 16
+# Above this many regions or this changed fraction, send the whole image
+MAX_DIFF_REGIONS = 8
+MAX_DIFF_FRACTION = 0.5
+
+MAX_RENDER_HISTORY_BYTES = 128 * 1024 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Return the shared image worker pool, starting it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        atexit.register(_shutdown_pool)
+    return _pool
+
+
+async def run_in_image_pool(func, *args):
+    """Run a picklable function in the image worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), func, *args)
+
+
+def _fit_label(draw: ImageDraw.ImageDraw, label: str, font, width: int) -> str:
+    if draw.textlength(label, font=font) <= width:
+        return label
+    while label and draw.textlength(label + "...", font=font) > width:
+        label = label[:-1]
+    return label + "..."
+
+
+def render_tile(image_data: bytes, label: str, tile_size: int) -> Tuple[int, int, bytes]:
+    """
+    Scale an image into a labelled square tile
+
+    Returns:
+        (width, height, raw RGB bytes) of the tile
+    """
+    width = tile_size + 2 * TILE_PADDING
+    height = tile_size + LABEL_HEIGHT + 2 * TILE_PADDING
+    tile = PILImage.new("RGB", (width, height), BACKGROUND)
+
+    with PILImage.open(io.BytesIO(image_data)) as source:
+        thumbnail = source.convert("RGB")
+    thumbnail.thumbnail((tile_size, tile_size))
+    left = TILE_PADDING + (tile_size - thumbnail.width) // 2
+    top = TILE_PADDING + (tile_size - thumbnail.height) // 2
+    tile.paste(thumbnail, (left, top))
+
+    draw = ImageDraw.Draw(tile)
+    draw.rectangle((0, 0, width - 1, height - 1), outline=BORDER)
+    font = ImageFont.load_default()
+    text = _fit_label(draw, label, font, width - 2 * TILE_PADDING)
+    draw.text((TILE_PADDING, tile_size + 2 * TILE_PADDING), text, fill=LABEL_COLOR, font=font)
+    return width, height, tile.tobytes()
+
+
+def compose_contact_sheet(tiles: List[Tuple[int, int, bytes]], columns: int,
+                          image_format: str = "JPEG") -> bytes:
+    """Arrange equally sized tiles from render_tile in a grid and encode it"""
+    tile_width, tile_height = tiles[0][0], tiles[0][1]
+    rows = (len(tiles) + columns - 1) // columns
+    sheet = PILImage.new("RGB", (columns * tile_width, rows * tile_height), BACKGROUND)
+    for index, (width, height, data) in enumerate(tiles):
+        tile = PILImage.frombytes("RGB", (width, height), data)
+        sheet.paste(tile, ((index % columns) * tile_width, (index // columns) * tile_height))
+
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        sheet.save(buffer, format="JPEG", quality=85)
+    else:
+        sheet.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _changed_tiles(mask: PILImage.Image, tile_size: int) -> set:
+    changed = set()
+    bbox = mask.getbbox()
+    if bbox is None:
+        return changed
+    left, top, right, bottom = bbox
+    for row in range(top // tile_size, (bottom - 1) // tile_size + 1):
+        for column in range(left // tile_size, (right - 1) // tile_size + 1):
+            box = (column * tile_size, row * tile_size,
+                   min((column + 1) * tile_size, mask.width), min((row + 1) * tile_size, mask.height))
+            if mask.crop(box).getbbox() is not None:
+                changed.add((column, row))
+    return changed
+
+
+def _tile_regions(tiles: set) -> List[Tuple[int, int, int, int]]:
+    """Group changed tiles into bounding boxes (in tiles), joining tiles at most one tile apart"""
+    regions = []
+    remaining = set(tiles)
+    while remaining:
+        stack = [remaining.pop()]
+        columns, rows = [], []
+        while stack:
+            column, row = stack.pop()
+            columns.append(column)
+            rows.append(row)
+            for d_column in range(-2, 3):
+                for d_row in range(-2, 3):
+                    neighbour = (column + d_column, row + d_row)
+                    if neighbour in remaining:
+                        remaining.remove(neighbour)
+                        stack.append(neighbour)
+        regions.append((min(columns), min(rows), max(columns) + 1, max(rows) + 1))
+    return sorted(regions, key=lambda region: (region[1], region[0]))
+
+
+def diff_images(previous: bytes, current: bytes, tile_size: int = DIFF_TILE_SIZE) -> Dict[str, Any]:
+    """
+    Compare two renders of a view on a tile grid
+
+    Returns:
+        dict with "status" ("unchanged" or "changed") and "size". For changes
+        confined to a few areas, "regions" holds pixel boxes (x, y, width,
+        height) with matching "crops" of the current image, encoded in its
+        "format"; otherwise "full_image" is True and "reason" says why.
+    """
+    with PILImage.open(io.BytesIO(previous)) as image:
+        old = image.convert("RGB")
+    with PILImage.open(io.BytesIO(current)) as image:
+        image_format = image.format or "PNG"
+        new = image.convert("RGB")
+
+    result: Dict[str, Any] = {"size": [new.width, new.height], "format": image_format.lower()}
+    if old.size != new.size:
+        return dict(result, status="changed", full_image=True, reason="image size changed")
+
+    red, green, blue = ImageChops.difference(old, new).split()
+    mask = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    mask = mask.point(lambda value: 255 if value > DIFF_NOISE_LEVEL else 0)
+
+    tiles = _changed_tiles(mask, tile_size)
+    if not tiles:
+        return dict(result, status="unchanged")
+
+    regions = []
+    for left, top, right, bottom in _tile_regions(tiles):
+        x = max(0, left * tile_size - DIFF_REGION_PADDING)
+        y = max(0, top * tile_size - DIFF_REGION_PADDING)
+        x_end = min(new.width, right * tile_size + DIFF_REGION_PADDING)
+        y_end = min(new.height, bottom * tile_size + DIFF_REGION_PADDING)
+        regions.append((x, y, x_end - x, y_end - y))
+
+    changed_area = sum(width * height for _, _, width, height in regions)
+    changed_fraction = round(changed_area / float(new.width * new.height), 4)
+    result.update(status="changed", changed_fraction=changed_fraction)
+    if len(regions) > MAX_DIFF_REGIONS:
+        return dict(result, full_image=True, reason="too many changed regions")
+    if changed_fraction > MAX_DIFF_FRACTION:
+        return dict(result, full_image=True, reason="most of the image changed")
+
+    crops = []
+    for x, y, width, height in regions:
+        buffer = io.BytesIO()
+        new.crop((x, y, x + width, y + height)).save(buffer, format=image_format)
+        crops.append(buffer.getvalue())
+    result["regions"] = [
+        {"x": x, "y": y, "width": width, "height": height} for x, y, width, height in regions
+    ]
+    result["crops"] = crops
+    return result
+
+
+class RenderHistory:
+    """
+    Last render of each view, kept in memory for visual diffs
+
+    Entries are keyed by view and export options, and the least recently
+    used ones are dropped beyond the size limit.
+    """
+
+    def __init__(self, max_bytes: int = MAX_RENDER_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        self._renders: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def key(view_name: str, params: Dict[str, str]) -> Tuple:
+        return (view_name,) + tuple(sorted(params.items()))
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        data = self._renders.get(key)
+        if data is not None:
+            self._renders.move_to_end(key)
+        return data
+
+    def put(self, key: Tuple, data: bytes):
+        old = self._renders.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._renders[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes and len(self._renders) > 1:
+            _, dropped = self._renders.popitem(last=False)
+            self._size -= len(dropped)
+
+
+render_history = RenderHistory()
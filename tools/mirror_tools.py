@@ -0,0 +1,439 @@
+"""Local SQLite mirror of model metadata for offline queries"""
+
+import asyncio
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import time
+from mcp.server.fastmcp import Context
+from typing import Dict, Any, List, Optional
+
+MIRROR_PATH = os.getenv(
+    "REVIT_MCP_MIRROR_DB",
+    os.path.join(tempfile.gettempdir(), "revit_mcp_mirror.sqlite"),
+)
+MIRROR_KINDS = ("elements", "types", "levels", "views", "sheets")
+DEFAULT_MIRROR_PARAMETERS = ["Mark", "Comments"]
+EXPORT_PAGE_SIZE = 2000
+MAX_QUERY_ROWS = 5000
+
+# Columns stored for each kind, besides the shared id/unique_id/name/category
+KIND_COLUMNS = {
+    "elements": ("type_id", "level_id"),
+    "types": ("family",),
+    "levels": ("elevation",),
+    "views": ("view_type",),
+    "sheets": ("number",),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS elements (
+    id INTEGER PRIMARY KEY, unique_id TEXT, name TEXT, category TEXT,
+    type_id INTEGER, level_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS elements_category ON elements (category);
+CREATE INDEX IF NOT EXISTS elements_type ON elements (type_id);
+CREATE INDEX IF NOT EXISTS elements_level ON elements (level_id);
+CREATE TABLE IF NOT EXISTS types (
+    id INTEGER PRIMARY KEY, unique_id TEXT, name TEXT, category TEXT, family TEXT
+);
+CREATE TABLE IF NOT EXISTS levels (
+    id INTEGER PRIMARY KEY, unique_id TEXT, name TEXT, category TEXT, elevation REAL
+);
+CREATE TABLE IF NOT EXISTS views (
+    id INTEGER PRIMARY KEY, unique_id TEXT, name TEXT, category TEXT, view_type TEXT
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    id INTEGER PRIMARY KEY, unique_id TEXT, name TEXT, category TEXT, number TEXT
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    element_id INTEGER, name TEXT, value TEXT, PRIMARY KEY (element_id, name)
+);
+CREATE INDEX IF NOT EXISTS parameters_name_value ON parameters (name, value);
+"""
+
+SCHEMA_DESCRIPTION = (
+    "elements(id, unique_id, name, category, type_id, level_id); "
+    "types(id, unique_id, name, category, family); "
+    "levels(id, unique_id, name, category, elevation); "
+    "views(id, unique_id, name, category, view_type); "
+    "sheets(id, unique_id, name, category, number); "
+    "parameters(element_id, name, value); "
+    "meta(key, value)"
+)
+
+
+class MirrorError(Exception):
+    """Raised when Revit returns an error while syncing the mirror"""
+
+
+class ModelMirror:
+    """
+    SQLite snapshot of model metadata.
+
+    Writes go through a single connection owned by the mirror; queries open
+    their own read-only connection so they only see committed syncs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search "
+                "USING fts5(kind UNINDEXED, name, text)"
+            )
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: fall back to LIKE matching
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS search "
+                "(rowid INTEGER PRIMARY KEY, kind TEXT, name TEXT, text TEXT)"
+            )
+            self.has_fts = False
+        self.conn.commit()
+        self.lock = asyncio.Lock()
+
+    def state(self) -> Dict[str, Any]:
+        state = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        if "parameters" in state:
+            state["parameters"] = json.loads(state["parameters"])
+        if "token" in state:
+            state["token"] = int(state["token"])
+        return state
+
+    def set_state(self, **values):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [
+                (key, json.dumps(value) if isinstance(value, list) else str(value))
+                for key, value in values.items()
+            ],
+        )
+
+    def clear(self):
+        for table in MIRROR_KINDS + ("parameters", "search", "meta"):
+            self.conn.execute("DELETE FROM {}".format(table))
+
+    def delete(self, element_ids: List[int]):
+        rows = [(element_id,) for element_id in element_ids]
+        for kind in MIRROR_KINDS:
+            self.conn.executemany("DELETE FROM {} WHERE id = ?".format(kind), rows)
+        self.conn.executemany("DELETE FROM parameters WHERE element_id = ?", rows)
+        self.conn.executemany("DELETE FROM search WHERE rowid = ?", rows)
+
+    def upsert(self, rows: List[Dict[str, Any]]):
+        """Insert or replace exported rows, moving elements whose kind changed"""
+        self.delete([row["id"] for row in rows])
+        for row in rows:
+            kind = row["kind"]
+            columns = ("id", "unique_id", "name", "category") + KIND_COLUMNS[kind]
+            self.conn.execute(
+                "INSERT INTO {} ({}) VALUES ({})".format(
+                    kind, ", ".join(columns), ", ".join("?" * len(columns))
+                ),
+                [row.get(column) for column in columns],
+            )
+
+            parameters = row.get("parameters") or {}
+            self.conn.executemany(
+                "INSERT INTO parameters (element_id, name, value) VALUES (?, ?, ?)",
+                [(row["id"], name, value) for name, value in parameters.items()],
+            )
+
+            text = [row.get("category"), row.get("number"), row.get("family"), row.get("view_type")]
+            text.extend(parameters.values())
+            self.conn.execute(
+                "INSERT INTO search (rowid, kind, name, text) VALUES (?, ?, ?, ?)",
+                (row["id"], kind, row.get("name"), " ".join(str(t) for t in text if t)),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            kind: self.conn.execute("SELECT COUNT(*) FROM {}".format(kind)).fetchone()[0]
+            for kind in MIRROR_KINDS
+        }
+
+    def reader(self) -> sqlite3.Connection:
+        # as_uri() percent-encodes "#", "?" and "%", which are common in profile paths
+        uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+
+def _check(response) -> Dict[str, Any]:
+    if not isinstance(response, dict):
+        raise MirrorError(response)
+    if "error" in response:
+        raise MirrorError(response["error"])
+    return response
+
+
+def register_mirror_tools(mcp, revit_get, revit_post):
+    """Register local mirror tools"""
+
+    mirror_holder = {}
+
+    def get_mirror() -> ModelMirror:
+        if "mirror" not in mirror_holder:
+            mirror_holder["mirror"] = ModelMirror(MIRROR_PATH)
+        return mirror_holder["mirror"]
+
+    async def full_sync(mirror: ModelMirror, parameters: List[str], ctx: Context):
+        first_page = None
+        try:
+            mirror.clear()
+            for kind in MIRROR_KINDS:
+                offset = 0
+                while offset is not None:
+                    page = _check(await revit_post(
+                        "/export_model_data/",
+                        {"kind": kind, "offset": offset, "limit": EXPORT_PAGE_SIZE,
+                         "parameters": parameters},
+                        ctx,
+                        timeout=120.0,
+                    ))
+                    # The first page's token is the baseline for later incremental syncs
+                    first_page = first_page or page
+                    mirror.upsert(page["rows"])
+                    offset = page["next_offset"]
+                if ctx:
+                    await ctx.info("Mirrored {}".format(kind))
+
+            mirror.set_state(
+                document=first_page["document"],
+                session=first_page["session"],
+                token=first_page["token"],
+                parameters=parameters,
+                synced_at=time.time(),
+            )
+            mirror.conn.commit()
+        except Exception:
+            mirror.conn.rollback()
+            raise
+
+    async def incremental_sync(mirror: ModelMirror, state: Dict[str, Any], ctx: Context):
+        """Apply journal changes; returns None if a full sync is required instead"""
+        changes = _check(await revit_get(
+            "/changes_since/{}".format(state["token"]), ctx,
+            params={"session": state.get("session") or ""},
+        ))
+        if (
+            changes["resync"]
+            or changes["session"] != state.get("session")
+            or changes.get("document") != state.get("document")
+        ):
+            return None
+
+        try:
+            mirror.delete(changes["deleted"])
+            changed_ids = changes["added"] + changes["modified"]
+            for start in range(0, len(changed_ids), EXPORT_PAGE_SIZE):
+                page = _check(await revit_post(
+                    "/export_model_data/",
+                    {"element_ids": changed_ids[start:start + EXPORT_PAGE_SIZE],
+                     "limit": EXPORT_PAGE_SIZE,
+                     "parameters": state["parameters"]},
+                    ctx,
+                    timeout=120.0,
+                ))
+                mirror.upsert(page["rows"])
+                # Elements that are no longer mirrored (e.g. became a view template)
+                mirror.delete(page.get("missing_ids", []))
+
+            mirror.set_state(token=changes["token"], synced_at=time.time())
+            mirror.conn.commit()
+        except Exception:
+            mirror.conn.rollback()
+            raise
+
+        return {
+            "added": len(changes["added"]),
+            "modified": len(changes["modified"]),
+            "deleted": len(changes["deleted"]),
+        }
+
+    def mirror_status(mirror: ModelMirror) -> Dict[str, Any]:
+        state = mirror.state()
+        if "synced_at" not in state:
+            return {"error": "Mirror is empty - run sync_model_mirror first"}
+        return {
+            "document": state["document"],
+            "parameters": state["parameters"],
+            "synced_seconds_ago": round(time.time() - float(state["synced_at"]), 1),
+        }
+
+    @mcp.tool()
+    async def sync_model_mirror(
+        full: bool = False,
+        parameters: Optional[List[str]] = None,
+        ctx: Context = None,
+    ) -> Dict[str, Any]:
+        """
+        Build or refresh the local SQLite mirror of model metadata
+
+        The first sync exports elements, types, levels, views, sheets and the
+        selected parameters from Revit in pages. Later syncs only fetch elements
+        changed since the last sync, so calling this before a batch of
+        query_model_mirror/search_model_mirror calls is cheap.
+
+        Args:
+            full: Force a complete rebuild instead of an incremental update
+            parameters: Instance parameters to mirror (default: the previously
+                mirrored set, or ["Mark", "Comments"]); changing them forces a rebuild
+            ctx: MCP context for logging
+
+        Returns:
+            Sync mode, changed element counts and row counts per table
+        """
+        mirror = get_mirror()
+        start = time.perf_counter()
+        async with mirror.lock:
+            state = mirror.state()
+            wanted = parameters or state.get("parameters") or DEFAULT_MIRROR_PARAMETERS
+            try:
+                changes = None
+                if not full and "token" in state and wanted == state.get("parameters"):
+                    changes = await incremental_sync(mirror, state, ctx)
+                if changes is None:
+                    if ctx:
+                        await ctx.info("Rebuilding model mirror")
+                    await full_sync(mirror, wanted, ctx)
+            except MirrorError as e:
+                return {"error": "Failed to sync model mirror: {}".format(e)}
+
+            return {
+                "status": "success",
+                "mode": "full" if changes is None else "incremental",
+                "changes": changes,
+                "counts": mirror.counts(),
+                "elapsed_seconds": round(time.perf_counter() - start, 2),
+                "path": mirror.path,
+            }
+
+    @mcp.tool()
+    async def query_model_mirror(
+        sql: str,
+        params: Optional[List[Any]] = None,
+        limit: int = 500,
+        ctx: Context = None,
+    ) -> Dict[str, Any]:
+        """
+        Run a read-only SQL query against the local model mirror
+
+        Answers metadata questions without touching Revit. Run sync_model_mirror
+        first to build or refresh the mirror. Tables:
+        elements(id, unique_id, name, category, type_id, level_id);
+        types(id, unique_id, name, category, family);
+        levels(id, unique_id, name, category, elevation);
+        views(id, unique_id, name, category, view_type);
+        sheets(id, unique_id, name, category, number);
+        parameters(element_id, name, value) holds mirrored parameter display values.
+
+        Example: doors per level
+            SELECT l.name, COUNT(*) FROM elements e JOIN levels l ON e.level_id = l.id
+            WHERE e.category = 'Doors' GROUP BY l.name
+
+        Args:
+            sql: A single SELECT statement
+            params: Values for "?" placeholders in sql
+            limit: Maximum number of rows to return (default: 500)
+            ctx: MCP context for logging
+
+        Returns:
+            "columns" and "rows" of the result, with mirror freshness information
+        """
+        mirror = get_mirror()
+        status = mirror_status(mirror)
+        if "error" in status:
+            return status
+
+        limit = max(1, min(limit, MAX_QUERY_ROWS))
+        conn = mirror.reader()
+        try:
+            cursor = conn.execute(sql, params or [])
+            rows = cursor.fetchmany(limit + 1)
+            columns = [column[0] for column in cursor.description or []]
+        except sqlite3.Error as e:
+            return {"error": "Query failed: {}".format(e), "schema": SCHEMA_DESCRIPTION}
+        finally:
+            conn.close()
+
+        return {
+            "status": "success",
+            "columns": columns,
+            "rows": [list(row) for row in rows[:limit]],
+            "truncated": len(rows) > limit,
+            "mirror": status,
+        }
+
+    @mcp.tool()
+    async def search_model_mirror(
+        text: str,
+        kinds: Optional[List[str]] = None,
+        limit: int = 50,
+        ctx: Context = None,
+    ) -> Dict[str, Any]:
+        """
+        Full-text search names, categories and mirrored parameter values
+
+        Every word must match; the last word also matches as a prefix.
+        Run sync_model_mirror first to build or refresh the mirror.
+
+        Args:
+            text: Words to search for, e.g. "fire door 60"
+            kinds: Restrict to some of: elements, types, levels, views, sheets
+            limit: Maximum number of matches to return (default: 50)
+            ctx: MCP context for logging
+
+        Returns:
+            Matches with id, kind and name, best matches first
+        """
+        mirror = get_mirror()
+        status = mirror_status(mirror)
+        if "error" in status:
+            return status
+
+        words = text.split()
+        if not words:
+            return {"error": "Search text is empty"}
+        kinds = kinds or list(MIRROR_KINDS)
+        invalid = [kind for kind in kinds if kind not in MIRROR_KINDS]
+        if invalid:
+            return {"error": "Unknown kinds {}; use {}".format(invalid, ", ".join(MIRROR_KINDS))}
+        limit = max(1, min(limit, MAX_QUERY_ROWS))
+        kind_filter = "kind IN ({})".format(", ".join("?" * len(kinds)))
+
+        if mirror.has_fts:
+            match = " ".join('"{}"'.format(word.replace('"', '""')) for word in words) + "*"
+            sql = (
+                "SELECT rowid, kind, name FROM search WHERE search MATCH ? AND {} "
+                "ORDER BY rank LIMIT ?".format(kind_filter)
+            )
+            args = [match] + kinds + [limit]
+        else:
+            like = " AND ".join(["(name || ' ' || text) LIKE ?"] * len(words))
+            sql = "SELECT rowid, kind, name FROM search WHERE {} AND {} LIMIT ?".format(
+                like, kind_filter
+            )
+            args = ["%{}%".format(word) for word in words] + kinds + [limit]
+
+        conn = mirror.reader()
+        try:
+            rows = conn.execute(sql, args).fetchall()
+        except sqlite3.Error as e:
+            return {"error": "Search failed: {}".format(e)}
+        finally:
+            conn.close()
+
+        return {
+            "status": "success",
+            "matches": [{"id": row[0], "kind": row[1], "name": row[2]} for row in rows],
+            "mirror": status,
+        }
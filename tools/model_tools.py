@@ -1,6 +1,14 @@
 """Model structure and hierarchy tools"""
 
+import asyncio
+import os
+import re
+import shutil
 from mcp.server.fastmcp import Context
+from typing import Optional
+
+from .exports import deliver_export, preferred_delivery, read_file_base64
+from .sheet_pdf_cache import merge_pdfs, pdf_cache
 
 
 def register_model_tools(mcp, revit_get, revit_post):
@@ -23,7 +31,131 @@ def register_model_tools(mcp, revit_get, revit_post):
         return await revit_get(endpoint, ctx)
 
     @mcp.tool()
-    async def export_sheets_pdf(sheets: list, ctx: Context = None) -> str:
-        """Export specified sheets to a PDF and return encoded data"""
-        payload = {"sheets": sheets}
-        return await revit_post("/export_sheets_pdf/", payload, ctx)
+    async def export_sheets_pdf(
+        sheets: list,
+        output_path: Optional[str] = None,
+        per_sheet: bool = False,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Export specified sheets to a combined PDF
+
+        Args:
+            sheets: Sheet numbers or sheet ids
+            output_path: File to save the PDF to; if omitted the PDF is returned
+                base64-encoded in "pdf_data". With per_sheet, a directory.
+            per_sheet: Write one PDF per sheet into the output_path directory
+                instead of a combined PDF
+            ctx: MCP context for logging
+
+        Sheets are cached per sheet. Repeat exports only re-export sheets whose
+        content changed in Revit, all in one export call with a PDF per sheet;
+        the combined PDF is assembled from the cached pages. When this server runs on the same
+        machine as Revit each PDF is read directly from Revit's export folder;
+        otherwise it is downloaded in chunks.
+        """
+        if per_sheet and not output_path:
+            return {"error": "per_sheet requires output_path (a directory)"}
+
+        versions = await revit_post("/sheet_versions/", {"sheets": sheets}, ctx)
+        if not isinstance(versions, dict) or "sheets" not in versions:
+            return versions
+        targets = versions["sheets"]
+        if not targets:
+            return {"error": "No matching sheets found", "not_found": versions["not_found"]}
+
+        document = versions["document"]
+        paths = {}
+        failed = []
+        stale = []
+        for sheet in targets:
+            path = pdf_cache.lookup(document, sheet["id"], sheet["version"])
+            if path is None:
+                stale.append(sheet)
+            else:
+                paths[sheet["id"]] = path
+        reused = len(paths)
+
+        if stale:
+            if ctx:
+                await ctx.info("Exporting {} changed sheet(s), reusing {} cached".format(len(stale), reused))
+            exported = await revit_post(
+                "/export_sheets_pdf/",
+                {"sheets": [sheet["id"] for sheet in stale], "combine": False, "delivery": preferred_delivery()},
+                ctx,
+                timeout=300.0,
+            )
+            if not isinstance(exported, dict) or "files" not in exported:
+                error = exported.get("error") if isinstance(exported, dict) else exported
+                failed = [{"sheet": sheet["number"], "error": error} for sheet in stale]
+            else:
+                stale_by_id = {sheet["id"]: sheet for sheet in stale}
+                for index, export in enumerate(exported["files"]):
+                    sheet = stale_by_id[export["sheet_id"]]
+                    temp_path = pdf_cache.new_temp_path()
+                    result = await deliver_export(
+                        revit_get, revit_post, export, "pdf_data", ctx, temp_path, report_progress=False,
+                    )
+                    if "output_path" in result:
+                        paths[sheet["id"]] = pdf_cache.store(document, sheet["id"], sheet["version"], temp_path)
+                    else:
+                        os.remove(temp_path)
+                        failed.append({"sheet": sheet["number"], "error": result.get("error")})
+                    if ctx:
+                        await ctx.report_progress(index + 1, len(exported["files"]))
+                for number in exported.get("missing", []):
+                    failed.append({"sheet": number, "error": "Exported file could not be matched to the sheet"})
+
+        cached_paths = [(sheet, paths[sheet["id"]]) for sheet in targets if sheet["id"] in paths]
+
+        summary = {
+            "sheets_exported": len(cached_paths) - reused,
+            "sheets_reused": reused,
+            "not_found": versions["not_found"],
+            "failed": failed,
+        }
+
+        if per_sheet:
+            os.makedirs(output_path, exist_ok=True)
+            files = []
+            for sheet, path in cached_paths:
+                file_name = re.sub(r"[^\w.-]+", "_", str(sheet["number"])) + ".pdf"
+                target = os.path.join(output_path, file_name)
+                shutil.copyfile(path, target)
+                files.append({"sheet": sheet["number"], "path": target})
+            pdf_cache.prune()
+            return dict(
+                summary,
+                status="success" if files else "error",
+                output_dir=output_path,
+                files=files,
+            )
+
+        if failed:
+            pdf_cache.prune()
+            return dict(summary, error="Failed to export {} of {} sheets".format(len(failed), len(targets)))
+
+        merge_path = output_path or pdf_cache.new_temp_path()
+        try:
+            pages = await asyncio.to_thread(merge_pdfs, [path for _, path in cached_paths], merge_path)
+            if output_path:
+                return dict(summary, status="success", output_path=output_path, pages=pages)
+            return dict(summary, status="success", pdf_data=read_file_base64(merge_path), pages=pages)
+        finally:
+            if not output_path:
+                os.remove(merge_path)
+            pdf_cache.prune()
+
+    @mcp.tool()
+    async def get_model_changes(token: int = 0, session: str = "", ctx: Context = None) -> str:
+        """
+        Get element ids added, modified or deleted since a change token
+
+        Call with token=0 (or use the "token" from a previous call) and keep the
+        returned "token" and "session" for the next call; pass both back so a
+        token from before a Revit restart is detected. If "resync" is true the
+        journal could not cover the whole interval (overflow, Revit restart or
+        document reopened) and any cached model data should be reloaded.
+        """
+        params = {"session": session} if session else None
+        return await revit_get(f"/changes_since/{token}", ctx, params=params)
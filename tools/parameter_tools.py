@@ -0,0 +1,86 @@
+"""Bulk parameter read and write tools"""
+
+from mcp.server.fastmcp import Context
+from typing import Dict, Any, List, Optional
+
+
+def register_parameter_tools(mcp, revit_get, revit_post):
+    """Register parameter tools"""
+
+    @mcp.tool()
+    async def set_parameters(
+        edits: List[Dict[str, Any]],
+        chunk_size: int = 1000,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Set instance parameters on many elements in a single call
+
+        All edits are applied in one undoable operation. Very large edit sets
+        are committed in chunks of chunk_size elements. Failures are reported
+        grouped by reason (not found, read-only, unsupported type, invalid value)
+        with a few examples each, instead of one entry per failed parameter.
+
+        Args:
+            edits: List of edits, e.g.
+                [{"element_id": 12345, "parameters": {"Mark": "D-101"}},
+                 {"element_id": 12346, "parameters": {"Mark": "D-102", "Comments": "Fire door"}}]
+                Values are converted by the parameter's storage type (text, integer, number).
+                Numbers are in Revit internal units (feet, radians).
+            chunk_size: Number of elements to apply per committed chunk (default: 1000)
+            ctx: MCP context for logging
+
+        Returns:
+            Counts of parameters set and failed, plus grouped failure reasons
+        """
+        data = {"edits": edits, "chunk_size": chunk_size}
+        if ctx:
+            await ctx.info("Setting parameters on {} elements".format(len(edits)))
+        return await revit_post("/set_parameters/", data, ctx, timeout=300.0)
+
+    @mcp.tool()
+    async def get_parameters(
+        parameter_names: List[str],
+        element_ids: Optional[List[int]] = None,
+        category_name: Optional[str] = None,
+        value_mode: str = "display",
+        offset: int = 0,
+        limit: int = 5000,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Read a few parameters across many elements as a dense matrix
+
+        Select elements either by id or by category. Parameters that are not on
+        the instance are read from the element's type (e.g. "Fire Rating" on doors).
+        The result has "element_ids" (rows), "parameters" (columns) and "values",
+        where values[i][j] is parameter j of element i (null if missing).
+
+        Args:
+            parameter_names: Parameters to read, e.g. ["Mark", "Level", "Fire Rating"]
+            element_ids: Element ids to read (takes precedence over category_name)
+            category_name: Category to read all instances of, e.g. "Doors"
+            value_mode: "display" for formatted strings (default), "raw" for
+                unformatted values (numbers in internal units, element ids as integers),
+                or "both" for [raw, display] pairs
+            offset: Index of the first element to return, for paging
+            limit: Maximum number of elements to return (default: 5000)
+            ctx: MCP context for logging
+
+        Returns:
+            Matrix of values with paging information ("next_offset" is null on the last page)
+        """
+        data = {
+            "parameter_names": parameter_names,
+            "value_mode": value_mode,
+            "offset": offset,
+            "limit": limit,
+        }
+        if element_ids:
+            data["element_ids"] = element_ids
+        if category_name:
+            data["category_name"] = category_name
+
+        if ctx:
+            await ctx.info("Reading {} parameters".format(len(parameter_names)))
+        return await revit_post("/get_parameters/", data, ctx, timeout=120.0)
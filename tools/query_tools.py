@@ -0,0 +1,129 @@
+"""Element query tools"""
+
+from mcp.server.fastmcp import Context
+from typing import Dict, Any, List, Optional, Union
+
+
+def register_query_tools(mcp, revit_get, revit_post):
+    """Register element query tools"""
+
+    @mcp.tool()
+    async def query_elements(
+        categories: Optional[List[str]] = None,
+        classes: Optional[List[str]] = None,
+        level: Optional[Union[str, int]] = None,
+        view: Optional[Union[str, int]] = None,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        bbox: Optional[Dict[str, Any]] = None,
+        element_types: bool = False,
+        fields: Optional[List[str]] = None,
+        value_mode: str = "display",
+        offset: int = 0,
+        limit: int = 500,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Find elements with a declarative filter that Revit evaluates natively
+
+        All criteria are combined with AND. Prefer this over execute_revit_code
+        loops for "find all X where Y" questions.
+
+        Args:
+            categories: Category names ("Doors") or built-in names ("OST_Doors")
+            classes: Revit API class names, e.g. ["Wall"], ["FamilyInstance"]
+            level: Level name or id the elements are associated with
+            view: View name or id; only elements visible in that view are returned
+            parameters: Parameter rules, e.g.
+                [{"name": "Mark", "op": "begins_with", "value": "D-"},
+                 {"name": "Fire Rating", "op": "equals", "value": "60 min"},
+                 {"name": "Width", "op": "greater", "value": 3.0}]
+                Operators: equals, not_equals, greater, greater_or_equal, less,
+                less_or_equal, contains, not_contains, begins_with, ends_with,
+                has_value, has_no_value. Numbers are in internal units (feet).
+                Type parameters (e.g. "Fire Rating" on doors) are supported.
+            bbox: {"min": {"x", "y", "z"}, "max": {"x", "y", "z"}, "mode": "intersects" or "inside"}
+            element_types: Query element types instead of instances
+            fields: Parameters to return for each match; omit to return ids only
+            value_mode: "display", "raw" or "both" for field values
+            offset: Index of the first match to return, for paging
+            limit: Maximum number of matches to return (default: 500)
+            ctx: MCP context for logging
+
+        Returns:
+            Total match count, the page of element ids, and field values if requested
+        """
+        data = {
+            "element_types": element_types,
+            "value_mode": value_mode,
+            "offset": offset,
+            "limit": limit,
+        }
+        optional = {
+            "categories": categories,
+            "classes": classes,
+            "level": level,
+            "view": view,
+            "parameters": parameters,
+            "bbox": bbox,
+            "fields": fields,
+        }
+        data.update({key: value for key, value in optional.items() if value is not None})
+
+        if ctx:
+            await ctx.info("Querying elements")
+        return await revit_post("/query/", data, ctx, timeout=120.0)
+
+    @mcp.tool()
+    async def aggregate_elements(
+        group_by: Optional[List[str]] = None,
+        metrics: Optional[List[Dict[str, Any]]] = None,
+        categories: Optional[List[str]] = None,
+        classes: Optional[List[str]] = None,
+        level: Optional[Union[str, int]] = None,
+        view: Optional[Union[str, int]] = None,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        bbox: Optional[Dict[str, Any]] = None,
+        element_types: bool = False,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Group elements by parameters and compute totals inside Revit
+
+        Use this for quantity questions such as "total wall area by type per level"
+        instead of listing every element. Only the aggregate table is returned.
+
+        Args:
+            group_by: Parameters to group by, e.g. ["Type", "Base Constraint"];
+                omit for a single total row
+            metrics: Aggregates to compute, e.g.
+                [{"op": "count"}, {"op": "sum", "parameter": "Area"}]
+                Operators: count, sum, min, max, avg (default: count)
+            categories: Category names to include, e.g. ["Walls"]
+            classes: Revit API class names to include
+            level: Level name or id
+            view: View name or id; only elements visible in that view are used
+            parameters: Parameter rules, same format as query_elements
+            bbox: {"min": {"x", "y", "z"}, "max": {"x", "y", "z"}, "mode": "intersects" or "inside"}
+            element_types: Aggregate element types instead of instances
+            ctx: MCP context for logging
+
+        Returns:
+            "columns" and "rows" of the aggregate table; numeric results are in
+            Revit internal units (feet, square feet, cubic feet)
+        """
+        data = {"element_types": element_types}
+        optional = {
+            "group_by": group_by,
+            "metrics": metrics,
+            "categories": categories,
+            "classes": classes,
+            "level": level,
+            "view": view,
+            "parameters": parameters,
+            "bbox": bbox,
+        }
+        data.update({key: value for key, value in optional.items() if value is not None})
+
+        if ctx:
+            await ctx.info("Aggregating elements by {}".format(group_by or "nothing"))
+        return await revit_post("/aggregate/", data, ctx, timeout=120.0)
@@ -0,0 +1,105 @@
+"""On-disk cache of per-sheet PDFs for incremental sheet exports"""
+
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+from pypdf import PdfWriter
+
+PDF_CACHE_DIR = os.getenv("REVIT_MCP_PDF_CACHE") or os.path.join(
+    tempfile.gettempdir(), "revit_mcp_pdf_cache"
+)
+MAX_PDF_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+class SheetPdfCache:
+    """
+    Single-sheet PDFs keyed by document, sheet id and sheet content version
+
+    Versions come from Revit's /sheet_versions/ route, so a cached file is
+    reused exactly as long as nothing printed on the sheet has changed.
+    Storing a new version drops older versions of the same sheet; prune()
+    evicts least recently used files beyond the size limit.
+    """
+
+    def __init__(self, folder: str = PDF_CACHE_DIR, max_bytes: int = MAX_PDF_CACHE_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def _prefix(self, document: str, sheet_id: int) -> str:
+        doc_hash = hashlib.md5(document.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.folder, f"{doc_hash}_{sheet_id}_")
+
+    def path(self, document: str, sheet_id: int, version: str) -> str:
+        return self._prefix(document, sheet_id) + f"{version}.pdf"
+
+    def lookup(self, document: str, sheet_id: int, version: str) -> Optional[str]:
+        """Return the cached PDF for this sheet version, or None"""
+        path = self.path(document, sheet_id, version)
+        if not os.path.isfile(path):
+            return None
+        os.utime(path)
+        return path
+
+    def new_temp_path(self) -> str:
+        """A fresh file path in the cache folder to export a sheet into"""
+        os.makedirs(self.folder, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+        os.close(handle)
+        return path
+
+    def store(self, document: str, sheet_id: int, version: str, source_path: str) -> str:
+        """Move an exported sheet PDF into the cache and return its cached path"""
+        path = self.path(document, sheet_id, version)
+        for old_path in glob.glob(glob.escape(self._prefix(document, sheet_id)) + "*.pdf"):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        os.replace(source_path, path)
+        return path
+
+    def prune(self):
+        """Remove least recently used PDFs until the cache fits its size limit"""
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def merge_pdfs(paths: List[str], output_path: str) -> int:
+    """Concatenate PDF files into output_path and return the page count"""
+    writer = PdfWriter()
+    try:
+        for path in paths:
+            writer.append(path)
+        with open(output_path, "wb") as handle:
+            writer.write(handle)
+        return len(writer.pages)
+    finally:
+        writer.close()
+
+
+pdf_cache = SheetPdfCache()
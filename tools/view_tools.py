@@ -1,15 +1,148 @@
 """View-related tools for capturing and listing Revit views"""
 
-from mcp.server.fastmcp import Context
+import asyncio
+import base64
+import json
+import math
+from mcp.server.fastmcp import Context, Image
+from typing import Any, Dict, List, Optional, Union
+
+from .imaging import (
+    compose_contact_sheet,
+    diff_images,
+    render_history,
+    render_tile,
+    run_in_image_pool,
+)
+
+# /list_views/ groups; schedules are left out of previews unless requested
+PREVIEW_VIEW_TYPES = (
+    "floor_plans",
+    "ceiling_plans",
+    "elevations",
+    "sections",
+    "3d_views",
+    "drafting_views",
+    "other",
+)
+MAX_PREVIEW_VIEWS = 100
+
+
+def image_export_params(
+    preset: Optional[str] = None,
+    resolution: Optional[int] = None,
+    pixel_size: Optional[int] = None,
+    image_format: Optional[str] = None,
+    zoom: Optional[Union[str, int]] = None,
+    crop: Optional[List[float]] = None,
+) -> Dict[str, str]:
+    """Build query parameters for the image export routes"""
+    params = {
+        "preset": preset,
+        "resolution": resolution,
+        "pixel_size": pixel_size,
+        "format": image_format,
+        "zoom": zoom,
+        "crop": ",".join(str(value) for value in crop) if crop else None,
+    }
+    return {key: str(value) for key, value in params.items() if value is not None}
 
 
 def register_view_tools(mcp, revit_get, revit_post, revit_image):
     """Register view-related tools"""
     
     @mcp.tool()
-    async def get_revit_view(view_name: str, ctx: Context = None) -> str:
-        """Export a specific Revit view as an image"""
-        return await revit_image(f"/get_view/{view_name}", ctx)
+    async def get_revit_view(
+        view_name: str,
+        preset: Optional[str] = None,
+        resolution: Optional[int] = None,
+        pixel_size: Optional[int] = None,
+        image_format: Optional[str] = None,
+        zoom: Optional[Union[str, int]] = None,
+        crop: Optional[List[float]] = None,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Export a specific Revit view as an image
+
+        The default is a 1024px PNG at 150 DPI. For a quick look use
+        preset="thumbnail" (512px JPEG), which exports and transfers much faster.
+
+        Args:
+            view_name: Name of the view to export
+            preset: "default", "thumbnail" or "high_res" (4096px PNG at 300 DPI);
+                other arguments override the preset
+            resolution: DPI, one of 72, 150, 300, 600
+            pixel_size: Image width in pixels (64-8192)
+            image_format: "png" or "jpeg"
+            zoom: "fit" (default, uses pixel_size) or a percentage of actual size (1-100)
+            crop: Region to keep as fractions of the image [left, top, right, bottom],
+                e.g. [0.5, 0, 1, 0.5] for the top-right quarter at full pixel_size
+            ctx: MCP context for logging
+        """
+        params = image_export_params(preset, resolution, pixel_size, image_format, zoom, crop)
+        image = await revit_image(f"/get_view/{view_name}", ctx, params=params)
+        if isinstance(image, Image):
+            render_history.put(render_history.key(view_name, params), image.data)
+        return image
+
+    @mcp.tool()
+    async def get_view_changes(
+        view_name: str,
+        preset: Optional[str] = None,
+        resolution: Optional[int] = None,
+        pixel_size: Optional[int] = None,
+        image_format: Optional[str] = None,
+        zoom: Optional[Union[str, int]] = None,
+        crop: Optional[List[float]] = None,
+        ctx: Context = None,
+    ) -> List[Any]:
+        """
+        Re-export a view and return only what changed since its last export
+
+        Call after modifying the model instead of get_revit_view to see the
+        effect of the change. The view is compared with the last image from
+        get_revit_view or get_view_changes with the same options.
+
+        Args:
+            view_name, preset, resolution, pixel_size, image_format, zoom, crop:
+                As for get_revit_view
+            ctx: MCP context for logging
+
+        Returns:
+            A summary with "status": "unchanged" and no image; "changed" with
+            "regions" (pixel boxes x, y, width, height) followed by a crop of
+            each region; or the full image when there is no earlier render,
+            the size changed, or most of the view changed
+        """
+        params = image_export_params(preset, resolution, pixel_size, image_format, zoom, crop)
+        image = await revit_image(f"/get_view/{view_name}", ctx, params=params)
+        if not isinstance(image, Image):
+            return [image]
+
+        key = render_history.key(view_name, params)
+        previous = render_history.get(key)
+        render_history.put(key, image.data)
+        if previous is None:
+            summary = {"status": "baseline", "view_name": view_name, "full_image": True}
+            return [json.dumps(summary), image]
+
+        diff = await run_in_image_pool(diff_images, previous, image.data)
+        crops = diff.pop("crops", [])
+        image_format = diff.pop("format")
+        summary = dict(diff, view_name=view_name)
+        if diff["status"] == "unchanged":
+            return [json.dumps(summary)]
+        if diff.get("full_image"):
+            return [json.dumps(summary), image]
+
+        content = [json.dumps(summary)]
+        for index, (region, crop_data) in enumerate(zip(diff["regions"], crops)):
+            content.append("Region {} at x={}, y={} ({}x{})".format(
+                index + 1, region["x"], region["y"], region["width"], region["height"]
+            ))
+            content.append(Image(data=crop_data, format=image_format))
+        return content
 
     @mcp.tool()
     async def list_revit_views(ctx: Context = None) -> str:
@@ -17,9 +150,177 @@ def register_view_tools(mcp, revit_get, revit_post, revit_image):
         return await revit_get("/list_views/", ctx)
 
     @mcp.tool()
-    async def get_sheet_image(sheet_number: str, ctx: Context = None) -> str:
-        """Export a sheet as an image"""
-        return await revit_image(f"/sheet_image/{sheet_number}", ctx)
+    async def get_sheet_image(
+        sheet_number: str,
+        preset: Optional[str] = None,
+        resolution: Optional[int] = None,
+        pixel_size: Optional[int] = None,
+        image_format: Optional[str] = None,
+        zoom: Optional[Union[str, int]] = None,
+        crop: Optional[List[float]] = None,
+        ctx: Context = None,
+    ) -> str:
+        """
+        Export a sheet as an image
+
+        Accepts the same image options as get_revit_view; crop is useful to
+        read a title block or detail at full resolution.
+        """
+        params = image_export_params(preset, resolution, pixel_size, image_format, zoom, crop)
+        return await revit_image(f"/sheet_image/{sheet_number}", ctx, params=params)
+
+    @mcp.tool()
+    async def export_views(
+        views: List[Union[str, int]],
+        preset: Optional[str] = None,
+        resolution: Optional[int] = None,
+        pixel_size: Optional[int] = None,
+        image_format: Optional[str] = None,
+        zoom: Optional[Union[str, int]] = None,
+        crop: Optional[List[float]] = None,
+        output_path: Optional[str] = None,
+        ctx: Context = None,
+    ) -> List[Any]:
+        """
+        Export many views or sheets as images in a single Revit export
+
+        Much faster than calling get_revit_view repeatedly, since Revit's
+        renderer starts once for the whole batch and unchanged views come
+        from the render cache. Use preset="thumbnail" when reviewing many views.
+
+        Args:
+            views: View names, view ids or sheet numbers (at most 100)
+            preset, resolution, pixel_size, image_format, zoom, crop:
+                Image options, as for get_revit_view
+            output_path: If given, save all images to this .zip file (named by
+                view id) instead of returning them
+            ctx: MCP context for logging
+
+        Returns:
+            A summary followed by a caption and image per view, or the summary
+            of the saved zip file
+        """
+        data = {
+            "views": views,
+            "options": image_export_params(preset, resolution, pixel_size, image_format, zoom, crop),
+            "payload": "zip" if output_path else "list",
+        }
+        if ctx:
+            await ctx.info("Exporting {} views".format(len(views)))
+        result = await revit_post("/export_views/", data, ctx, timeout=300.0)
+        if not isinstance(result, dict) or "error" in result:
+            return [result]
+
+        if output_path:
+            with open(output_path, "wb") as zip_file:
+                zip_file.write(base64.b64decode(result.pop("zip_data")))
+            result["output_path"] = output_path
+            return [result]
+
+        image_format = result["content_type"].split("/")[-1]
+        images = result.pop("images")
+        content = [json.dumps(result)]
+        for image in images:
+            content.append("{} (id {})".format(image["view_name"], image["view_id"]))
+            content.append(Image(data=base64.b64decode(image["image_data"]), format=image_format))
+        return content
+
+    @mcp.tool()
+    async def preview_views(
+        view_types: Optional[List[str]] = None,
+        name_contains: Optional[str] = None,
+        views: Optional[List[Union[str, int]]] = None,
+        max_views: int = 24,
+        tile_size: int = 256,
+        columns: Optional[int] = None,
+        ctx: Context = None,
+    ) -> List[Any]:
+        """
+        Preview many views at once as a single labelled contact-sheet image
+
+        Use this to pick which view to inspect instead of exporting candidates
+        one by one: all thumbnails come from one Revit export and are tiled
+        into one image, numbered to match the "views" list in the summary.
+
+        Args:
+            view_types: Groups from list_revit_views to include, e.g.
+                ["floor_plans", "sections"] (default: all except schedules)
+            name_contains: Only include views whose name contains this text
+                (case-insensitive)
+            views: Explicit view names, ids or sheet numbers instead of filters
+            max_views: Maximum number of views to include (at most 100)
+            tile_size: Thumbnail size in pixels (64-512)
+            columns: Tiles per row (default: roughly square grid)
+            ctx: MCP context for logging
+
+        Returns:
+            A summary followed by the contact-sheet image
+        """
+        max_views = max(1, min(max_views, MAX_PREVIEW_VIEWS))
+        tile_size = max(64, min(tile_size, 512))
+
+        if views is None:
+            listing = await revit_get("/list_views/", ctx)
+            if not isinstance(listing, dict) or "views_by_type" not in listing:
+                return [listing]
+            groups = view_types or PREVIEW_VIEW_TYPES
+            unknown = [group for group in view_types or () if group not in listing["views_by_type"]]
+            if unknown:
+                return [{
+                    "error": "Unknown view types: {}".format(", ".join(unknown)),
+                    "available_view_types": sorted(listing["views_by_type"]),
+                }]
+            # Export by id: names repeat across view types (e.g. the floor
+            # plan and ceiling plan "Level 1"), ids do not
+            views = []
+            for group in groups:
+                names = listing["views_by_type"].get(group, [])
+                ids = listing.get("view_ids_by_type", {}).get(group, [])
+                for name, view_id in zip(names, ids):
+                    if name_contains and name_contains.lower() not in name.lower():
+                        continue
+                    if view_id not in views:
+                        views.append(view_id)
+
+        if not views:
+            return [{"error": "No views match the filters"}]
+        omitted = max(0, len(views) - max_views)
+        views = views[:max_views]
+
+        if ctx:
+            await ctx.info("Exporting {} thumbnails".format(len(views)))
+        data = {
+            "views": views,
+            "options": image_export_params(preset="thumbnail", pixel_size=tile_size),
+            "payload": "list",
+        }
+        result = await revit_post("/export_views/", data, ctx, timeout=300.0)
+        if not isinstance(result, dict) or "error" in result:
+            return [result]
+
+        images = result["images"]
+        if not images:
+            return [{"error": "No views could be exported", "failed": result["failed"]}]
+
+        labels = ["{}. {}".format(index + 1, image["view_name"]) for index, image in enumerate(images)]
+        tiles = await asyncio.gather(*[
+            run_in_image_pool(render_tile, base64.b64decode(image["image_data"]), label, tile_size)
+            for image, label in zip(images, labels)
+        ])
+        columns = columns or math.ceil(math.sqrt(len(tiles)))
+        sheet_data = await run_in_image_pool(compose_contact_sheet, tiles, max(1, columns))
+
+        summary = {
+            "views": [
+                {"index": index + 1, "view_id": image["view_id"], "view_name": image["view_name"]}
+                for index, image in enumerate(images)
+            ],
+            "omitted": omitted,
+            "cached_count": result["cached_count"],
+            "not_found": result["not_found"],
+            "failed": result["failed"],
+        }
+        return [json.dumps(summary), Image(data=sheet_data, format="jpeg")]
 
     @mcp.tool()
     async def get_current_view_info(ctx: Context = None) -> str: